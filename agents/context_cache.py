@@ -0,0 +1,235 @@
+import os
+import time
+import base64
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from agents.token_usage import IMAGE_TOKENS
+
+# on | off
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "on")
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))              # seconds
+CONTEXT_CACHE_REFRESH_BEFORE = 300                                          # extend TTL when less remains
+# Gemini rejects caches below a model-specific size (4096 tokens for 2.0 Flash). The system
+# prompt and tool declarations alone are far below it, so only sessions with attachments are cached.
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+CONTEXT_CACHE_MAX_SESSIONS = int(os.getenv("CONTEXT_CACHE_MAX_SESSIONS", "256"))
+CONTEXT_CACHE_RETRY_AFTER = 300                                             # seconds off after a provider error
+
+
+class ContextCacheProvider(ABC):
+    """
+    Provider-side prompt cache holding a system prompt, tool declarations and
+    attachments. `create` returns a handle name that requests pass as `cached_content`.
+    """
+
+    @abstractmethod
+    async def create(self, system_prompt: str, tools: list, attachments: List[dict], ttl: int) -> str:
+        ...
+
+    @abstractmethod
+    async def refresh(self, name: str, ttl: int):
+        ...
+
+    @abstractmethod
+    async def delete(self, name: str):
+        ...
+
+
+class GeminiContextCache(ContextCacheProvider):
+    """Explicit context caching through the Gemini API (google-genai)."""
+
+    def __init__(self, model: str, api_key: str):
+        from google import genai
+        self.model = model
+        self.client = genai.Client(api_key=api_key)
+
+    async def create(self, system_prompt: str, tools: list, attachments: List[dict], ttl: int) -> str:
+        from google.genai import types
+        from langchain_google_genai._function_utils import convert_to_genai_function_declarations
+
+        parts = []
+        for part in attachments:
+            if part.get("type") == "image_url":
+                url = part["image_url"]["url"]
+                header, data = url.split(",", 1)
+                parts.append(types.Part.from_bytes(data=base64.b64decode(data), mime_type=header[5:].split(";", 1)[0]))
+            elif part.get("type") == "text":
+                parts.append(types.Part(text=part["text"]))
+
+        cache = await self.client.aio.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_prompt,
+                tools=[convert_to_genai_function_declarations(tools)] if tools else None,
+                contents=[types.Content(role="user", parts=parts)] if parts else None,
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cache.name
+
+    async def refresh(self, name: str, ttl: int):
+        from google.genai import types
+        await self.client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+
+    async def delete(self, name: str):
+        await self.client.aio.caches.delete(name=name)
+
+
+def _is_media(part) -> bool:
+    return isinstance(part, dict) and part.get("type") == "image_url"
+
+
+def _estimate_tokens(text: str, attachments: List[dict]) -> int:
+    total = len(text) // 4
+    for part in attachments:
+        total += IMAGE_TOKENS if _is_media(part) else len(str(part.get("text", ""))) // 4
+    return total
+
+
+class ContextCacheManager:
+    """
+    Tracks provider cache handles for the agent: one per session, holding the system
+    prompt, tool declarations and the session's large attachments (inline images and
+    scanned PDF pages), so they are uploaded once instead of on every hop and turn.
+    Sessions without attachments are not cached: the prompt and tools alone are below
+    the provider's minimum cache size (`min_tokens`).
+    Handles are refreshed before their TTL runs out and recreated when the session gains
+    attachments. If the provider fails, or the content is below `min_tokens`, no handle
+    is returned and the caller sends the full prompt as before.
+    """
+
+    def __init__(self, provider: ContextCacheProvider, system_prompt: str, tools: list,
+                 ttl: int = CONTEXT_CACHE_TTL, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS,
+                 max_sessions: int = CONTEXT_CACHE_MAX_SESSIONS):
+        self.provider = provider
+        self.system_prompt = system_prompt
+        self.tools = tools
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.max_sessions = max_sessions
+        self.stats = {"creates": 0, "refreshes": 0, "reuses": 0, "errors": 0}
+        self._sessions = OrderedDict()  # session_id -> {"attachments", "handle", "attached", "lock"}
+        self._disabled_until = 0.0
+
+    # --- Handles ---
+
+    def _key(self, attachments: List[dict]) -> str:
+        hasher = hashlib.sha256(self.system_prompt.encode("utf-8"))
+        for tool in self.tools:
+            hasher.update(getattr(tool, "name", str(tool)).encode("utf-8"))
+        for part in attachments:
+            hasher.update(repr(sorted(part.items())).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def _fail(self, action: str, error: Exception):
+        print(f"Context cache {action} failed, sending full prompts for {CONTEXT_CACHE_RETRY_AFTER}s: {error}")
+        self.stats["errors"] += 1
+        self._disabled_until = time.time() + CONTEXT_CACHE_RETRY_AFTER
+
+    async def _ensure(self, entry: dict, attachments: List[dict]) -> Optional[str]:
+        """Returns a live handle for exactly these attachments, creating or refreshing it if needed."""
+        if time.time() < self._disabled_until:
+            return None
+        if _estimate_tokens(self.system_prompt, attachments) < self.min_tokens:
+            return None
+
+        key = self._key(attachments)
+        handle = entry["handle"]
+        now = time.time()
+        if handle and handle["key"] == key and handle["expires"] > now:
+            if handle["expires"] - now > CONTEXT_CACHE_REFRESH_BEFORE:
+                self.stats["reuses"] += 1
+                return handle["name"]
+            try:
+                await self.provider.refresh(handle["name"], self.ttl)
+                handle["expires"] = now + self.ttl
+                self.stats["refreshes"] += 1
+                return handle["name"]
+            except Exception as e:
+                print(f"Context cache refresh failed, recreating: {e}")
+
+        try:
+            name = await self.provider.create(self.system_prompt, self.tools, attachments, self.ttl)
+        except Exception as e:
+            self._fail("create", e)
+            return None
+        self.stats["creates"] += 1
+        entry["handle"] = {"name": name, "key": key, "expires": now + self.ttl}
+        if handle and handle["name"] != name:
+            await self._delete(handle["name"])
+        return name
+
+    async def _delete(self, name: str):
+        try:
+            await self.provider.delete(name)
+        except Exception:
+            pass # Expires on its own
+
+    def _session(self, session_id: str) -> dict:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = {"attachments": [], "handle": None, "attached": set(), "lock": asyncio.Lock()}
+            self._sessions[session_id] = entry
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            if evicted["handle"]:
+                asyncio.ensure_future(self._delete(evicted["handle"]["name"]))
+        return entry
+
+    # --- Public API ---
+
+    async def prepare(self, session_id: str, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], Optional[str]]:
+        """
+        Moves inline media from the session's messages into its cached context.
+        Returns (messages to send, handle) when a handle is usable; the messages then
+        reference the cached attachments instead of carrying them. Returns
+        (messages, None) when the caller should send the full, uncached prompt.
+        """
+        entry = self._session(session_id)
+        async with entry["lock"]:
+            new_parts = []
+            new_ids = []
+            for msg in messages:
+                if msg.type == "human" and msg.id not in entry["attached"] and not isinstance(msg.content, str):
+                    media = [p for p in msg.content if _is_media(p)]
+                    if media:
+                        new_parts.extend(media)
+                        new_ids.append(msg.id)
+
+            handle = await self._ensure(entry, entry["attachments"] + new_parts) if (entry["attachments"] or new_parts) else None
+            if handle and new_parts:
+                entry["attachments"].extend(new_parts)
+                entry["attached"].update(new_ids)
+
+        if handle is None:
+            return messages, None
+
+        slimmed = []
+        for msg in messages:
+            if msg.id in entry["attached"] and not isinstance(msg.content, str):
+                content = [
+                    {"type": "text", "text": "[Attachment provided in the cached context above]"} if _is_media(p) else p
+                    for p in msg.content
+                ]
+                msg = HumanMessage(content=content, id=msg.id)
+            slimmed.append(msg)
+        return slimmed, handle
+
+    def invalidate(self, session_id: str):
+        """Forgets the session's handle (e.g. it expired provider-side); the next turn recreates it."""
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry["handle"] = None
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["sessions"] = sum(1 for e in self._sessions.values() if e["handle"])
+        stats["disabled"] = time.time() < self._disabled_until
+        return stats
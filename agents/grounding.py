@@ -0,0 +1,82 @@
+import os
+import re
+from typing import List
+
+import numpy as np
+
+from db.document_store import split_into_chunks
+
+# Sentences shorter than this (after stripping markdown) are not treated as claims
+GROUNDING_MIN_CLAIM_CHARS = int(os.getenv("GROUNDING_MIN_CLAIM_CHARS", "20"))
+GROUNDING_MAX_CLAIMS = int(os.getenv("GROUNDING_MAX_CLAIMS", "40"))
+GROUNDING_MAX_CHUNKS = int(os.getenv("GROUNDING_MAX_CHUNKS", "64"))
+# Context chunk size: MiniLM only reads ~256 tokens, longer chunks are silently truncated
+GROUNDING_CHUNK_CHARS = int(os.getenv("GROUNDING_CHUNK_CHARS", "800"))
+# A claim counts as supported when its best context match is at least this similar
+GROUNDING_SUPPORT_THRESHOLD = float(os.getenv("GROUNDING_SUPPORT_THRESHOLD", "0.5"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])|\n+")
+_MARKDOWN = re.compile(r"^\s*(?:#+|>|[*\-]|\d+[.)])\s+|[*_`]+|\s*\[\d+\]")
+
+
+def split_claims(answer: str) -> List[str]:
+    """Splits an answer into sentence-level claims, skipping headings, fragments and citations."""
+    claims = []
+    for sentence in _SENTENCE_END.split(answer or ""):
+        text = _MARKDOWN.sub("", sentence).strip()
+        if len(text) >= GROUNDING_MIN_CLAIM_CHARS:
+            claims.append(text)
+    return claims[:GROUNDING_MAX_CLAIMS]
+
+
+def context_chunks(retrieved: List[dict], tool_outputs: List[tuple]) -> List[dict]:
+    """
+    Grounding context as {"source", "text", "vector"} dicts: the retrieved excerpts
+    (their index vectors are reused when present) followed by chunked tool outputs.
+    """
+    chunks = [
+        {"source": hit.get("source"), "text": hit.get("text", ""), "vector": hit.get("vector")}
+        for hit in retrieved if hit.get("text")
+    ]
+    for source, output in tool_outputs:
+        for chunk in split_into_chunks(str(output), chunk_size=GROUNDING_CHUNK_CHARS, overlap=0):
+            chunks.append({"source": source, "text": chunk, "vector": None})
+    return chunks[:GROUNDING_MAX_CHUNKS]
+
+
+async def evaluate_grounding(answer: str, chunks: List[dict]) -> dict:
+    """
+    Scores how well each answer claim is supported by the context.
+    1. Claims and context chunks without a vector are embedded in one batch.
+    2. One (claims x chunks) similarity matrix; each claim keeps its best match.
+    3. The score is the mean of the per-claim maxima.
+    Returns {"score", "supported", "claims": [{"claim", "score", "source"}]}.
+    """
+    from db.embeddings import embedding_service
+
+    claims = split_claims(answer)
+    if not claims or not chunks:
+        return {"score": 0.0, "supported": 0.0, "claims": []}
+
+    missing = [i for i, c in enumerate(chunks) if c.get("vector") is None]
+    vectors = await embedding_service.aembed_many(claims + [chunks[i]["text"] for i in missing], memoize=False)
+    claim_vectors = vectors[:len(claims)]
+
+    context = [c.get("vector") for c in chunks]
+    for i, vector in zip(missing, vectors[len(claims):]):
+        context[i] = vector
+    context_vectors = np.asarray(context, dtype="float32")
+
+    # Vectors are normalized, so the dot product is the cosine similarity
+    similarity = claim_vectors @ context_vectors.T
+    best = similarity.argmax(axis=1)
+    support = np.clip(similarity[np.arange(len(claims)), best], 0.0, 1.0)
+
+    return {
+        "score": float(support.mean()),
+        "supported": float((support >= GROUNDING_SUPPORT_THRESHOLD).mean()),
+        "claims": [
+            {"claim": claim, "score": float(score), "source": chunks[j].get("source")}
+            for claim, score, j in zip(claims, support, best)
+        ],
+    }
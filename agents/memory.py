@@ -0,0 +1,164 @@
+import os
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, RemoveMessage
+
+from agents.state import AgentState
+from agents.token_usage import estimate_tokens
+
+# Prompt budget for the conversation history (excluding the system prompt)
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "8000"))
+# Most recent turns (the current one included) that are never summarized
+MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "3"))
+# Text parts of earlier user messages longer than this are cut down to a reference
+MEMORY_MAX_ATTACHMENT_CHARS = int(os.getenv("MEMORY_MAX_ATTACHMENT_CHARS", "2000"))
+
+# Section header the ingestion pipeline uses for retrieved chunks
+EXCERPTS_MARKER = "\n--- Relevant Excerpts ---\n"
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and an AI assistant.
+Merge the existing summary with the new turns below. Keep facts, decisions, names, numbers, URLs and
+open questions; drop pleasantries. Write at most 200 words of plain prose."""
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Groups messages into turns, each starting at a human message."""
+    turns = []
+    for msg in messages:
+        if msg.type == "human" or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+def _compact_text(text: str) -> str:
+    if len(text) <= MEMORY_MAX_ATTACHMENT_CHARS:
+        return text
+    head = text.split(EXCERPTS_MARKER, 1)[0]
+    if len(head) > MEMORY_MAX_ATTACHMENT_CHARS:
+        head = head[:MEMORY_MAX_ATTACHMENT_CHARS] + "..."
+    return head + "\n[Earlier attachments omitted. They remain indexed: use `search_documents` to consult them.]\n"
+
+
+def _compact_human(msg: HumanMessage):
+    """Returns a slimmed copy of an earlier user message, or None if it is already small."""
+    if isinstance(msg.content, str):
+        compacted = _compact_text(msg.content)
+        return None if compacted == msg.content else HumanMessage(content=compacted, id=msg.id)
+
+    parts = []
+    changed = False
+    for part in msg.content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            url = part.get("image_url", {}).get("url", "") if isinstance(part.get("image_url"), dict) else ""
+            mime = url[5:].split(";", 1)[0] if url.startswith("data:") else "image"
+            parts.append({"type": "text", "text": f"[Attachment ({mime}) shown in an earlier turn]"})
+            changed = True
+        elif isinstance(part, dict) and part.get("type") == "text":
+            compacted = _compact_text(part.get("text", ""))
+            changed = changed or compacted != part.get("text", "")
+            parts.append({"type": "text", "text": compacted})
+        else:
+            parts.append(part)
+    return HumanMessage(content=parts, id=msg.id) if changed else None
+
+
+def _transcript(messages: List[BaseMessage]) -> str:
+    lines = []
+    for msg in messages:
+        if msg.type not in ("human", "ai"):
+            continue
+        content = msg.content if isinstance(msg.content, str) else " ".join(
+            str(p.get("text", "")) for p in msg.content if isinstance(p, dict)
+        )
+        if content.strip():
+            lines.append(f"{'User' if msg.type == 'human' else 'Assistant'}: {content}")
+    return "\n".join(lines)
+
+
+def create_memory_node(llm):
+    """
+    Builds the graph node that keeps `messages` bounded at the start of every turn:
+    1. Earlier user messages lose inline attachments/excerpts (replaced by references).
+    2. Tool calls and ToolMessages from earlier turns are dropped.
+    3. Once the history exceeds MEMORY_TOKEN_BUDGET, turns older than the last
+       MEMORY_KEEP_TURNS are folded into `summary`.
+    Updates are emitted as id-based replacements and RemoveMessages, so they persist
+    through the checkpointer like any other state update.
+    """
+
+    async def memory_node(state: AgentState):
+        turns = _split_turns(state["messages"])
+        if len(turns) < 2:
+            return {}
+
+        updates = []
+        kept = []  # history as it will look after this node, turn by turn
+        for turn in turns[:-1]:
+            compacted_turn = []
+            for msg in turn:
+                if msg.type == "tool" or (msg.type == "ai" and getattr(msg, "tool_calls", None)):
+                    updates.append(RemoveMessage(id=msg.id))
+                    continue
+                if msg.type == "human":
+                    slim = _compact_human(msg)
+                    if slim is not None:
+                        updates.append(slim)
+                        msg = slim
+                compacted_turn.append(msg)
+            kept.append(compacted_turn)
+        kept.append(turns[-1])
+
+        summary = state.get("summary", "")
+        history = [msg for turn in kept for msg in turn]
+        older = kept[:-MEMORY_KEEP_TURNS] if MEMORY_KEEP_TURNS > 0 else kept[:-1]
+        if older and estimate_tokens(history) > MEMORY_TOKEN_BUDGET:
+            older_msgs = [msg for turn in older for msg in turn]
+            response = await llm.ainvoke([
+                SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(content=f"EXISTING SUMMARY:\n{summary or '(none)'}\n\nNEW TURNS:\n{_transcript(older_msgs)}")
+            ])
+            summary = response.content if isinstance(response.content, str) else str(response.content)
+            # Summarized turns go entirely; tool traffic removed above stays removed
+            older_ids = {m.id for m in older_msgs}
+            updates = [u for u in updates if u.id not in older_ids]
+            updates.extend(RemoveMessage(id=m.id) for m in older_msgs)
+            return {"messages": updates, "summary": summary}
+
+        return {"messages": updates} if updates else {}
+
+    return memory_node
+
+
+def fit_to_budget(messages: List[BaseMessage], budget: Optional[int]) -> Optional[List[BaseMessage]]:
+    """
+    Pre-flight trim of the prompt for one model call (graph state is left alone):
+    1. Earlier turns are dropped, oldest first; the system prompt and the current turn stay.
+    2. Tool results of the current turn are truncated, largest first.
+    Returns None when the current turn does not fit even then.
+    """
+    if budget is None or estimate_tokens(messages) <= budget:
+        return messages
+
+    head = [m for m in messages[:1] if m.type == "system"]
+    turns = _split_turns(messages[len(head):])
+    while len(turns) > 1 and estimate_tokens(head + [m for turn in turns for m in turn]) > budget:
+        turns.pop(0)
+    trimmed = head + [m for turn in turns for m in turn]
+
+    excess = estimate_tokens(trimmed) - budget
+    tool_results = sorted(
+        (i for i, m in enumerate(trimmed) if m.type == "tool" and isinstance(m.content, str)),
+        key=lambda i: -len(trimmed[i].content)
+    )
+    for i in tool_results:
+        if excess <= 0:
+            break
+        content = trimmed[i].content
+        keep = max(MEMORY_MAX_ATTACHMENT_CHARS, len(content) - excess * 4)
+        if keep < len(content):
+            trimmed[i] = trimmed[i].model_copy(update={"content": content[:keep] + "\n[Truncated to fit the token budget.]"})
+            excess -= (len(content) - keep) // 4
+
+    return trimmed if estimate_tokens(trimmed) <= budget else None
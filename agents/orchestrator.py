@@ -1,42 +1,32 @@
 import os
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.prebuilt import ToolNode
 from langgraph.graph import StateGraph, END
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from agents.state import AgentState
+from agents.context_cache import CONTEXT_CACHE, ContextCacheManager, GeminiContextCache
+from agents.memory import create_memory_node, fit_to_budget
+from agents.token_usage import estimate_tokens, prompt_budget
+from agents.tool_executor import create_tool_node
+from core.telemetry import timed_node
 from tools.web_search import robust_search
 from tools.ingestion import scrape_webpage
+from tools.retrieval import search_documents
 
-def create_graph():
-    # 1. Initialize Model
-    api_key = os.getenv("GEMINI_API_KEY")
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash", 
-        google_api_key=api_key, 
-        temperature=0
-    )
-    
-    # 2. Bind Tools
-    tools = [robust_search, scrape_webpage]
-    llm_with_tools = llm.bind_tools(tools)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
-    # 3. Define Nodes
-    def agent_node(state: AgentState):
-        messages = state['messages']
-        
-        # Inject System Prompt if not present (or prepend dynamically)
-        system_prompt = SystemMessage(content="""You are a helpful AI assistant called 'aXk - Intelligence Engine'.
+SYSTEM_PROMPT = """You are a helpful AI assistant called 'aXk - Intelligence Engine'.
         
         CAPABILITIES:
-        1. You have access to a web search tool and a webpage scraper.
+        1. You have access to a web search tool, a webpage scraper and a document search tool.
         2. You can read PDFs, TXTs, and CSVs provided by the user.
         3. If you see an image/scanned PDF, you can understand it visually.
         
         IMPORTANT:
         - If the user provides a URL in the chat (e.g. "read https://..."), YOU MUST use the `scrape_webpage` tool to read it. Do not just hallucinate the content.
-        - If the user defined URLs in the "Knowledge Base", they are already in your context.
+        - Documents and URLs from the "Knowledge Base" are indexed. The most relevant excerpts are attached to the user's message; use `search_documents` to look up anything else in them.
+        - When you need several sources, request all the tool calls in one step: they run in parallel.
         
         VISUALIZATION RULES:
         If the user asks for a "workflow", "diagram", "process flow", or "image for understanding":
@@ -53,28 +43,94 @@ def create_graph():
           Start -> Process -> End;
         }
         ```
-        """)
-        
+        """
+
+def create_graph(llm=None, cache_provider=None):
+    # 1. Initialize Model (callers such as benchmarks may inject their own chat model)
+    if llm is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        llm = ChatGoogleGenerativeAI(
+            model=GEMINI_MODEL, 
+            google_api_key=api_key, 
+            temperature=0
+        )
+        # Provider-side caching of the system prompt, tools and session attachments
+        if cache_provider is None and CONTEXT_CACHE != "off" and api_key:
+            try:
+                cache_provider = GeminiContextCache(GEMINI_MODEL, api_key)
+            except Exception as e:
+                print(f"Context caching unavailable: {e}")
+    
+    # 2. Bind Tools
+    tools = [robust_search, scrape_webpage, search_documents]
+    llm_with_tools = llm.bind_tools(tools)
+    context_cache = ContextCacheManager(cache_provider, SYSTEM_PROMPT, tools) if cache_provider else None
+
+    def over_budget(prompt: list, budget: int) -> dict:
+        return {"messages": [AIMessage(content=(
+            f"I stopped before calling the model: this request needs about {estimate_tokens(prompt)} prompt tokens, "
+            f"but only {budget} remain in its token budget. Start a new conversation, attach less content, "
+            f"or try again once the session's daily budget resets."
+        ))]}
+
+    # 3. Define Nodes
+    async def agent_node(state: AgentState, config: RunnableConfig):
+        messages = state['messages']
+        summary = state.get("summary")
+
+        # Cached path: system prompt, tools and the session's attachments live in the
+        # provider cache, so only the conversation itself is sent.
+        if context_cache is not None:
+            session_id = config.get("configurable", {}).get("thread_id", "default_session")
+            cached_messages, handle = await context_cache.prepare(session_id, messages)
+            if handle:
+                if summary:
+                    cached_messages = [HumanMessage(content=f"SUMMARY OF THE EARLIER CONVERSATION:\n{summary}")] + cached_messages
+                budget = prompt_budget()
+                fitted = fit_to_budget(cached_messages, budget)
+                if fitted is None:
+                    return over_budget(cached_messages, budget)
+                try:
+                    response = await llm.ainvoke(fitted, cached_content=handle)
+                    return {"messages": [response]}
+                except Exception as e:
+                    # Expired or rejected cache: drop the handle and send the full prompt
+                    print(f"Cached request failed, retrying without context cache: {e}")
+                    context_cache.invalidate(session_id)
+
         # Prepend system prompt to the list of messages passed to LLM
-        # We assume messages list contains Human/AI messages.
         # Note: Gemini supports SystemMessage.
-        
-        # Check if system prompt is already there (optimization)
-        # For simplicity, we create a new list
+        system_prompt = SystemMessage(content=SYSTEM_PROMPT)
+        # Turns compacted by the memory node survive as a summary
+        if summary:
+            system_prompt = SystemMessage(
+                content=system_prompt.content + f"\n\nSUMMARY OF THE EARLIER CONVERSATION:\n{summary}\n"
+            )
         all_messages = [system_prompt] + messages
-        
-        response = llm_with_tools.invoke(all_messages)
+
+        # Pre-flight estimate: trim (or refuse) prompts over the per-call or session budget
+        budget = prompt_budget()
+        fitted = fit_to_budget(all_messages, budget)
+        if fitted is None:
+            return over_budget(all_messages, budget)
+
+        response = await llm_with_tools.ainvoke(fitted)
         return {"messages": [response]}
 
-    tool_node = ToolNode(tools)
+    # Independent tool calls from one step run concurrently, each with a timeout
+    tool_node = create_tool_node(tools)
 
     # 4. Define Graph
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("tools", tool_node)
+    # Each node is timed (Metrics.stages and the /metrics stage histogram)
+    workflow.add_node("memory", timed_node("memory", create_memory_node(llm)))
+    workflow.add_node("agent", timed_node("agent", agent_node))
+    workflow.add_node("tools", timed_node("tools", tool_node))
     
-    workflow.set_entry_point("agent")
+    # Every turn starts by compacting the history, then loops agent <-> tools
+    workflow.set_entry_point("memory")
+    workflow.add_edge("memory", "agent")
     
     # 5. Define Edges
     def should_continue(state: AgentState):
@@ -97,13 +153,71 @@ def create_graph():
     return workflow
 
 # Global instance with Checkpointer
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
+import asyncio
+import aiosqlite
+from core.executor import run_blocking
+from db.checkpoint_store import CheckpointStore
+from db.session_store import SessionStore
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.db")
+
+# The model client and the async checkpointer (which needs a running event loop) are
+# built on first use instead of at import time. Tests and benchmarks may set `workflow`.
+workflow = None
+agent_app = None
+conn = None
+checkpointer = None
+session_store = None
+_init_lock = None
+
+async def _forget_documents(thread_id: str):
+    """Drops a deleted session's indexed documents (imported here: the store loads the encoder)."""
+    from db.document_store import document_store
+    await run_blocking(document_store.delete_session, thread_id)
+
+async def get_agent_app():
+    """Returns the compiled graph backed by the async SQLite checkpointer."""
+    global workflow, agent_app, conn, checkpointer, session_store, _init_lock
+    if agent_app is not None:
+        return agent_app
+
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if agent_app is None:
+            if workflow is None:
+                workflow = create_graph()
+            conn = await aiosqlite.connect(CHECKPOINT_DB)
+            # WAL, group commit and per-thread retention (see db/checkpoint_store.py)
+            checkpointer = CheckpointStore(conn)
+            checkpointer.on_delete.append(_forget_documents)
+            await checkpointer.setup()
+            session_store = SessionStore(checkpointer)
+            await session_store.setup()
+            agent_app = workflow.compile(checkpointer=checkpointer)
+    return agent_app
+
+async def get_checkpoint_conn():
+    """Shared aiosqlite connection to the checkpoint database."""
+    await get_agent_app()
+    return conn
+
+async def get_checkpointer() -> CheckpointStore:
+    await get_agent_app()
+    return checkpointer
 
-# Create DB connection
-# check_same_thread=False is crucial for FastAPI multi-threading
-conn = sqlite3.connect("checkpoints.db", check_same_thread=False)
-memory = SqliteSaver(conn)
+async def get_session_store() -> SessionStore:
+    """Session catalog and transcripts, stored alongside the checkpoints."""
+    await get_agent_app()
+    return session_store
 
-workflow = create_graph()
-agent_app = workflow.compile(checkpointer=memory)
+async def close_agent_app():
+    """Flushes and closes the checkpoint connection (its worker thread keeps the process alive)."""
+    global agent_app, conn, checkpointer, session_store, _init_lock
+    if checkpointer is not None:
+        await checkpointer.aclose()
+    agent_app = None
+    conn = None
+    checkpointer = None
+    session_store = None
+    _init_lock = None
@@ -1,10 +1,14 @@
-import operator
 from typing import Annotated, List, TypedDict, Union
 from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
 
 class AgentState(TypedDict):
     """The state of the agent execution."""
-    messages: Annotated[List[BaseMessage], operator.add]
+    # add_messages (rather than operator.add) lets the memory node replace messages by id
+    # and drop them with RemoveMessage
+    messages: Annotated[List[BaseMessage], add_messages]
+    # Running summary of turns that were compacted out of `messages`
+    summary: str
     query: str
     relevant_docs: List[str]
     steps: List[str]
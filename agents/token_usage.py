@@ -0,0 +1,122 @@
+import os
+import time
+import datetime
+from contextvars import ContextVar
+from typing import List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+
+# Input + output tokens one session may spend per UTC day (0 = unlimited)
+SESSION_DAILY_TOKEN_BUDGET = int(os.getenv("SESSION_DAILY_TOKEN_BUDGET", "0"))
+# Estimated input tokens of a single LLM call; larger prompts are trimmed or refused (0 = unlimited)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "200000"))
+
+# Gemini bills an inline image (or PDF page) at a flat rate
+IMAGE_TOKENS = 258
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap local estimate (~4 chars per token, flat cost per inline image)."""
+    total = 0
+    for msg in messages:
+        content = msg.content
+        if isinstance(content, str):
+            total += len(content) // 4
+        else:
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    total += IMAGE_TOKENS
+                elif isinstance(part, dict):
+                    total += len(str(part.get("text", ""))) // 4
+                else:
+                    total += len(str(part)) // 4
+        for call in getattr(msg, "tool_calls", None) or []:
+            total += len(str(call.get("args", ""))) // 4
+    return total
+
+
+def usage_day(ts: Optional[float] = None) -> str:
+    """The UTC date usage is booked under (YYYY-MM-DD)."""
+    return datetime.datetime.fromtimestamp(ts or time.time(), datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def seconds_until_next_day() -> int:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+class TokenUsage(BaseCallbackHandler):
+    """
+    Sums the token usage of every LLM call in one turn (agent hops, memory summaries).
+    Reads the provider's `usage_metadata`; calls that report none are estimated locally
+    (prompt from the input messages, completion from the output text) and flagged.
+    `budget` is what the turn may still spend under the session's daily budget.
+    """
+
+    run_inline = True  # plain counters: no need for a thread hop per callback
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.calls = 0
+        self.estimated = False
+        self._prompts = {}  # run_id -> estimated prompt tokens
+
+    @property
+    def total(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return None if self.budget is None else self.budget - self.total
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._prompts[run_id] = sum(estimate_tokens(batch) for batch in messages)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompts.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_estimate = self._prompts.pop(run_id, 0)
+        self.calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.output_tokens += usage.get("output_tokens", 0)
+                    self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+                else:
+                    self.input_tokens += prompt_estimate
+                    self.output_tokens += len(generation.text or "") // 4
+                    self.estimated = True
+                prompt_estimate = 0  # n > 1 completions share one prompt
+
+    def as_dict(self) -> dict:
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "llm_calls": self.calls,
+        }
+
+
+# The turn being run. Graph nodes inherit it, so the agent can check the remaining budget.
+_current_usage: ContextVar = ContextVar("axk_token_usage", default=None)
+
+
+def track_usage(usage: TokenUsage):
+    _current_usage.set(usage)
+
+
+def prompt_budget() -> Optional[int]:
+    """Estimated input tokens the next LLM call may use: the per-call cap or what is left of the session's day."""
+    limits = [PROMPT_TOKEN_BUDGET] if PROMPT_TOKEN_BUDGET > 0 else []
+    usage = _current_usage.get()
+    if usage is not None and usage.remaining is not None:
+        limits.append(max(0, usage.remaining))
+    return min(limits) if limits else None
@@ -0,0 +1,92 @@
+import os
+import asyncio
+from typing import Dict, List
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from agents.state import AgentState
+from core.telemetry import span, count_tool_call
+
+# Tool calls from one agent step that may run at the same time
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "45"))          # seconds, tools without their own limit
+TOOL_STEP_TIMEOUT = float(os.getenv("TOOL_STEP_TIMEOUT", "90"))  # seconds, whole step; unfinished calls are cancelled
+
+DEFAULT_TOOL_TIMEOUTS = {
+    "robust_search": 20.0,
+    "scrape_webpage": 60.0,   # may fall through to the headless browser
+    "search_documents": 10.0,
+}
+
+
+def _parse_tool_timeouts(raw: str) -> Dict[str, float]:
+    """'scrape_webpage=30,robust_search=10' -> {'scrape_webpage': 30.0, ...}"""
+    timeouts = {}
+    for item in (raw or "").split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            try:
+                timeouts[name.strip()] = float(seconds)
+            except ValueError:
+                pass
+    return timeouts
+
+
+def create_tool_node(tools: List, max_concurrency: int = TOOL_MAX_CONCURRENCY,
+                     timeouts: Dict[str, float] = None, step_timeout: float = TOOL_STEP_TIMEOUT):
+    """
+    Builds the graph node that executes the agent's tool calls.
+    Independent calls from one step run concurrently (at most `max_concurrency` at a
+    time), each under its own timeout. A call that fails or times out becomes an error
+    ToolMessage, so the agent still gets every other result and can decide what to do.
+    """
+    tools_by_name = {t.name: t for t in tools}
+    limits = dict(DEFAULT_TOOL_TIMEOUTS)
+    limits.update(_parse_tool_timeouts(os.getenv("TOOL_TIMEOUTS", "")))
+    limits.update(timeouts or {})
+
+    async def run_call(call: dict, semaphore: asyncio.Semaphore, config: RunnableConfig) -> ToolMessage:
+        name = call["name"]
+        tool = tools_by_name.get(name)
+        if tool is None:
+            return ToolMessage(content=f"Error: unknown tool `{name}`.", name=name, tool_call_id=call["id"], status="error")
+
+        timeout = limits.get(name, TOOL_TIMEOUT)
+        async with semaphore:
+            try:
+                # Invoking with the full tool call returns a ToolMessage and injects `config`
+                with span(f"tool:{name}"):
+                    message = await asyncio.wait_for(tool.ainvoke({**call, "type": "tool_call"}, config), timeout)
+                count_tool_call(name, "ok")
+                return message
+            except asyncio.TimeoutError:
+                count_tool_call(name, "timeout")
+                content = f"Error: `{name}` timed out after {timeout:g}s. Continue with the other results or try a different source."
+            except Exception as e:
+                count_tool_call(name, "error")
+                content = f"Error: `{name}` failed: {str(e)[:300]}"
+        return ToolMessage(content=content, name=name, tool_call_id=call["id"], status="error")
+
+    async def tools_node(state: AgentState, config: RunnableConfig):
+        calls = state["messages"][-1].tool_calls
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        tasks = [asyncio.ensure_future(run_call(call, semaphore, config)) for call in calls]
+
+        # Whatever is still running at the step deadline is cancelled and reported
+        done, pending = await asyncio.wait(tasks, timeout=step_timeout)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for call, task in zip(calls, tasks):
+            if task in done and not task.cancelled():
+                results.append(task.result())
+            else:
+                results.append(ToolMessage(
+                    content=f"Error: `{call['name']}` did not finish within this step's {step_timeout:g}s budget.",
+                    name=call["name"], tool_call_id=call["id"], status="error"
+                ))
+        return {"messages": results}
+
+    return tools_node
@@ -1,7 +1,10 @@
 import os
+import hmac
+import json
 import time
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
 from typing import List, Optional
 from dotenv import load_dotenv
 
@@ -9,12 +12,18 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from models.api_schemas import QueryRequest, QueryResponse, Source, Metrics
+from api.pipeline import Turn, turn_scope, prepare_turn, respond_from_cache, finalize_turn
+from core.lifecycle import lifespan, readiness
+from core.scheduler import Overloaded, turn_scheduler
+from core.telemetry import span, track_turn, count_turn, render_metrics
+from core.profiler import profile_id_for, profiled, profile_store, to_collapsed, to_speedscope
 
 # Initialize FastAPI app
 app = FastAPI(
     title="aXk – Intelligence Engine",
     description="Multimodal Agentic RAG System",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -33,270 +42,257 @@ LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
 if LANGCHAIN_TRACING_V2 == "true" and not LANGCHAIN_API_KEY:
     print("WARNING: LangSmith tracing is enabled but API Key is missing.")
 
+# Admin endpoints (stored profiles hold raw queries; purge is destructive) need `X-Admin-Token`.
+# Unset: they are disabled.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "service": "aXk-Intelligence-Engine"}
+    """Liveness: the process is up and serving. Does not wait for warmup."""
+    return {"status": "healthy", "service": "aXk-Intelligence-Engine", "ready": readiness()["ready"]}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: models, checkpointer and cache index are loaded (503 while warming up)."""
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Agent admission control: running turns, queue depth, wait-time percentiles, rejections."""
+    return turn_scheduler.get_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, tool calls, scrape tiers, cache lookups, in-flight turns."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Stored turn profiles (newest first). Request one with the `X-Profile: 1` header or PROFILE_SAMPLE_RATE."""
+    from core.executor import run_blocking
+    return {"profiles": await run_blocking(profile_store.list)}
+
+@app.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = Query("speedscope", pattern="^(speedscope|collapsed)$")):
+    """One turn's CPU profile as speedscope JSON or collapsed stacks (flamegraph.pl / inferno)."""
+    from core.executor import run_blocking
+    profile = await run_blocking(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(profile))
+    return to_speedscope(profile)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Semantic cache and scrape cache counters (entries, hits, evictions)."""
+    from core.executor import run_blocking
+    from db.vector_store import semantic_cache
+    from tools.scrape_cache import scrape_cache
+    return {
+        "semantic": await run_blocking(semantic_cache.get_stats),
+        "scrape": await run_blocking(scrape_cache.get_stats),
+    }
+
+@app.post("/cache/purge", dependencies=[Depends(require_admin)])
+async def cache_purge(scope: Optional[str] = None, expired_only: bool = False):
+    """
+    Empties the semantic cache, or only one scope's entries.
+    With `expired_only`, runs an eviction pass instead (expired and over-budget entries).
+    """
+    from core.executor import run_blocking
+    from db.vector_store import semantic_cache
+    try:
+        if expired_only:
+            return await run_blocking(semantic_cache.evict)
+        return {"purged": await run_blocking(semantic_cache.purge, scope)}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Cache purge failed: {e}")
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    count_turn("rejected")
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
 
 @app.post("/query", response_model=QueryResponse)
 async def query_engine(
+    response: Response,
     query: str = Form(...),
     session_id: str = Form("default_session"),
     urls: Optional[List[str]] = Form(None),
-    files: List[UploadFile] = File(None)
+    files: List[UploadFile] = File(None),
+    x_profile: Optional[str] = Header(None)
 ):
     """
     Main entry point for the Intelligence Engine.
     Accepts query, session_id, URLs, and files.
+    With an `X-Profile: 1` header (or when sampled) the turn is CPU-profiled; the
+    profile id comes back in `X-Profile-Id`, see /profiles/{id}.
     """
-    start_time = time.time()
-    
-    # Connect to LangGraph Orchestrator
-    try:
-        from agents.orchestrator import agent_app
-        from db.vector_store import semantic_cache
-        from langchain_core.messages import HumanMessage
-        
-        # 1. Check Semantic Cache
-        # Note: We might skip cache if conversation history is important, 
-        # or we need to check if the query is context-dependent.
-        # For now, we keep it simple.
-        cached_answer = semantic_cache.check_cache(query)
-        if cached_answer:
-             # Just return it, but maybe Log it to history? 
-             # Ideally we should pass it to the agent as a "tool output" or something so it knows.
-             # But for strict caching speed, we return directly.
-             pass 
-
-        # Prepare content with URLs if provided
-        # SMART INGESTION: Actively crawl/scrape the URLs instead of just passing them as text.
-        
-        import asyncio
-        from tools.ingestion import robust_scrape
-
-        content_text = query
-        if urls:
-            content_text += "\n\n--- Processed Web Sources ---\n"
-            
-            # Helper to fetch single URL using our robust scraper
-            # Note: robust_scrape is synchronous (uses requests/sync_playwright).
-            # We run it in a thread to keep FastAPI async.
-            def fetch_single(u):
-                 return (u, robust_scrape(u))
-
-            # Parallel Execution
-            tasks = [asyncio.to_thread(fetch_single, u) for u in urls]
-            results = await asyncio.gather(*tasks)
-            
-            for url, text in results:
-                if text and "Failed to extract" not in text:
-                    # "Smart" Limit: Truncate to reasonable size
-                    truncated_text = text[:15000]
-                    content_text += f"\nSOURCE: {url}\nCONTENT:\n{truncated_text}\n"
-                    if len(text) > 15000:
-                        content_text += "\n[...Content Truncated...]\n"
-                else:
-                    content_text += f"\nSOURCE: {url}\nSTATUS: Failed to extract meaningful text. (Error: {text[:100]})\n"
-
-            content_text += "\n-----------------------------------\n"
-            
-        message_parts = [{"type": "text", "text": content_text}]
-        
-        # ... (File processing code remains same) ...
-        # Process Files (Images & Documents)
-        import base64
-        import io
-        import pypdf
-        
-        for file in files or []:
-            if file.content_type.startswith("image/"):
-                file_content = await file.read()
-                encoded_image = base64.b64encode(file_content).decode("utf-8")
-                message_parts.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:{file.content_type};base64,{encoded_image}"}
-                })
-            
-            elif file.content_type == "application/pdf":
-                file_content = await file.read()
-                pdf_reader = pypdf.PdfReader(io.BytesIO(file_content))
-                text = ""
-                try:
-                    for page in pdf_reader.pages:
-                        extracted = page.extract_text()
-                        if extracted:
-                            text += extracted + "\n"
-                except:
-                    text = "" # Failed to extract text (e.g. encrypted or corrupt)
-
-                # HEURISTIC: If text is very short/empty, assume it's a SCANNED PDF (Image-based).
-                # In that case, we send the raw PDF bytes for Gemini's native OCR.
-                if len(text.strip()) < 50:
-                    encoded_pdf = base64.b64encode(file_content).decode("utf-8")
-                    message_parts.append({
-                        "type": "text",
-                        "text": f"\n\n--- Document ({file.filename}) is likely SCANNED. Processing as Image-PDF... ---\n"
-                    })
-                    # Pass as inline_data (compatible with langchain-google-genai conversion)
-                    message_parts.append({
-                        "type": "image_url", # 'image_url' key triggers Blob creation in LangChain Google
-                        "image_url": {"url": f"data:application/pdf;base64,{encoded_pdf}"}
-                    })
-                else:
-                    message_parts.append({
-                        "type": "text", 
-                        "text": f"\n\n--- Document Content ({file.filename}) ---\n{text}\n-----------------------------------\n"
-                    })
-                
-            elif file.content_type in ["text/plain", "text/csv", "application/json"]:
-                file_content = await file.read()
-                text = file_content.decode("utf-8")
-                message_parts.append({
-                    "type": "text", 
-                    "text": f"\n\n--- Document Content ({file.filename}) ---\n{text}\n-----------------------------------\n"
-                })
-            else:
-                 pass
-        
-        inputs = {"messages": [HumanMessage(content=message_parts)]}
-        config = {"configurable": {"thread_id": session_id}}
-        
-        # 2. Run Agent
-        result = agent_app.invoke(inputs, config=config)
-        
-        # Extract Answer
-        last_message = result["messages"][-1]
-        final_answer = last_message.content
-        
-        # 3. Save to Cache
-        semantic_cache.add_to_cache(query, final_answer)
-        
-        # Extract Sources (Naive extraction from tool artifacts or text)
-        # Ideally, we'd parse tool_outputs from the state history
-        # For now, we rely on the agent to cite sources in the text or Tavily's output
-        # A more robust way is to inspect `result['messages']` for ToolMessages
-        
-        sources_list = []
-        for msg in result["messages"]:
-            if msg.type == "tool":
-                # This is a simplification. Real extraction would parse the JSON/Strongly typed content
-                sources_list.append(Source(
-                    title="Agent Tool Result",
-                    content_snippet=str(msg.content)[:200] + "...",
-                    score=1.0
-                ))
-            
-        # 4. FIX REFERENCES: Add "Context" sources (PDFs, URLs) explicitly
-        if urls:
-            for u in urls:
-                sources_list.append(Source(title=f"Web: {u}", content_snippet="Provided by user", score=1.0))
-        for f in (files or []):
-             sources_list.append(Source(title=f"File: {f.filename}", content_snippet="Uploaded Document", score=1.0))
+    turn = Turn(query=query, session_id=session_id, urls=urls, files=files)
+    profile_id = profile_id_for(x_profile)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
 
-    except Exception as e:
-        final_answer = f"Error processing request: {str(e)}"
-        sources_list = []
-
-    latency = time.time() - start_time
-    
-    # Extract Token Usage & Cost (Estimate)
-    # Gemini Flash is free/cheap, but let's track it.
-    total_tokens = 0
+    # Turns of one session never overlap, even across worker processes; a full queue is a 429
     try:
-        # Loop through messages reversed to find the AI response with usage
-        for msg in reversed(result["messages"]):
-             if hasattr(msg, "response_metadata"):
-                 usage = msg.response_metadata.get("usage_metadata")
-                 if usage:
-                     total_tokens = usage.get("total_tokens", 0)
-                     break
-        # Fallback if not found in metadata
-        if total_tokens == 0:
-             # Very rough estimate: 4 chars = 1 token
-             total_tokens = len(final_answer) // 4
-    except:
-        pass
-
-    # Calculate Relevancy (Grounding Score)
-    # We use the existing encoder from semantic_cache to check similarity between Context and Answer.
-    grounding_score = 0.0
+        async with profiled(profile_id, endpoint="query", query=query, session_id=session_id):
+            with track_turn(turn.timings, "query"):
+                async with turn_scope(session_id, turn.usage):
+                    # Connect to LangGraph Orchestrator
+                    try:
+                        await prepare_turn(turn)
+                        if turn.cached:
+                            return await respond_from_cache(turn)
+
+                        # 2. Run Agent
+                        with span("agent"):
+                            result = await turn.agent_app.ainvoke(turn.inputs, config=turn.config)
+                    except Exception as e:
+                        return await finalize_turn(turn, error=e)
+
+                    return await finalize_turn(turn, result["messages"])
+    except Overloaded as e:
+        raise _overloaded(e)
+
+def _sse(event: str, data) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _chunk_text(chunk) -> str:
+    """Text carried by a streamed chat-model chunk (Gemini may send a list of parts)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+@app.post("/query/stream")
+async def query_stream(
+    query: str = Form(...),
+    session_id: str = Form("default_session"),
+    urls: Optional[List[str]] = Form(None),
+    files: List[UploadFile] = File(None),
+    x_profile: Optional[str] = Header(None)
+):
+    """
+    Streaming variant of /query (Server-Sent Events).
+    Events: `token` (LLM text), `tool_start` / `tool_end` (agent tool calls),
+    `final` (the same payload /query returns, with sources and metrics),
+    `error` (the turn was not admitted: status, detail, retry_after).
+    """
+    turn = Turn(query=query, session_id=session_id, urls=urls, files=files)
+    # Reject before the stream starts; a turn that then times out in the queue gets an error event
     try:
-        from sentence_transformers import util
-        
-        # 1. Encode Answer
-        answer_emb = semantic_cache.encoder.encode(final_answer, convert_to_tensor=True)
-        
-        # 2. Encode Context (we use the 'content_text' which aggregates all inputs)
-        # Context might be huge, so we take a representative chunk (first 5k chars) or valid sources.
-        # Ideally, we split context into chunks and find max similarity (RAG style).
-        # For efficiency, we just check against the provided text snippet.
-        if len(content_text) > 50:
-            context_snippet = content_text[:5000] # Limit to avoid processing too much
-            context_emb = semantic_cache.encoder.encode(context_snippet, convert_to_tensor=True)
-            
-            # 3. Compute Cosine Similarity
-            score = util.cos_sim(answer_emb, context_emb).item()
-            grounding_score = max(0.0, min(1.0, score)) # Clip between 0 and 1
-    except Exception as e:
-        print(f"Relevancy calculation failed: {e}")
-        grounding_score = 0.0
-
-    return QueryResponse(
-        answer=final_answer,
-        sources=sources_list,
-        metrics=Metrics(
-            latency=latency,
-            tokens_used=total_tokens,
-            grounding_score=grounding_score
-        ),
-        trace_id=session_id
-    )
+        turn_scheduler.check()
+    except Overloaded as e:
+        raise _overloaded(e)
+    profile_id = profile_id_for(x_profile)
+
+    async def event_stream():
+        try:
+            async with profiled(profile_id, endpoint="query_stream", query=query, session_id=session_id):
+                with track_turn(turn.timings, "query_stream"):
+                    async with turn_scope(session_id, turn.usage):
+                        try:
+                            await prepare_turn(turn)
+                            if turn.cached:
+                                response = await respond_from_cache(turn)
+                                yield _sse("token", {"text": response.answer})
+                                yield _sse("final", response.model_dump())
+                                return
+
+                            with span("agent"):
+                                async for event in turn.agent_app.astream_events(turn.inputs, config=turn.config, version="v2"):
+                                    kind = event["event"]
+                                    if kind == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "agent":
+                                        text = _chunk_text(event["data"]["chunk"])
+                                        if text:
+                                            if turn.first_token_at is None:
+                                                turn.first_token_at = time.time()
+                                            yield _sse("token", {"text": text})
+                                    elif kind == "on_tool_start":
+                                        yield _sse("tool_start", {"name": event["name"], "input": event["data"].get("input")})
+                                    elif kind == "on_tool_end":
+                                        output = event["data"].get("output")
+                                        output = getattr(output, "content", output)
+                                        yield _sse("tool_end", {"name": event["name"], "output": str(output)[:200]})
+
+                            state = await turn.agent_app.aget_state(turn.config)
+                            response = await finalize_turn(turn, state.values.get("messages", []))
+                        except Exception as e:
+                            response = await finalize_turn(turn, error=e)
+                        yield _sse("final", response.model_dump())
+        except Overloaded as e:
+            count_turn("rejected")
+            yield _sse("error", {"status": e.status_code, "detail": e.detail, "retry_after": e.retry_after})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if profile_id:
+        headers["X-Profile-Id"] = profile_id
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
 
 @app.get("/sessions")
-async def list_sessions():
-    """List all available chat sessions from history."""
+async def list_sessions(limit: int = Query(5, ge=1, le=100), before: Optional[float] = None):
+    """
+    Most recently active chat sessions, from the indexed session catalog.
+    Pass the returned `next_before` as `before` to fetch the next page.
+    """
     try:
-        # We need to access the sqlite connection from the orchestrator
-        from agents.orchestrator import conn
-        cursor = conn.cursor()
-        # checkpoints table has 'thread_id'
-        # Limit to last 5 recent sessions
-        cursor.execute("SELECT DISTINCT thread_id FROM checkpoints ORDER BY thread_id DESC LIMIT 5")
-        threads = [row[0] for row in cursor.fetchall()]
-        return {"sessions": threads}
+        from agents.orchestrator import get_session_store
+        store = await get_session_store()
+        return await store.list_sessions(limit=limit, before=before)
     except Exception as e:
-         return {"sessions": [], "error": str(e)}
+         return {"sessions": [], "next_before": None, "error": str(e)}
+
+@app.get("/sessions/{session_id}/usage")
+async def session_usage(session_id: str, days: int = Query(30, ge=1, le=366)):
+    """The session's LLM token usage per UTC day (input, output, cached, calls, turns) and its daily budget."""
+    from agents.orchestrator import get_session_store
+    from agents.token_usage import SESSION_DAILY_TOKEN_BUDGET
+    store = await get_session_store()
+    return {
+        "session_id": session_id,
+        "daily_budget": SESSION_DAILY_TOKEN_BUDGET or None,
+        "days": await store.get_usage(session_id, days=days),
+    }
+
+@app.get("/usage/top")
+async def top_usage(day: Optional[str] = None, limit: int = Query(10, ge=1, le=100)):
+    """Sessions that spent the most tokens on `day` (UTC, YYYY-MM-DD; default today)."""
+    from agents.orchestrator import get_session_store
+    from agents.token_usage import usage_day
+    store = await get_session_store()
+    day = day or usage_day()
+    return {"day": day, "sessions": await store.top_usage(day, limit=limit)}
 
 @app.get("/history/{session_id}")
-async def get_history(session_id: str):
-    """Retrieve message history for a specific session."""
+async def get_history(session_id: str, limit: int = Query(100, ge=1, le=1000), before: Optional[int] = None):
+    """
+    Message history for a session from its transcript (latest `limit` messages, oldest first).
+    Pass the returned `next_before` as `before` to fetch older messages.
+    """
     try:
-        from agents.orchestrator import agent_app
-        config = {"configurable": {"thread_id": session_id}}
-        state = agent_app.get_state(config)
-        
-        history = []
-        if state and state.values:
-            raw_msgs = state.values.get("messages", [])
-            for msg in raw_msgs:
-                # Map LangChain message types to Frontend roles
-                role = "user"
-                if msg.type == "ai":
-                    role = "assistant"
-                elif msg.type == "human":
-                    role = "user"
-                else:
-                    # Skip tool messages in the history view for cleanliness, 
-                    # or map them if needed. For now, skip.
-                    continue
-                    
-                history.append({
-                    "role": role,
-                    "content": msg.content
-                })
-        return {"history": history}
+        from agents.orchestrator import get_session_store
+        store = await get_session_store()
+        page = await store.get_transcript(session_id, limit=limit, before=before)
+        if not page["history"] and before is None:
+            # Sessions from before the transcript existed are projected once from graph state
+            from agents.orchestrator import get_agent_app
+            agent_app = await get_agent_app()
+            state = await agent_app.aget_state({"configurable": {"thread_id": session_id}})
+            if state and state.values and state.values.get("messages"):
+                await store.backfill_transcript(session_id, state.values["messages"])
+                page = await store.get_transcript(session_id, limit=limit)
+        return page
     except Exception as e:
-        return {"history": [], "error": str(e)}
+        return {"history": [], "next_before": None, "error": str(e)}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,73 @@
+"""
+Shared embedding process for multi-worker deployments (started by api/serve.py).
+
+Holds the only copy of the sentence-transformers model. API workers send batches to
+POST /embed and get back raw float32 vectors; requests from all workers are
+micro-batched together by the EmbeddingService in this process.
+
+    python -m api.embedding_server --uds /tmp/axk-embeddings.sock
+"""
+import os
+import sys
+import argparse
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# This process owns the model: never forward to another embedding server
+os.environ.pop("EMBEDDING_SERVER", None)
+
+from fastapi import FastAPI, Response
+from pydantic import BaseModel
+
+from core.executor import run_blocking
+
+
+class EmbedRequest(BaseModel):
+    texts: list[str]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    from db.embeddings import embedding_service
+    await run_blocking(embedding_service.warmup)
+    try:
+        yield
+    finally:
+        await run_blocking(embedding_service.close)
+
+
+app = FastAPI(title="aXk – Embeddings", lifespan=lifespan)
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    """Vectors for `texts` as a row-major float32 (n, dim) buffer."""
+    from db.embeddings import embedding_service
+    # Workers keep their own memo; only batching happens here
+    vectors = await embedding_service.aembed_many(request.texts, memoize=False)
+    return Response(content=vectors.astype("float32").tobytes(), media_type="application/octet-stream")
+
+
+@app.get("/stats")
+async def stats():
+    from db.embeddings import embedding_service
+    return embedding_service.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uds", help="Unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8061)
+    args = parser.parse_args()
+
+    import uvicorn
+    if args.uds:
+        uvicorn.run(app, uds=args.uds, log_level="warning")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import os
+import time
+import tempfile
+import base64
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from fastapi import UploadFile
+
+from models.api_schemas import QueryResponse, Source, Metrics
+from core.executor import run_blocking
+from core.session_lock import multi_process
+from core.scheduler import Overloaded, turn_scheduler
+from core.telemetry import TurnTimings, span, count_turn, count_cache_lookup
+from agents.token_usage import SESSION_DAILY_TOKEN_BUDGET, TokenUsage, track_usage, usage_day, seconds_until_next_day
+
+# Scanned PDF pages are sent inline as images; cap how many per document
+PDF_MAX_SCANNED_PAGES = int(os.getenv("PDF_MAX_SCANNED_PAGES", "20"))
+
+
+@dataclass
+class Turn:
+    """Everything one /query (or /query/stream) request carries through the pipeline."""
+    query: str
+    session_id: str
+    urls: Optional[List[str]] = None
+    files: Optional[List[UploadFile]] = None
+    start_time: float = field(default_factory=time.time)
+    agent_app: Any = None
+    config: dict = field(default_factory=dict)
+    cache_scope: Optional[str] = None
+    cache_latency: Optional[float] = None
+    cached: Optional[dict] = None
+    content_text: str = ""
+    inputs: Optional[dict] = None
+    retrieved: list = field(default_factory=list)
+    first_token_at: Optional[float] = None
+    query_vector: Any = None
+    timings: TurnTimings = field(default_factory=TurnTimings)
+    usage: TokenUsage = field(default_factory=TokenUsage)
+
+
+async def _spool_upload(file: UploadFile, chunk_size: int = 1024 * 1024):
+    """
+    Copies an upload to a temp file in fixed-size chunks (memory stays bounded for large
+    files) and hashes it on the way. Returns (path, sha256 hex digest).
+    """
+    hasher = hashlib.sha256()
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(prefix="axk-upload-", suffix=suffix, delete=False) as tmp:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            await run_blocking(tmp.write, chunk)
+    return tmp.name, hasher.hexdigest()
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _query_vector(turn: Turn):
+    """The query embedding, computed once per turn and shared by cache lookup, retrieval and insert."""
+    from db.embeddings import embedding_service
+
+    if turn.query_vector is None:
+        turn.query_vector = await embedding_service.aembed(turn.query)
+    return turn.query_vector
+
+async def _compute_grounding(answer: str, turn: Turn, messages: list) -> dict:
+    """Per-claim support of the answer by this turn's excerpts and tool outputs."""
+    from agents.grounding import context_chunks, evaluate_grounding
+
+    # Only tool results produced in this turn (after the latest user message)
+    start = max((i for i, m in enumerate(messages) if m.type == "human"), default=-1) + 1
+    tool_outputs = [(getattr(m, "name", None) or "tool", m.content) for m in messages[start:] if m.type == "tool"]
+    return await evaluate_grounding(answer, context_chunks(turn.retrieved, tool_outputs))
+
+async def _record_usage(turn: Turn):
+    """Books the turn's token usage (failed turns included) under the session and today's date."""
+    from agents.orchestrator import get_session_store
+
+    try:
+        store = await get_session_store()
+        await store.record_usage(turn.session_id, usage_day(turn.start_time), turn.usage.as_dict())
+    except Exception as e:
+        print(f"Token usage update failed: {e}")
+
+async def _record_turn(turn: Turn, answer: str, tokens: int):
+    """Updates the session catalog and transcript (history/listing never rebuild graph state)."""
+    from agents.orchestrator import get_session_store
+
+    try:
+        store = await get_session_store()
+        with span("session_record"):
+            await store.record_turn(turn.session_id, turn.query, answer, tokens)
+    except Exception as e:
+        print(f"Session catalog update failed: {e}")
+
+
+@asynccontextmanager
+async def turn_scope(session_id: str, usage: Optional[TokenUsage] = None):
+    """
+    Admits a turn through the scheduler (session lock + concurrency slot) and holds both
+    until it ends; raises `Overloaded` when the queue is full or the wait times out, and
+    (429) when the session has used up SESSION_DAILY_TOKEN_BUDGET for today. What is
+    left of that budget is handed to `usage`, which the agent checks before each call.
+    With several workers the checkpoint group commit is flushed before the lock is
+    released, so the next turn of this session, in whichever process, reads the state
+    this one wrote.
+    """
+    async with turn_scheduler.admit(session_id):
+        if SESSION_DAILY_TOKEN_BUDGET > 0 and usage is not None:
+            from agents.orchestrator import get_session_store
+            # Checked under the session lock, so concurrent turns cannot both spend the rest
+            spent = await (await get_session_store()).tokens_on(session_id, usage_day())
+            usage.budget = SESSION_DAILY_TOKEN_BUDGET - spent
+            if usage.budget <= 0:
+                raise Overloaded(429, seconds_until_next_day(), "This session's daily token budget is used up")
+        try:
+            yield
+        finally:
+            if multi_process():
+                from agents.orchestrator import get_checkpointer
+                try:
+                    with span("checkpoint_flush"):
+                        await (await get_checkpointer()).flush()
+                except Exception as e:
+                    print(f"Checkpoint flush failed: {e}")
+
+
+async def prepare_turn(turn: Turn):
+    """
+    Checks the semantic cache and, on a miss, ingests URLs/files into the agent inputs.
+    Sets `turn.cached` on a hit, otherwise `turn.inputs`. Attachments are indexed in the
+    session's document store either way, so follow-up turns can retrieve them.
+    """
+    from agents.orchestrator import get_agent_app
+
+    turn.agent_app = await get_agent_app()
+    # Every LLM call of the run (agent hops, memory summaries) reports its usage to turn.usage
+    turn.config = {"configurable": {"thread_id": turn.session_id}, "callbacks": [turn.usage]}
+    track_usage(turn.usage)
+    turn.content_text = turn.query
+
+    # Spool uploads to disk once: the digests feed the cache key, the files feed ingestion
+    with span("upload"):
+        uploads = [(file, *(await _spool_upload(file))) for file in turn.files or []]
+    try:
+        await _check_cache_and_ingest(turn, uploads)
+    finally:
+        for _, path, _ in uploads:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+async def _check_cache_and_ingest(turn: Turn, uploads: list):
+    from db.vector_store import semantic_cache
+    from db.cache_policy import fingerprint_inputs, build_cache_scope
+    from langchain_core.messages import HumanMessage
+
+    query, urls = turn.query, turn.urls
+    file_digests = [digest for _, _, digest in uploads]
+
+    # 1. Check Semantic Cache
+    # The key covers the query, the attached URLs/files and (for sessions with history)
+    # the session itself, so follow-ups never get another conversation's answer.
+    cache_start = time.time()
+    with span("cache_lookup"):
+        from agents.orchestrator import get_checkpointer
+        # An index probe on the checkpoints table, not a checkpoint load and deserialization
+        has_history = await (await get_checkpointer()).has_thread(turn.session_id)
+        turn.cache_scope = build_cache_scope(
+            query, turn.session_id, fingerprint_inputs(urls, file_digests), has_history
+        )
+        if turn.cache_scope:
+            vector = await _query_vector(turn)
+            turn.cached = await run_blocking(semantic_cache.check_cache, query, scope=turn.cache_scope, vector=vector)
+    turn.cache_latency = time.time() - cache_start
+    count_cache_lookup("bypass" if not turn.cache_scope else "hit" if turn.cached else "miss")
+
+    if turn.cached and not (urls or uploads):
+        return
+
+    # SMART INGESTION: Actively crawl/scrape the URLs, then chunk + index them (and any
+    # uploaded documents) in the session's document store. Only the excerpts relevant to
+    # this query go into the prompt; the agent can fetch more with `search_documents`.
+
+    from tools.ingestion import arobust_scrape
+    from tools.retrieval import RETRIEVAL_TOP_K, format_chunks
+    from tools.pdf_ingestion import iter_pdf_pages
+    from agents.memory import EXCERPTS_MARKER
+    from db.document_store import document_store
+
+    documents = []      # (source, text) pairs to index
+    manifest = []       # what was attached this turn, for the agent's benefit
+    media_parts = []    # images / scanned PDFs still go to Gemini inline
+
+    if urls:
+        # Parallel Execution: the shared fetcher caps global and per-host concurrency,
+        # so many URLs cost pooled connections, not threads.
+        with span("scrape"):
+            texts = await asyncio.gather(*[arobust_scrape(u) for u in urls])
+        results = zip(urls, texts)
+
+        for url, text in results:
+            if text and "Failed to extract" not in text:
+                documents.append((url, text))
+            else:
+                manifest.append(f"- {url}: Failed to extract meaningful text. (Error: {text[:100]})")
+
+    # Process Files (Images & Documents)
+    for file, path, _ in uploads:
+        if file.content_type.startswith("image/"):
+            file_content = await run_blocking(_read_file, path)
+            encoded_image = base64.b64encode(file_content).decode("utf-8")
+            media_parts.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{file.content_type};base64,{encoded_image}"}
+            })
+
+        elif file.content_type == "application/pdf":
+            # Pages are extracted in parallel worker processes and indexed batch by batch
+            # as they arrive. Scanned pages (no text layer) are detected one at a time and
+            # only those pages are sent to Gemini for native OCR; workers stop building
+            # page PDFs once PDF_MAX_SCANNED_PAGES are found.
+            pages = n_chunks = scanned = 0
+            scanned_pages = []
+            try:
+                with span("pdf"):
+                    async for batch in iter_pdf_pages(path, max_scanned=PDF_MAX_SCANNED_PAGES):
+                        pages += len(batch)
+                        text = "".join(
+                            f"\n[Page {p['page']}]\n{p['text']}\n" for p in batch if not p["scanned"] and p["text"].strip()
+                        )
+                        if text:
+                            n_chunks += await run_blocking(document_store.index_document, turn.session_id, file.filename, text)
+                        for p in batch:
+                            if p["scanned"]:
+                                scanned += 1
+                                if len(scanned_pages) < PDF_MAX_SCANNED_PAGES and p["pdf"] is not None:
+                                    scanned_pages.append(p)
+            except Exception as e:
+                manifest.append(f"- {file.filename}: Failed to read PDF. (Error: {str(e)[:100]})")
+                continue
+
+            for p in scanned_pages:
+                encoded_page = base64.b64encode(p["pdf"]).decode("utf-8")
+                media_parts.append({
+                    "type": "text",
+                    "text": f"\n\n--- Page {p['page']} of {file.filename} is SCANNED. Processing as Image-PDF... ---\n"
+                })
+                # Pass as inline_data (compatible with langchain-google-genai conversion)
+                media_parts.append({
+                    "type": "image_url", # 'image_url' key triggers Blob creation in LangChain Google
+                    "image_url": {"url": f"data:application/pdf;base64,{encoded_page}"}
+                })
+
+            summary = f"- {file.filename}: {pages} pages, indexed {n_chunks} chunks"
+            if scanned:
+                summary += f", {scanned} scanned pages attached as images"
+                if scanned > PDF_MAX_SCANNED_PAGES:
+                    summary += f" (first {PDF_MAX_SCANNED_PAGES} only)"
+            manifest.append(summary)
+
+        elif file.content_type in ["text/plain", "text/csv", "application/json"]:
+            file_content = await run_blocking(_read_file, path)
+            documents.append((file.filename, file_content.decode("utf-8", errors="replace")))
+        else:
+             pass
+
+    # Chunk + batch-embed off the event loop
+    for source, text in documents:
+        with span("index"):
+            n_chunks = await run_blocking(document_store.index_document, turn.session_id, source, text)
+        manifest.append(f"- {source}: indexed {n_chunks} chunks ({len(text)} chars)")
+
+    if turn.cached:
+        # The answer comes from the cache; the attachments only had to be indexed
+        return
+
+    content_text = query
+    if manifest:
+        content_text += "\n\n--- Knowledge Base (attached this turn) ---\n" + "\n".join(manifest) + "\n"
+
+    if await run_blocking(document_store.has_documents, turn.session_id):
+        with span("retrieval"):
+            vector = await _query_vector(turn)
+            # Chunk vectors come back too, so grounding does not re-embed the excerpts
+            turn.retrieved = await run_blocking(
+                document_store.search, turn.session_id, query, RETRIEVAL_TOP_K, vector=vector, with_vectors=True
+            )
+        if turn.retrieved:
+            content_text += EXCERPTS_MARKER + format_chunks(turn.retrieved) + "\n-----------------------------------\n"
+    turn.content_text = content_text
+
+    message_parts = [{"type": "text", "text": content_text}] + media_parts
+    turn.inputs = {"messages": [HumanMessage(content=message_parts)]}
+
+
+async def respond_from_cache(turn: Turn) -> QueryResponse:
+    """Fast path for a cache hit: no agent run, but the exchange is kept in session history."""
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    cached = turn.cached
+    await turn.agent_app.aupdate_state(
+        turn.config,
+        {"messages": [HumanMessage(content=turn.query), AIMessage(content=cached["answer"])]},
+        as_node="agent"
+    )
+    await _record_turn(turn, cached["answer"], 0)
+    count_turn("cache_hit")
+    cached_metrics = cached.get("metrics") or {}
+    latency = time.time() - turn.start_time
+    return QueryResponse(
+        answer=cached["answer"],
+        sources=[Source(**src) for src in cached.get("sources") or []],
+        metrics=Metrics(
+            latency=latency,
+            tokens_used=0,
+            grounding_score=cached_metrics.get("grounding_score"),
+            cache_hit=True,
+            cache_latency=turn.cache_latency,
+            time_to_first_token=latency,
+            stages=turn.timings.summary()
+        ),
+        trace_id=turn.session_id
+    )
+
+
+async def finalize_turn(turn: Turn, messages: Optional[list] = None, error: Optional[Exception] = None) -> QueryResponse:
+    """Builds the response from the agent's final messages (or an error) and fills the cache."""
+    if error is None:
+        # Extract Answer
+        last_message = messages[-1]
+        final_answer = last_message.content
+
+        # Extract Sources (Naive extraction from tool artifacts or text)
+        # Ideally, we'd parse tool_outputs from the state history
+        # For now, we rely on the agent to cite sources in the text or Tavily's output
+        # A more robust way is to inspect `result['messages']` for ToolMessages
+
+        sources_list = []
+        for msg in messages:
+            if msg.type == "tool":
+                # This is a simplification. Real extraction would parse the JSON/Strongly typed content
+                sources_list.append(Source(
+                    title="Agent Tool Result",
+                    content_snippet=str(msg.content)[:200] + "...",
+                    score=1.0
+                ))
+
+        # Excerpts retrieved from the session's document index for this query
+        for hit in turn.retrieved:
+            sources_list.append(Source(
+                title=f"Excerpt: {hit.get('source')}",
+                url=hit.get("source") if str(hit.get("source", "")).startswith("http") else None,
+                content_snippet=str(hit.get("text", ""))[:200] + "...",
+                score=max(0.0, float(hit.get("score", 0.0)))
+            ))
+
+        # 4. FIX REFERENCES: Add "Context" sources (PDFs, URLs) explicitly
+        if turn.urls:
+            for u in turn.urls:
+                sources_list.append(Source(title=f"Web: {u}", content_snippet="Provided by user", score=1.0))
+        for f in (turn.files or []):
+             sources_list.append(Source(title=f"File: {f.filename}", content_snippet="Uploaded Document", score=1.0))
+    else:
+        final_answer = f"Error processing request: {str(error)}"
+        sources_list = []
+        turn.cache_scope = None # Never cache failures
+
+    latency = time.time() - turn.start_time
+
+    # Token usage summed over every LLM call of the run (see agents/token_usage.py),
+    # booked per session and day even when the turn failed
+    total_tokens = turn.usage.total
+    await _record_usage(turn)
+
+    # Calculate Relevancy (Grounding Score)
+    # Each answer sentence is matched against the retrieved excerpts and tool outputs.
+    grounding_score = 0.0
+    grounding_claims = []
+    if error is None:
+        try:
+            with span("grounding"):
+                grounding = await _compute_grounding(final_answer, turn, messages)
+            grounding_score, grounding_claims = grounding["score"], grounding["claims"]
+        except Exception as e:
+            print(f"Relevancy calculation failed: {e}")
+
+    if error is None:
+        await _record_turn(turn, final_answer, total_tokens)
+    count_turn("ok" if error is None else "error")
+
+    # 3. Save to Cache (only reached on a cache miss)
+    if turn.cache_scope:
+        from db.vector_store import semantic_cache
+        with span("cache_store"):
+            await run_blocking(
+                semantic_cache.add_to_cache,
+                turn.query,
+                final_answer,
+                scope=turn.cache_scope,
+                sources=[src.model_dump() for src in sources_list],
+                metrics={"tokens_used": total_tokens, "grounding_score": grounding_score},
+                vector=await _query_vector(turn)
+            )
+
+    return QueryResponse(
+        answer=final_answer,
+        sources=sources_list,
+        metrics=Metrics(
+            latency=latency,
+            tokens_used=total_tokens,
+            **turn.usage.as_dict(),
+            tokens_estimated=turn.usage.estimated,
+            grounding_score=grounding_score,
+            grounding_claims=grounding_claims,
+            cache_hit=False,
+            cache_latency=turn.cache_latency,
+            time_to_first_token=(turn.first_token_at - turn.start_time) if turn.first_token_at else None,
+            stages=turn.timings.summary()
+        ),
+        trace_id=turn.session_id
+    )
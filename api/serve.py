@@ -0,0 +1,63 @@
+"""
+Multi-worker serving mode.
+
+Starts one shared embedding process (api/embedding_server.py), then `--workers`
+uvicorn worker processes for the API. Workers share:
+- the embedding model, through the embedding process (EMBEDDING_SERVER)
+- checkpoints, the session catalog and the scrape cache, in SQLite files in WAL mode
+  with a busy timeout (one writer at a time, readers never blocked)
+- the semantic cache and document index in Qdrant (the in-process fallback index is
+  per worker)
+Turns of one session are serialized across workers with a file lock per session
+(core/session_lock.py), and each turn's checkpoints are committed before its lock is
+released.
+/metrics aggregates every worker's counters and histograms (prometheus_client
+multi-process mode, PROMETHEUS_MULTIPROC_DIR).
+
+    python -m api.serve --workers 4 --port 8050
+
+For development with auto-reload, use `python -m api.app` (single process).
+"""
+import os
+import sys
+import atexit
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_embedding_server(uds: str) -> subprocess.Popen:
+    if os.path.exists(uds):
+        os.unlink(uds)
+    env = {k: v for k, v in os.environ.items() if k != "EMBEDDING_SERVER"}
+    process = subprocess.Popen([sys.executable, "-m", "api.embedding_server", "--uds", uds], cwd=ROOT, env=env)
+    atexit.register(process.terminate)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--embedding-socket", default=os.path.join(tempfile.gettempdir(), "axk-embeddings.sock"))
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    if workers > 1 and not os.getenv("EMBEDDING_SERVER"):
+        start_embedding_server(args.embedding_socket)
+        os.environ["EMBEDDING_SERVER"] = f"unix:{args.embedding_socket}"
+    if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Each worker writes its metrics here; stale files from earlier runs would be summed in
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="axk-metrics-")
+    # Read by core/session_lock.py in every worker
+    os.environ["AXK_WORKERS"] = str(workers)
+
+    import uvicorn
+    uvicorn.run("api.app:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Checkpoint write throughput under concurrent sessions.
+
+Runs `--sessions` concurrent threads of `--turns` turns each through a small graph
+(memory-less agent step that appends one message), once with the stock
+AsyncSqliteSaver and once with CheckpointStore (synchronous=NORMAL, group commit,
+retention), each on a fresh database file. Reports checkpoints written per second
+and the resulting database size.
+
+    python -m benchmarks.checkpoint_bench --sessions 32 --turns 20
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import StateGraph, END
+
+from agents.state import AgentState
+from db.checkpoint_store import CheckpointStore
+
+
+def _build_graph():
+    async def step(state: AgentState):
+        return {"messages": [AIMessage(content="ok " * 50)]}
+
+    graph = StateGraph(AgentState)
+    graph.add_node("agent", step)
+    graph.set_entry_point("agent")
+    graph.add_edge("agent", END)
+    return graph
+
+
+async def run(store: str, sessions: int, turns: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="axk-ckpt-"), "checkpoints.db")
+    conn = await aiosqlite.connect(path)
+    saver = CheckpointStore(conn) if store == "tuned" else AsyncSqliteSaver(conn)
+    await saver.setup()
+    app = _build_graph().compile(checkpointer=saver)
+
+    # Count every checkpoint the graph writes (one per super-step, plus the input)
+    written = 0
+    put = saver.aput
+
+    async def counting_put(*args, **kwargs):
+        nonlocal written
+        written += 1
+        return await put(*args, **kwargs)
+
+    saver.aput = counting_put
+
+    async def session():
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        for i in range(turns):
+            await app.ainvoke({"messages": [HumanMessage(content=f"turn {i}")]}, config)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[session() for _ in range(sessions)])
+    elapsed = time.perf_counter() - t0
+
+    async with conn.execute("SELECT COUNT(*) FROM checkpoints") as cursor:
+        remaining = (await cursor.fetchone())[0]
+    if store == "tuned":
+        await saver.aclose()
+    else:
+        await conn.close()
+
+    size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    return {
+        "store": store,
+        "sessions": sessions,
+        "turns": turns,
+        "seconds": round(elapsed, 2),
+        "checkpoints_per_s": round(written / elapsed, 1),
+        "rows_kept": remaining,
+        "db_kb": size // 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--store", choices=["stock", "tuned", "both"], default="both")
+    args = parser.parse_args()
+
+    stores = ["stock", "tuned"] if args.store == "both" else [args.store]
+    for store in stores:
+        print(asyncio.run(run(store, args.sessions, args.turns)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Load benchmark for the async request path.
+
+Fires N concurrent /query requests against the in-process FastAPI app with a stubbed
+chat model and measures total wall time plus /health latency while the load is running.
+Compare `--mode async` (awaitable LLM) with `--mode blocking` (LLM that sleeps on the
+event loop, like the old synchronous `invoke`).
+
+    python -m benchmarks.concurrency_bench --requests 20 --latency 0.5
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CACHE_CONTEXT_POLICY", "off")
+os.environ.setdefault("CHECKPOINT_DB", "bench_checkpoints.db")
+
+import httpx
+
+from benchmarks.fakes import FakeChatModel
+
+
+async def _probe_health(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get("/health")
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.05)
+
+
+async def run(mode: str, n_requests: int, latency: float) -> dict:
+    from agents import orchestrator
+    from api.app import app
+
+    orchestrator.workflow = orchestrator.create_graph(
+        llm=FakeChatModel(latency=latency, blocking=(mode == "blocking"))
+    )
+    await orchestrator.close_agent_app()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm up imports, model loading and the checkpointer outside the measurement
+        await client.post("/query", data={"query": "warmup", "session_id": str(uuid.uuid4())})
+
+        stop = asyncio.Event()
+        health_samples = []
+        probe = asyncio.create_task(_probe_health(client, stop, health_samples))
+
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/query", data={"query": f"benchmark question {i}", "session_id": str(uuid.uuid4())})
+            for i in range(n_requests)
+        ])
+        wall = time.perf_counter() - t0
+
+        stop.set()
+        await probe
+
+    await orchestrator.close_agent_app()
+
+    ok = sum(1 for r in responses if r.status_code == 200)
+    health_samples.sort()
+    return {
+        "mode": mode,
+        "requests": n_requests,
+        "ok": ok,
+        "llm_latency_s": latency,
+        "wall_time_s": round(wall, 3),
+        "throughput_rps": round(n_requests / wall, 2),
+        "serial_lower_bound_s": round(n_requests * latency, 3),
+        "health_max_s": round(health_samples[-1], 3) if health_samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated LLM latency per call (s)")
+    parser.add_argument("--mode", choices=["async", "blocking", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["blocking", "async"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        print(asyncio.run(run(mode, args.requests, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline end-to-end benchmark of /query.
+
+Runs the in-process FastAPI app against a stubbed chat model (benchmarks/fakes.py),
+the local Tavily stand-in (benchmarks/fake_tavily.py) and the local web fixture
+server (benchmarks/fixture_server.py). Two real components remain: the embedding
+model, which must be available locally, and the browser tier. The url_heavy and mixed
+workloads attach `/js` pages, which render in headless Chromium through the shared
+browser pool (BROWSER_POOL_SIZE / BROWSER_MAX_PAGES), so Playwright's Chromium must be
+installed. Chromium startup and render time count towards those latencies; its memory
+does not, since peak RSS covers only this process.
+Workloads:
+
+    cache_hit   fresh sessions asking the same question (semantic cache hits after the first)
+    url_heavy   one turn per session with static, JS-rendered and large pages attached
+    pdf_heavy   one turn per session with a multi-page PDF uploaded
+    multi_turn  sessions of several follow-up turns
+    mixed       all of the above, interleaved
+
+Reports p50/p95/p99 latency, throughput, errors and peak RSS per workload. Save a
+baseline with `--save-baseline`, then compare later runs with `--baseline`: the run
+exits non-zero if p95 latency, throughput or peak RSS regressed beyond `--tolerance`.
+
+    python -m benchmarks.e2e_bench --sessions 20 --concurrency 8 --save-baseline bench_baseline.json
+    python -m benchmarks.e2e_bench --sessions 20 --concurrency 8 --baseline bench_baseline.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_tavily import FakeTavily
+from benchmarks.fixture_server import FixtureServer, pdf_document
+
+WORKLOADS = ("cache_hit", "url_heavy", "pdf_heavy", "multi_turn", "mixed")
+TOOL_SCRIPTS = {
+    "none": [],
+    "search": [[{"name": "robust_search", "args": {"query": "{query}"}}]],
+    "search+docs": [[{"name": "robust_search", "args": {"query": "{query}"}},
+                     {"name": "search_documents", "args": {"query": "{query}"}}]],
+}
+FOLLOW_UPS = [
+    "Summarize the main trade-offs of semantic caching for chat assistants",
+    "Explain why chunk overlap matters when indexing long documents",
+    "Describe how connection pooling lowers scraping latency",
+    "Compare server-rendered and script-rendered pages for text extraction",
+]
+
+
+def _configure_environment(workdir: str, tavily_url: str):
+    """Points every store and external service at local, throwaway stand-ins. Must run before importing the app."""
+    os.environ.update({
+        "CHECKPOINT_DB": os.path.join(workdir, "checkpoints.db"),
+        "SCRAPE_CACHE_DB": os.path.join(workdir, "scrape_cache.db"),
+        "SEMANTIC_CACHE_BACKEND": "memory",
+        "CACHE_CONTEXT_POLICY": "auto",
+        "CONTEXT_CACHE": "off",
+        "TAVILY_API_URL": tavily_url,
+        "TAVILY_API_KEY": "fake",
+        "AGENT_MAX_QUEUE": os.getenv("AGENT_MAX_QUEUE", "100000"),
+    })
+
+
+# --- Workloads: lists of sessions, each a list of request specs run in order ---
+
+def build_workload(name: str, sessions: int, turns: int, fixtures_url: str, pdf: bytes) -> list:
+    rng = random.Random(42)
+
+    def cache_hit(i):
+        return [{"query": "Explain how retrieval augmented generation reduces hallucinations in enterprise search"}]
+
+    def url_heavy(i):
+        return [{
+            "query": f"Give an overview of the attached pages, variant {i}",
+            "urls": [f"{fixtures_url}/static/20?s={i}", f"{fixtures_url}/js/10?s={i}", f"{fixtures_url}/large/256?s={i}"],
+        }]
+
+    def pdf_heavy(i):
+        return [{"query": f"What does the attached report cover, variant {i}", "files": [("report.pdf", pdf, "application/pdf")]}]
+
+    def multi_turn(i):
+        return [{"query": f"{FOLLOW_UPS[t % len(FOLLOW_UPS)]} (session {i}, turn {t + 1})"} for t in range(turns)]
+
+    builders = {"cache_hit": cache_hit, "url_heavy": url_heavy, "pdf_heavy": pdf_heavy, "multi_turn": multi_turn}
+    if name == "mixed":
+        kinds = list(builders)
+        plan = [builders[kinds[i % len(kinds)]](i) for i in range(sessions)]
+        rng.shuffle(plan)
+        return plan
+    return [builders[name](i) for i in range(sessions)]
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_workload(client, plan: list, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, cache_hits = [], 0, 0
+
+    async def session(requests_):
+        nonlocal errors, cache_hits
+        session_id = str(uuid.uuid4())
+        async with semaphore:
+            for spec in requests_:
+                data = {"query": spec["query"], "session_id": session_id}
+                if spec.get("urls"):
+                    data["urls"] = spec["urls"]
+                files = [("files", f) for f in spec.get("files", [])] or None
+                t0 = time.perf_counter()
+                response = await client.post("/query", data=data, files=files)
+                latencies.append(time.perf_counter() - t0)
+                body = response.json() if response.status_code == 200 else {}
+                if response.status_code != 200 or str(body.get("answer", "")).startswith("Error processing request"):
+                    errors += 1
+                elif (body.get("metrics") or {}).get("cache_hit"):
+                    cache_hits += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[session(s) for s in plan])
+    wall = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "cache_hits": cache_hits,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_s": round(_percentile(latencies, 0.50), 3),
+        "p95_s": round(_percentile(latencies, 0.95), 3),
+        "p99_s": round(_percentile(latencies, 0.99), 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+async def run(args) -> dict:
+    tavily = FakeTavily(latency=args.search_latency).start()
+    fixtures = FixtureServer(latency=args.page_latency).start()
+    workdir = tempfile.mkdtemp(prefix="axk-e2e-")
+    _configure_environment(workdir, tavily.url)
+
+    import httpx
+    from agents import orchestrator
+    from api.app import app
+    from benchmarks.fakes import FakeChatModel
+
+    orchestrator.workflow = orchestrator.create_graph(llm=FakeChatModel(
+        latency=args.llm_latency,
+        answer_tokens=args.answer_tokens,
+        tool_script=TOOL_SCRIPTS[args.tools],
+    ))
+    await orchestrator.close_agent_app()
+
+    pdf = pdf_document(args.pdf_pages)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Model loading, graph compilation and the checkpointer stay out of the measurements
+            await client.post("/query", data={"query": "warmup request for the benchmark", "session_id": str(uuid.uuid4())})
+            for name in args.workloads:
+                plan = build_workload(name, args.sessions, args.turns, fixtures.url, pdf)
+                results[name] = await run_workload(client, plan, args.concurrency)
+                print(name, results[name])
+    finally:
+        await orchestrator.close_agent_app()
+        tavily.stop()
+        fixtures.stop()
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")},
+        "workloads": results,
+        "stub_requests": {"tavily": len(tavily.requests), "fixtures": dict(fixtures.requests)},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of p95 latency, throughput and peak RSS beyond `tolerance` (relative)."""
+    regressions = []
+    for name, now in current["workloads"].items():
+        before = baseline.get("workloads", {}).get(name)
+        if not before:
+            continue
+        checks = (
+            ("p95_s", now["p95_s"] > before["p95_s"] * (1 + tolerance)),
+            ("throughput_rps", now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance)),
+            ("peak_rss_mb", now["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance)),
+        )
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append(f"{name}.{metric}: {before[metric]} -> {now[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--sessions", type=int, default=20, help="sessions per workload")
+    parser.add_argument("--turns", type=int, default=4, help="turns per multi_turn session")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions in flight")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="simulated seconds per LLM call")
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--tools", choices=list(TOOL_SCRIPTS), default="search")
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--pdf-pages", type=int, default=30)
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results as a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    current = asyncio.run(run(args))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        if regressions:
+            print("REGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Throughput benchmark for the shared embedding service.
+
+Embeds N distinct short texts from `--concurrency` concurrent callers, once with a
+direct `encoder.encode` call per text (the old per-request path) and once through
+`EmbeddingService`, which micro-batches whatever arrives within its window.
+Loads the real sentence-transformers model.
+
+    python -m benchmarks.embedding_bench --texts 512 --concurrency 32
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.executor import run_blocking
+
+
+async def _drive(embed_one, texts, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            await embed_one(text)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(t) for t in texts])
+    return time.perf_counter() - t0
+
+
+async def run(n_texts: int, concurrency: int, window_ms: float) -> dict:
+    from db.embeddings import EmbeddingService
+
+    service = EmbeddingService(window_ms=window_ms, cache_size=0)
+    texts = [f"benchmark query number {i} about topic {i % 17}" for i in range(n_texts)]
+    service.encoder.encode(texts[:8])  # warm up the model
+
+    async def direct(text):
+        await run_blocking(service.encoder.encode, text)
+
+    async def batched(text):
+        await service.aembed(text)
+
+    single = await _drive(direct, texts, concurrency)
+    grouped = await _drive(batched, texts, concurrency)
+    stats = service.get_stats()
+    service.close()
+    return {
+        "texts": n_texts,
+        "concurrency": concurrency,
+        "one_at_a_time_per_s": round(n_texts / single, 1),
+        "batched_per_s": round(n_texts / grouped, 1),
+        "speedup": round(single / grouped, 2),
+        "avg_batch": round(stats["avg_batch"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    print(asyncio.run(run(args.texts, args.concurrency, args.window_ms)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Local stand-in for the Tavily search API (POST /search).
+
+Returns deterministic results after a configurable delay and counts the requests it
+served, so caching and coalescing in `tools/search_client.py` can be checked offline:
+
+    python -m benchmarks.fake_tavily --port 8787 --latency 0.5
+    TAVILY_API_URL=http://127.0.0.1:8787 TAVILY_API_KEY=fake uvicorn api.app:app
+
+`basic` searches return fewer and weaker results than `advanced` ones, so the
+adaptive depth upgrade is exercised too.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTavily:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5):
+        self.latency = latency
+        self.requests = []  # (query, search_depth) per request served
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests.append((body.get("query"), body.get("search_depth")))
+                time.sleep(fake.latency)
+                payload = json.dumps(fake.respond(body)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, body: dict) -> dict:
+        query = body.get("query", "")
+        advanced = body.get("search_depth") == "advanced"
+        n = min(int(body.get("max_results", 5)), 5 if advanced else 2)
+        return {
+            "query": query,
+            "answer": f"Stubbed answer for '{query}'." if body.get("include_answer") else None,
+            "results": [
+                {
+                    "title": f"Result {i + 1} for {query}",
+                    "url": f"https://example.com/{i + 1}?q={query.replace(' ', '+')}",
+                    "content": f"Snippet {i + 1} about {query}. " * 5,
+                    "score": (0.9 if advanced else 0.6) - i * 0.05,
+                }
+                for i in range(n)
+            ],
+        }
+
+    def start(self) -> "FakeTavily":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-tavily", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    fake = FakeTavily(args.host, args.port, args.latency)
+    print(f"Fake Tavily listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
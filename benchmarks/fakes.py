@@ -0,0 +1,122 @@
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agents.context_cache import ContextCacheProvider
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatGoogleGenerativeAI.
+    `latency` is simulated per call; `blocking=True` sleeps synchronously even on the
+    async path, reproducing a chat model that stalls the event loop.
+    `answer_tokens` pads the answer to roughly that many tokens. `tool_script` lists the
+    tool calls to make in each agent step of a turn before answering, e.g.
+    `[[{"name": "robust_search", "args": {"query": "{query}"}}]]`; "{query}" in string
+    arguments is replaced by the turn's question.
+    """
+
+    latency: float = 0.5
+    answer: str = "This is a stubbed answer from the benchmark model."
+    answer_tokens: int = 0
+    tool_script: List[List[Dict[str, Any]]] = []
+    tools_bound: bool = False
+    blocking: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        # Only the tool-bound copy follows the script (the memory node's summary calls do not)
+        return self.model_copy(update={"tools_bound": True})
+
+    def _answer_text(self) -> str:
+        if self.answer_tokens <= 0:
+            return self.answer
+        words = self.answer.split()
+        # ~4 characters per token, as in the usage estimate below
+        while len(" ".join(words)) < self.answer_tokens * 4:
+            words.extend(self.answer.split())
+        return " ".join(words)
+
+    def _next_tool_calls(self, messages: List[BaseMessage]) -> Optional[list]:
+        """The scripted tool calls for this step of the turn, or None once the script is done."""
+        start = max((i for i, m in enumerate(messages) if m.type == "human"), default=-1)
+        step = sum(1 for m in messages[start + 1:] if m.type == "ai")
+        if start < 0 or step >= len(self.tool_script):
+            return None
+        content = messages[start].content
+        query = content if isinstance(content, str) else " ".join(
+            p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text"
+        )
+        query = query.split("\n", 1)[0][:200]
+        return [
+            {
+                "name": call["name"],
+                "args": {k: v.replace("{query}", query) if isinstance(v, str) else v for k, v in call.get("args", {}).items()},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            }
+            for call in self.tool_script[step]
+        ]
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        tool_calls = self._next_tool_calls(messages) if self.tools_bound and self.tool_script else None
+        content = "" if tool_calls else self._answer_text()
+        output_tokens = len(content) // 4 + (8 * len(tool_calls) if tool_calls else 0)
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls or [],
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens,
+            },
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+class FakeContextCacheProvider(ContextCacheProvider):
+    """
+    In-memory stand-in for GeminiContextCache. Records what was cached; set
+    `fail=True` to exercise the uncached fallback.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.caches = {}  # name -> {"system_prompt", "tools", "attachments", "ttl"}
+        self.calls = {"create": 0, "refresh": 0, "delete": 0}
+
+    async def create(self, system_prompt: str, tools: list, attachments: List[dict], ttl: int) -> str:
+        self.calls["create"] += 1
+        if self.fail:
+            raise RuntimeError("context caching unavailable")
+        name = f"cachedContents/fake-{self.calls['create']}"
+        self.caches[name] = {"system_prompt": system_prompt, "tools": tools, "attachments": list(attachments), "ttl": ttl}
+        return name
+
+    async def refresh(self, name: str, ttl: int):
+        self.calls["refresh"] += 1
+        if name not in self.caches:
+            raise KeyError(name)
+        self.caches[name]["ttl"] = ttl
+
+    async def delete(self, name: str):
+        self.calls["delete"] += 1
+        self.caches.pop(name, None)
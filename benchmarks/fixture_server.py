@@ -0,0 +1,166 @@
+"""
+Local web fixture server for offline scraping and ingestion benchmarks.
+
+    /static/<n>   server-rendered article with n paragraphs (Trafilatura tier)
+    /js/<n>       empty shell whose n paragraphs are inserted by JavaScript (browser tier)
+    /large/<kb>   article of roughly <kb> KB of HTML
+    /pdf/<pages>  text PDF with <pages> pages
+
+Pages are deterministic, carry an ETag and honour If-None-Match, so the scrape cache's
+revalidation path is exercised too. Requests served are counted per path kind.
+
+    python -m benchmarks.fixture_server --port 8788
+"""
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_SENTENCES = [
+    "Retrieval-augmented generation grounds a language model in documents fetched at query time.",
+    "Chunking splits long documents into overlapping windows that fit the embedding model.",
+    "A semantic cache returns earlier answers for questions that mean the same thing.",
+    "Checkpointing lets an agent resume a conversation from its last saved state.",
+    "Headless browsers render pages whose content only exists after scripts run.",
+    "Connection pooling keeps sockets open between requests to the same host.",
+]
+
+
+def _paragraph(i: int) -> str:
+    return " ".join(_SENTENCES[(i + k) % len(_SENTENCES)] for k in range(4)) + f" (Paragraph {i + 1}.)"
+
+
+def static_page(n: int) -> str:
+    body = "".join(f"<p>{_paragraph(i)}</p>" for i in range(n))
+    return (f"<html><head><title>Static fixture {n}</title></head><body><article>"
+            f"<h1>Static fixture with {n} paragraphs</h1>{body}</article></body></html>")
+
+
+def js_page(n: int) -> str:
+    paragraphs = json.dumps([_paragraph(i) for i in range(n)])
+    return (f"<html><head><title>JS fixture {n}</title></head><body><div id='app'></div><script>"
+            f"const ps = {paragraphs}; const app = document.getElementById('app');"
+            f"const h = document.createElement('h1'); h.textContent = 'Rendered fixture'; app.appendChild(h);"
+            f"for (const t of ps) {{ const p = document.createElement('p'); p.textContent = t; app.appendChild(p); }}"
+            f"</script></body></html>")
+
+
+def large_page(kb: int) -> str:
+    n = max(1, kb * 1024 // (len(_paragraph(0)) + 7))
+    return static_page(n)
+
+
+def pdf_document(pages: int, lines_per_page: int = 30) -> bytes:
+    """A minimal valid PDF with a text layer on every page (Helvetica, one text block per page)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1}, line {j + 1}: {_SENTENCES[(page + j) % len(_SENTENCES)]}" for j in range(lines_per_page)]
+        text = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T*" for line in lines
+        ) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class FixtureServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.requests = Counter()  # path kind -> requests served
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                kind, _, arg = self.path.strip("/").partition("/")
+                fixtures.requests[kind] += 1
+                try:
+                    size = int(arg.split("?")[0] or 5)
+                    body, content_type = fixtures.render(kind, size)
+                except (KeyError, ValueError):
+                    self.send_error(404)
+                    return
+                time.sleep(fixtures.latency)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @staticmethod
+    def render(kind: str, size: int):
+        if kind == "static":
+            return static_page(size).encode("utf-8"), "text/html; charset=utf-8"
+        if kind == "js":
+            return js_page(size).encode("utf-8"), "text/html; charset=utf-8"
+        if kind == "large":
+            return large_page(size).encode("utf-8"), "text/html; charset=utf-8"
+        if kind == "pdf":
+            return pdf_document(size), "application/pdf"
+        raise KeyError(kind)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    fixtures = FixtureServer(args.host, args.port, args.latency)
+    print(f"Fixture server listening on {fixtures.url}")
+    try:
+        fixtures.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
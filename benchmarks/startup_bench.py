@@ -0,0 +1,78 @@
+"""
+Cold-start budget for the API module.
+
+Imports `--module` (default `api.app`) in fresh interpreters and reports the median
+import time, plus any heavy dependency that got pulled in at import time (model
+weights, vector DB client, LLM SDK, browser). Exits non-zero if the median exceeds
+`--budget` seconds or a heavy module was imported, so it can gate CI.
+
+    python -m benchmarks.startup_bench --runs 5 --budget 2.0
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use or during the lifespan warmup, never by importing the app
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "qdrant_client",
+    "langgraph",
+    "langchain_google_genai",
+    "playwright",
+    "pypdf",
+    "trafilatura",
+)
+
+_PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Imports the module in a fresh interpreter and returns its import time and heavy imports."""
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+        env=dict(os.environ, APP_WARMUP="off"),
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{out.stderr.strip()}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="max median import time in seconds")
+    args = parser.parse_args()
+
+    samples = [measure(args.module) for _ in range(args.runs)]
+    median = statistics.median(s["seconds"] for s in samples)
+    heavy = sorted({m for s in samples for m in s["heavy"]})
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_s": round(median, 3),
+        "max_s": round(max(s["seconds"] for s in samples), 3),
+        "budget_s": args.budget,
+        "heavy_imports": heavy,
+    }
+    print(result)
+    if median > args.budget or heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
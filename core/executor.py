@@ -0,0 +1,36 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from core import profiler
+
+# Shared, bounded pool for blocking work (encoder calls, parsing, sync clients).
+# Keeps CPU/IO-bound helpers off the event loop without spawning a thread per request.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="axk-blocking")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Runs a blocking callable in the shared pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    if profiler.active:
+        # Samples of this call count towards the profiled turn that submitted it
+        call = profiler.bind(call)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+# Load the model, checkpointer and Qdrant connection at startup ("on"), or on the first request ("off")
+APP_WARMUP = os.getenv("APP_WARMUP", "on").lower()
+
+# Readiness, as reported by /health/ready. Liveness (/health) does not wait for it.
+_state = {"ready": False, "started_at": None, "warmup": {}}
+_background = []
+
+
+async def _checkpoint_maintenance_loop():
+    """Periodically drops idle sessions and reclaims space in checkpoints.db."""
+    from agents.orchestrator import get_checkpointer
+    from db.checkpoint_store import CHECKPOINT_MAINTENANCE_INTERVAL
+    while True:
+        await asyncio.sleep(CHECKPOINT_MAINTENANCE_INTERVAL)
+        try:
+            checkpointer = await get_checkpointer()
+            print(f"Checkpoint maintenance: {await checkpointer.maintenance()}")
+        except Exception as e:
+            print(f"Checkpoint maintenance failed: {e}")
+
+
+async def _cache_eviction_loop():
+    """Periodically expires semantic cache entries and enforces its size budget."""
+    from core.executor import run_blocking
+    from db.vector_store import semantic_cache, SEMANTIC_CACHE_EVICT_INTERVAL
+    while True:
+        await asyncio.sleep(SEMANTIC_CACHE_EVICT_INTERVAL)
+        try:
+            result = await run_blocking(semantic_cache.evict)
+            if result["expired"] or result["evicted"]:
+                print(f"Semantic cache eviction: {result}")
+        except Exception as e:
+            print(f"Semantic cache eviction failed: {e}")
+
+
+async def _timed(name: str, step):
+    t0 = time.perf_counter()
+    try:
+        await step()
+        _state["warmup"][name] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3)}
+    except Exception as e:
+        _state["warmup"][name] = {"ok": False, "seconds": round(time.perf_counter() - t0, 3), "error": str(e)}
+        print(f"Warmup of {name} failed: {e}")
+
+
+async def warmup():
+    """
+    Builds the lazily created singletons ahead of the first request: the compiled graph
+    and checkpointer, the embedding model (one dummy encode) and the semantic cache's
+    index. Steps run concurrently; the app is ready once all of them succeeded.
+    """
+    from core.executor import run_blocking
+
+    async def agent():
+        from agents.orchestrator import get_agent_app
+        await get_agent_app()
+
+    async def embeddings():
+        from db.embeddings import embedding_service
+        await run_blocking(embedding_service.warmup)
+
+    async def semantic_cache():
+        from db.vector_store import semantic_cache
+        await run_blocking(semantic_cache.connect)
+
+    await asyncio.gather(
+        _timed("agent", agent),
+        _timed("embeddings", embeddings),
+        _timed("semantic_cache", semantic_cache),
+    )
+    _state["ready"] = all(step["ok"] for step in _state["warmup"].values())
+
+
+async def shutdown():
+    """Stops background jobs and releases pooled resources (threads, browsers, connections)."""
+    for task in _background:
+        task.cancel()
+    _background.clear()
+    _state["ready"] = False
+
+    from agents.orchestrator import close_agent_app
+    from core.executor import run_blocking, shutdown_executor
+    from db.embeddings import embedding_service
+    from db.vector_store import semantic_cache
+    from tools.browser_pool import browser_pool
+    from tools.http_client import http_fetcher
+    from tools.pdf_ingestion import shutdown_pdf_pool
+    await close_agent_app()
+    await http_fetcher.aclose()
+    await run_blocking(browser_pool.close)
+    shutdown_pdf_pool()
+    await run_blocking(embedding_service.close)
+    await run_blocking(semantic_cache.snapshot)
+    shutdown_executor()
+
+
+def readiness() -> dict:
+    return {
+        "ready": _state["ready"],
+        "warmup": APP_WARMUP,
+        "uptime": round(time.time() - _state["started_at"], 3) if _state["started_at"] else None,
+        "steps": dict(_state["warmup"]),
+    }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    FastAPI lifespan: starts background jobs and, unless APP_WARMUP=off, warms up in the
+    background so the server answers liveness probes immediately. With warmup off the
+    app reports ready at once and everything loads on first use.
+    """
+    _state["started_at"] = time.time()
+    _state["warmup"] = {}
+    _background.append(asyncio.create_task(_checkpoint_maintenance_loop()))
+    _background.append(asyncio.create_task(_cache_eviction_loop()))
+    if APP_WARMUP == "off":
+        _state["ready"] = True
+    else:
+        _background.append(asyncio.create_task(warmup()))
+    try:
+        yield
+    finally:
+        await shutdown()
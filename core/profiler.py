@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import tempfile
+import threading
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))    # fraction of turns profiled without the header
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "2"))         # turns profiled at once; others run unprofiled
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))                    # profiles kept on disk (oldest deleted first)
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "axk-profiles"))
+_MAX_DEPTH = 256
+_SHARED_THREADS = {"axk-embeddings": "embeddings"}  # thread name -> root frame label
+
+# True while any turn is profiled; checked by run_blocking before binding work to a turn
+active = False
+
+_current: ContextVar = ContextVar("axk_profile", default=None)
+_running = set()          # RequestProfile objects being sampled
+_bound_threads = {}       # thread ident -> RequestProfile, for blocking-pool work
+_lock = threading.Lock()
+_sampler = None
+_previous_factories = {}  # loop -> task factory in place before profiling started
+
+
+def _stack(frame, root: str) -> tuple:
+    """Root-first stack of (function, file, first line) frames, under a synthetic `root` frame."""
+    frames = []
+    while frame is not None and len(frames) < _MAX_DEPTH:
+        code = frame.f_code
+        frames.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    frames.append((root, "", 0))
+    return tuple(reversed(frames))
+
+
+def _is_idle(frame) -> bool:
+    """A thread parked in a lock or queue wait is not using CPU."""
+    filename = frame.f_code.co_filename
+    return filename.endswith(("threading.py", "queue.py"))
+
+
+class RequestProfile:
+    def __init__(self, profile_id: str, meta: dict, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.id = profile_id
+        self.meta = meta
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.tasks = weakref.WeakSet([asyncio.current_task()])
+        self.stacks = Counter()
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def merge(self, stacks: Counter, root: str):
+        """Adds stacks sampled elsewhere (e.g. a worker process) under `root`."""
+        with _lock:
+            for stack, count in stacks.items():
+                self.stacks[((root, "", 0),) + stack[1:]] += count
+
+    def to_dict(self) -> dict:
+        frames, index, stacks = [], {}, []
+        for stack, count in self.stacks.most_common():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append(list(frame))
+                ids.append(index[frame])
+            stacks.append([ids, count])
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration, 4),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.stacks.values()),
+            "meta": self.meta,
+            "frames": frames,
+            "stacks": stacks,
+        }
+
+
+# --- Sampling ---
+
+def _sample_once():
+    frames = sys._current_frames()
+    shared = {t.ident: _SHARED_THREADS[t.name] for t in threading.enumerate() if t.name in _SHARED_THREADS}
+    with _lock:
+        for profile in _running:
+            task = asyncio.current_task(profile.loop)
+            frame = frames.get(profile.loop_thread)
+            if task is not None and frame is not None and task in profile.tasks:
+                profile.stacks[_stack(frame, "event-loop")] += 1
+            for ident, label in shared.items():
+                frame = frames.get(ident)
+                if frame is not None and not _is_idle(frame):
+                    profile.stacks[_stack(frame, label)] += 1
+        for ident, profile in list(_bound_threads.items()):
+            frame = frames.get(ident)
+            if frame is not None and profile in _running:
+                profile.stacks[_stack(frame, "blocking-pool")] += 1
+
+
+def _sampler_loop():
+    global _sampler
+    while True:
+        with _lock:
+            if not _running:
+                _sampler = None
+                return
+            interval = min(p.interval for p in _running)
+        _sample_once()
+        time.sleep(interval)
+
+
+def _task_factory(loop, coro, context=None):
+    """Registers tasks started from a profiled turn, so their time on the loop is attributed to it."""
+    previous = _previous_factories.get(loop)
+    if previous is not None:
+        task = previous(loop, coro) if context is None else previous(loop, coro, context=context)
+    else:
+        task = asyncio.Task(coro, loop=loop, context=context)
+    profile = context.get(_current) if context is not None else _current.get()
+    if profile is not None:
+        profile.tasks.add(task)
+    return task
+
+
+def _start(profile: RequestProfile):
+    global active, _sampler
+    loop = profile.loop
+    if loop.get_task_factory() is not _task_factory:
+        _previous_factories[loop] = loop.get_task_factory()
+        loop.set_task_factory(_task_factory)
+    with _lock:
+        _running.add(profile)
+        active = True
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sampler_loop, name="axk-profiler", daemon=True)
+            _sampler.start()
+
+
+def _stop(profile: RequestProfile):
+    global active
+    profile.duration = time.time() - profile.started_at
+    with _lock:
+        _running.discard(profile)
+        active = bool(_running)
+        still_profiled = any(p.loop is profile.loop for p in _running)
+    if not still_profiled and profile.loop in _previous_factories:
+        profile.loop.set_task_factory(_previous_factories.pop(profile.loop))
+
+
+def bind(call):
+    """Attributes a blocking call to the current turn's profile while it runs in the pool."""
+    profile = _current.get()
+    if profile is None:
+        return call
+
+    def run():
+        ident = threading.get_ident()
+        _bound_threads[ident] = profile
+        try:
+            return call()
+        finally:
+            _bound_threads.pop(ident, None)
+    return run
+
+
+def run_sampled(interval: float, fn, *args):
+    """Worker-process side: runs `fn` while sampling this thread. Returns (result, stacks)."""
+    stacks = Counter()
+    target = threading.get_ident()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stacks[_stack(frame, "worker")] += 1
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        return fn(*args), stacks
+    finally:
+        done.set()
+        thread.join()
+
+
+def submit_sampled(pool, fn, *args):
+    """
+    Submits `fn` to a process pool. When the current turn is profiled, the worker samples
+    itself and its stacks are merged into the turn's profile under `<fn name> (worker)`.
+    """
+    profile = _current.get()
+    if profile is None:
+        return asyncio.wrap_future(pool.submit(fn, *args))
+
+    async def sampled():
+        result, stacks = await asyncio.wrap_future(pool.submit(run_sampled, profile.interval, fn, *args))
+        profile.merge(stacks, f"{fn.__name__} (worker)")
+        return result
+    return asyncio.ensure_future(sampled())
+
+
+# --- Per-request entry points ---
+
+def profile_id_for(header: Optional[str]) -> Optional[str]:
+    """A new profile id if this turn should be profiled (header or sampling), else None."""
+    if header is not None and header.strip().lower() not in ("", "0", "false", "off"):
+        wanted = True
+    else:
+        wanted = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    if not wanted or len(_running) >= PROFILE_MAX_ACTIVE:
+        return None
+    return uuid.uuid4().hex[:16]
+
+
+@asynccontextmanager
+async def profiled(profile_id: Optional[str], **meta):
+    """
+    Samples the enclosed turn when `profile_id` is set, then stores the profile.
+    While it runs, a sampler thread records every PROFILE_INTERVAL_MS the stacks of:
+    1. The event loop, when it runs one of the turn's tasks (the request task and every
+       task started from it: LangGraph nodes, tool calls).
+    2. Blocking-pool threads running work the turn submitted via `run_blocking`
+       (trafilatura/BS4 parsing, indexing, Qdrant calls).
+    3. The shared embedding thread while it encodes (a batch may serve other turns too).
+    PDF extraction in worker processes is sampled in the worker and merged in.
+    cProfile is not used: it only sees its own thread and cannot separate this turn's
+    work on the event loop from concurrent turns.
+    """
+    if profile_id is None:
+        yield None
+        return
+
+    from core.executor import run_blocking
+
+    profile = RequestProfile(profile_id, meta)
+    _current.set(profile)
+    _start(profile)
+    try:
+        yield profile
+    finally:
+        _stop(profile)
+        # Each request runs in its own task, so this only affects the rest of this turn
+        _current.set(None)
+        try:
+            await run_blocking(profile_store.save, profile.to_dict())
+        except Exception as e:
+            print(f"Saving profile {profile_id} failed: {e}")
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of finished profiles, one JSON file each."""
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = max(1, keep)
+
+    def _files(self) -> list:
+        try:
+            return sorted(f for f in os.listdir(self.directory) if f.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def _path(self, profile_id: str) -> Optional[str]:
+        for name in reversed(self._files()):
+            if name.endswith(f"-{profile_id}.json"):
+                return os.path.join(self.directory, name)
+        return None
+
+    def save(self, profile: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(profile['started_at'] * 1000):015d}-{profile['id']}.json"
+        tmp = os.path.join(self.directory, f".{name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp, os.path.join(self.directory, name))
+        files = self._files()
+        for old in files[:max(0, len(files) - self.keep)]:
+            try:
+                os.unlink(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        path = self._path(profile_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list:
+        """Stored profiles, newest first, without their stacks."""
+        summaries = []
+        for name in reversed(self._files()):
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({k: profile[k] for k in ("id", "started_at", "duration_s", "samples", "meta")})
+        return summaries
+
+
+def to_collapsed(profile: dict) -> str:
+    """Brendan Gregg's collapsed-stack format: `root;caller;callee count` per line."""
+    names = [f"{name} ({os.path.basename(file)}:{line})" if file else name for name, file, line in profile["frames"]]
+    return "\n".join(";".join(names[i] for i in ids) + f" {count}" for ids, count in profile["stacks"]) + "\n"
+
+
+def to_speedscope(profile: dict) -> dict:
+    """speedscope file format (https://www.speedscope.app/file-format-schema.json), one sampled profile."""
+    interval = profile["interval_ms"]
+    total = sum(count for _, count in profile["stacks"]) * interval
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"aXk turn {profile['id']}",
+        "exporter": "aXk-Intelligence-Engine",
+        "activeProfileIndex": 0,
+        "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in profile["frames"]]},
+        "profiles": [{
+            "type": "sampled",
+            "name": profile["meta"].get("query", profile["id"])[:80],
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": total,
+            "samples": [ids for ids, _ in profile["stacks"]],
+            "weights": [count * interval for _, count in profile["stacks"]],
+        }],
+    }
+
+
+# Global Instance
+profile_store = ProfileStore()
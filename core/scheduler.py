@@ -0,0 +1,120 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, AsyncExitStack
+
+from core.session_lock import session_lock
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))  # agent turns running at once (per worker)
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "32"))              # turns allowed to wait; beyond this, 429
+AGENT_QUEUE_TIMEOUT = float(os.getenv("AGENT_QUEUE_TIMEOUT", "30"))    # seconds a turn may wait before a 503
+_SAMPLES = 512  # recent waits / run times kept for percentiles and Retry-After estimates
+
+
+class Overloaded(Exception):
+    """Raised when a turn cannot be admitted: 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TurnScheduler:
+    """
+    Admission control in front of the agent:
+    1. Per-session FIFO: turns of one session run one at a time, in arrival order.
+    2. At most `max_concurrency` turns run at once; up to `max_queue` more may wait.
+    3. A full queue is rejected at once (429) and a turn that waited `queue_timeout`
+       gives up (503), both with a Retry-After estimated from recent run times.
+    Waiting on the session lock counts as queueing, so a burst on one session cannot
+    hold every slot.
+    """
+
+    def __init__(self, max_concurrency: int = AGENT_MAX_CONCURRENCY, max_queue: int = AGENT_MAX_QUEUE,
+                 queue_timeout: float = AGENT_QUEUE_TIMEOUT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0}
+        self._waits = deque(maxlen=_SAMPLES)
+        self._runs = deque(maxlen=_SAMPLES)
+        self._slots = None  # asyncio.Semaphore, created on the serving loop
+
+    def _retry_after(self) -> int:
+        """Seconds until the current queue has likely drained."""
+        typical = _percentile(self._runs, 0.5) or 5.0
+        rounds = (self.waiting + self.running) / self.max_concurrency
+        return max(1, min(120, math.ceil(typical * max(1.0, rounds))))
+
+    def check(self):
+        """Rejects early (429) when the queue is already full. Non-binding: `admit` decides."""
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(429, self._retry_after(), "Too many queued requests, retry later")
+
+    @asynccontextmanager
+    async def admit(self, session_id: str):
+        """Holds the session's lock and one concurrency slot for the duration of a turn."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.check()
+
+        queued_at = time.monotonic()
+        self.waiting += 1
+        async with AsyncExitStack() as stack:
+            try:
+                await asyncio.wait_for(self._enter(stack, session_id), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                raise Overloaded(503, self._retry_after(), "Timed out waiting for a free agent slot")
+            finally:
+                self.waiting -= 1
+            started = time.monotonic()
+            self._waits.append(started - queued_at)
+            self.stats["admitted"] += 1
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self._runs.append(time.monotonic() - started)
+
+    async def _enter(self, stack: AsyncExitStack, session_id: str):
+        """
+        Takes the session lock, then a slot. Both are released by `stack`, so a slot
+        acquired just as `wait_for` times out or the request is cancelled is returned too.
+        """
+        await stack.enter_async_context(session_lock(session_id))
+        await self._slots.acquire()
+        stack.callback(self._slots.release)
+
+    def get_stats(self) -> dict:
+        waits = list(self._waits)
+        return {
+            **self.stats,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "wait_p50_s": round(_percentile(waits, 0.5), 3),
+            "wait_p95_s": round(_percentile(waits, 0.95), 3),
+            "wait_max_s": round(max(waits), 3) if waits else 0.0,
+            "run_p50_s": round(_percentile(self._runs, 0.5), 3),
+        }
+
+
+# Global Instance
+turn_scheduler = TurnScheduler()
@@ -0,0 +1,69 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from contextlib import asynccontextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+# Set by api/serve.py; above 1, turns also lock across worker processes
+AXK_WORKERS = int(os.getenv("AXK_WORKERS", "1"))
+SESSION_LOCK_DIR = os.getenv("SESSION_LOCK_DIR", os.path.join(tempfile.gettempdir(), "axk-session-locks"))
+_POLL_MIN, _POLL_MAX = 0.005, 0.1  # seconds between attempts on a lock held by another process
+
+_local_locks = {}  # session_id -> [asyncio.Lock, holders + waiters], for turns inside this process
+
+
+def multi_process() -> bool:
+    return AXK_WORKERS > 1 and fcntl is not None
+
+
+def _lock_path(session_id: str) -> str:
+    return os.path.join(SESSION_LOCK_DIR, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + ".lock")
+
+
+async def _acquire_file(path: str) -> int:
+    """Takes an exclusive flock without parking a thread: non-blocking attempts with backoff."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    delay = _POLL_MIN
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+        except BaseException:
+            os.close(fd)
+            raise
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    """
+    Serializes turns of one session (thread_id): two requests for the same session never
+    run the graph concurrently, within this process or, with several workers, across them.
+    """
+    entry = _local_locks.get(session_id)
+    if entry is None:
+        entry = _local_locks[session_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            if not multi_process():
+                yield
+                return
+            os.makedirs(SESSION_LOCK_DIR, exist_ok=True)
+            fd = await _acquire_file(_lock_path(session_id))
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _local_locks[session_id]
@@ -0,0 +1,120 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+
+# Set by api/serve.py when several workers share one /metrics view
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram("axk_stage_seconds", "Time spent per pipeline stage, graph node and tool", ["stage"],
+                          buckets=_LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("axk_request_seconds", "End-to-end turn latency", ["endpoint"], buckets=_LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("axk_in_flight_requests", "Turns currently being handled", multiprocess_mode="livesum")
+TURNS = Counter("axk_turns_total", "Turns by outcome (ok, cache_hit, error, rejected)", ["outcome"])
+TOOL_CALLS = Counter("axk_tool_calls_total", "Agent tool invocations", ["tool", "status"])
+SCRAPES = Counter("axk_scrapes_total", "URL scrapes by the tier that served them (cache, revalidated, trafilatura, ..., failed)",
+                  ["tier"])
+CACHE_LOOKUPS = Counter("axk_semantic_cache_lookups_total", "Semantic cache lookups", ["result"])
+AGENT_ITERATIONS = Histogram("axk_agent_iterations", "Agent (LLM) steps per turn", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+
+
+class TurnTimings:
+    """Seconds and call counts per stage for one turn; returned as `Metrics.stages`."""
+    __slots__ = ("stages", "counts")
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def summary(self) -> dict:
+        return {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+
+
+# The turn being handled. Graph nodes, tools and checkpoint writes run in tasks that
+# copy this context, so their spans land in the same TurnTimings object.
+_current_turn: ContextVar = ContextVar("axk_turn_timings", default=None)
+_stage_children = {}  # stage -> histogram child, so the hot path skips label resolution
+
+
+def record(stage: str, seconds: float):
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_SECONDS.labels(stage)
+    child.observe(seconds)
+    timings = _current_turn.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block as `stage` (for the current turn and the stage histogram)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_node(name: str, node):
+    """Wraps an async graph node in a `node:<name>` span (the signature LangGraph inspects is kept)."""
+    @functools.wraps(node)
+    async def wrapper(*args, **kwargs):
+        with span(f"node:{name}"):
+            return await node(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def track_turn(timings: TurnTimings, endpoint: str):
+    """
+    Makes `timings` the current turn for spans, counts the turn as in flight and records
+    its total latency and agent iterations. Each request runs in its own task, so the
+    context variable is not reset afterwards.
+    """
+    _current_turn.set(timings)
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        iterations = timings.counts.get("node:agent", 0)
+        if iterations:
+            AGENT_ITERATIONS.observe(iterations)
+
+
+def count_turn(outcome: str):
+    TURNS.labels(outcome).inc()
+
+
+def count_tool_call(tool: str, status: str):
+    TOOL_CALLS.labels(tool, status).inc()
+
+
+def count_scrape(tier: str):
+    SCRAPES.labels(tier or "failed").inc()
+
+
+def count_cache_lookup(result: str):
+    CACHE_LOOKUPS.labels(result).inc()
+
+
+def render_metrics():
+    """Prometheus exposition of every metric (merged across workers in multi-process mode)."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, Range,
+    FilterSelector, OrderBy, PayloadSchemaType, IsEmptyCondition, PayloadField,
+)
+
+QDRANT_TIMEOUT = float(os.getenv("QDRANT_TIMEOUT", "2"))  # seconds per Qdrant request
+# Consecutive Qdrant failures that open the breaker, and how long it stays open
+QDRANT_BREAKER_FAILURES = int(os.getenv("QDRANT_BREAKER_FAILURES", "3"))
+QDRANT_BREAKER_COOLDOWN = float(os.getenv("QDRANT_BREAKER_COOLDOWN", "30"))
+_EVICT_PAGE = 1000  # points deleted per request during eviction
+
+# A hit is (point id, payload)
+Hit = Tuple[str, dict]
+
+
+class MemoryCacheIndex:
+    """
+    In-process cache index: one NumPy matrix of L2-normalized vectors (a dot product
+    is the cosine similarity) with payloads alongside and row sets per scope, so a
+    lookup only scores its own scope. Optionally snapshotted to an .npz file.
+    """
+
+    name = "memory"
+
+    def __init__(self, dim: int, snapshot_path: Optional[str] = None):
+        self.dim = dim
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((64, dim), dtype="float32")
+        self._ids: List[str] = []
+        self._payloads: List[dict] = []
+        self._rows: Dict[str, int] = {}     # point id -> row
+        self._scopes: Dict[str, set] = {}   # scope -> rows
+        self._dirty = False
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                self._load(snapshot_path)
+            except Exception as e:
+                print(f"Semantic cache snapshot could not be loaded: {e}")
+
+    # --- Row bookkeeping (caller holds the lock) ---
+
+    def _append(self, point_id: str, vector, payload: dict):
+        row = len(self._ids)
+        if row == len(self._vectors):
+            self._vectors = np.vstack([self._vectors, np.zeros_like(self._vectors)])
+        self._vectors[row] = vector
+        self._ids.append(point_id)
+        self._payloads.append(payload)
+        self._rows[point_id] = row
+        self._scopes.setdefault(payload.get("scope"), set()).add(row)
+
+    def _remove(self, row: int):
+        """Swap-removes a row: the last row takes its place."""
+        last = len(self._ids) - 1
+        point_id, scope = self._ids[row], self._payloads[row].get("scope")
+        self._scopes[scope].discard(row)
+        if not self._scopes[scope]:
+            del self._scopes[scope]
+        if row != last:
+            moved_scope = self._payloads[last].get("scope")
+            self._scopes[moved_scope].discard(last)
+            self._scopes[moved_scope].add(row)
+            self._vectors[row] = self._vectors[last]
+            self._ids[row] = self._ids[last]
+            self._payloads[row] = self._payloads[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._payloads.pop()
+        del self._rows[point_id]
+
+    def _remove_where(self, predicate) -> int:
+        rows = sorted((r for r, p in enumerate(self._payloads) if predicate(p)), reverse=True)
+        for row in rows:
+            self._remove(row)
+        self._dirty = self._dirty or bool(rows)
+        return len(rows)
+
+    # --- Index operations ---
+
+    def nearest(self, vector, scope: Optional[str], threshold: float) -> Optional[Hit]:
+        now = time.time()
+        with self._lock:
+            rows = self._scopes.get(scope) if scope else range(len(self._ids))
+            if not rows:
+                return None
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            scores = self._vectors[rows] @ np.asarray(vector, dtype="float32")
+            for i in np.argsort(-scores):
+                if scores[i] < threshold:
+                    return None
+                payload = self._payloads[rows[i]]
+                if payload.get("expires_at", 0) > now:
+                    return self._ids[rows[i]], dict(payload)
+        return None
+
+    def upsert(self, point_id: str, vector, payload: dict):
+        with self._lock:
+            row = self._rows.get(point_id)
+            if row is not None:
+                self._remove(row)
+            self._append(point_id, vector, dict(payload))
+            self._dirty = True
+
+    def set_payload(self, point_id: str, payload: dict, replace: bool = False):
+        """Updates (or with `replace`, overwrites) a payload. Refreshes never change the scope."""
+        with self._lock:
+            row = self._rows.get(point_id)
+            if row is None:
+                return
+            if replace:
+                self._payloads[row] = dict(payload, scope=self._payloads[row].get("scope"))
+            else:
+                self._payloads[row].update(payload)
+            self._dirty = True
+
+    def delete_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            return self._remove_where(lambda p: p.get("expires_at", 0) <= now)
+
+    def evict_lru(self, max_entries: int) -> int:
+        with self._lock:
+            excess = len(self._ids) - max_entries
+            if excess <= 0:
+                return 0
+            order = sorted(range(len(self._ids)), key=lambda r: self._payloads[r].get("last_hit", 0))
+            victims = {self._ids[r] for r in order[:excess]}
+            for point_id in victims:
+                self._remove(self._rows[point_id])
+            self._dirty = True
+            return len(victims)
+
+    def purge(self, scope: Optional[str] = None) -> int:
+        with self._lock:
+            return self._remove_where(lambda p: scope is None or p.get("scope") == scope)
+
+    def count(self, live: bool = False) -> int:
+        now = time.time()
+        with self._lock:
+            if not live:
+                return len(self._ids)
+            return sum(1 for p in self._payloads if p.get("expires_at", 0) > now)
+
+    # --- Snapshots ---
+
+    def snapshot(self):
+        """Writes the index to `snapshot_path` (atomically) if it changed since the last one."""
+        if not self.snapshot_path or not self._dirty:
+            return
+        with self._lock:
+            n = len(self._ids)
+            vectors = self._vectors[:n].copy()
+            meta = json.dumps({"ids": self._ids, "payloads": self._payloads})
+            self._dirty = False
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, vectors=vectors, meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+        os.replace(tmp, self.snapshot_path)
+
+    def _load(self, path: str):
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        if vectors.shape[1:] != (self.dim,):
+            print(f"Semantic cache snapshot has dimension {vectors.shape[1:]}, expected {self.dim}; ignored")
+            return
+        now = time.time()
+        with self._lock:
+            for point_id, vector, payload in zip(meta["ids"], vectors, meta["payloads"]):
+                if payload.get("expires_at", 0) > now:
+                    self._append(point_id, vector, payload)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive errors; while open, calls are refused for
+    `cooldown` seconds, then one caller is let through to probe (half-open).
+    """
+
+    def __init__(self, failures: int = QDRANT_BREAKER_FAILURES, cooldown: float = QDRANT_BREAKER_COOLDOWN):
+        self.failures = max(1, failures)
+        self.cooldown = cooldown
+        self._errors = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if self._probing else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._errors = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._errors += 1
+            if self._probing or self._errors >= self.failures:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def trip(self):
+        """Opens the breaker now (e.g. the server was unreachable at startup)."""
+        with self._lock:
+            self._errors = self.failures
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class QdrantCacheIndex:
+    """
+    Cache index in a Qdrant collection. The collection is created lazily on the first
+    successful request, so a server that comes up after the API is picked up.
+    """
+
+    name = "qdrant"
+
+    def __init__(self, client, collection_name: str, dim: int):
+        self.client = client
+        self.collection_name = collection_name
+        self.dim = dim
+        self._ready = False
+
+    def ensure_ready(self):
+        if self._ready:
+            return
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=self.dim, distance=Distance.COSINE),
+            )
+        # Lookups are always filtered by scope and expiry; eviction orders by last hit.
+        # Also applied to collections created before these fields existed.
+        for field_name, schema in (("scope", PayloadSchemaType.KEYWORD),
+                                   ("expires_at", PayloadSchemaType.FLOAT),
+                                   ("last_hit", PayloadSchemaType.FLOAT)):
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema,
+                )
+            except Exception:
+                pass
+        self._ready = True
+
+    @staticmethod
+    def _live_filter(scope: Optional[str] = None) -> Filter:
+        must = [FieldCondition(key="expires_at", range=Range(gt=time.time()))]
+        if scope:
+            must.append(FieldCondition(key="scope", match=MatchValue(value=scope)))
+        return Filter(must=must)
+
+    def nearest(self, vector, scope: Optional[str], threshold: float) -> Optional[Hit]:
+        self.ensure_ready()
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector.tolist(),
+            query_filter=self._live_filter(scope),
+            limit=1,
+            score_threshold=threshold,
+            with_payload=True,
+        ).points
+        return (str(results[0].id), results[0].payload or {}) if results else None
+
+    def upsert(self, point_id: str, vector, payload: dict):
+        self.ensure_ready()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[PointStruct(id=point_id, vector=vector.tolist(), payload=payload)]
+        )
+
+    def set_payload(self, point_id: str, payload: dict, replace: bool = False):
+        self.ensure_ready()
+        write = self.client.overwrite_payload if replace else self.client.set_payload
+        write(collection_name=self.collection_name, payload=payload, points=[point_id])
+
+    def delete_expired(self) -> int:
+        self.ensure_ready()
+        before = self.count()
+        # Expired entries, and entries written before expiry was tracked
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=Filter(should=[
+                FieldCondition(key="expires_at", range=Range(lte=time.time())),
+                IsEmptyCondition(is_empty=PayloadField(key="expires_at")),
+            ])),
+        )
+        return before - self.count()
+
+    def evict_lru(self, max_entries: int) -> int:
+        self.ensure_ready()
+        excess = self.count() - max_entries
+        evicted = 0
+        while evicted < excess:
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=min(_EVICT_PAGE, excess - evicted),
+                order_by=OrderBy(key="last_hit", direction="asc"),
+                with_payload=False,
+                with_vectors=False,
+            )
+            if not points:
+                break
+            self.client.delete(collection_name=self.collection_name, points_selector=[p.id for p in points])
+            evicted += len(points)
+        return evicted
+
+    def purge(self, scope: Optional[str] = None) -> int:
+        self.ensure_ready()
+        query_filter = Filter(must=[FieldCondition(key="scope", match=MatchValue(value=scope))]) if scope else Filter()
+        removed = self.client.count(collection_name=self.collection_name, count_filter=query_filter, exact=True).count
+        self.client.delete(collection_name=self.collection_name, points_selector=FilterSelector(filter=query_filter))
+        return removed
+
+    def count(self, live: bool = False) -> int:
+        self.ensure_ready()
+        return self.client.count(
+            collection_name=self.collection_name,
+            count_filter=self._live_filter() if live else None,
+            exact=True,
+        ).count
+
+    def healthy(self) -> bool:
+        try:
+            self.client.get_collections()
+            return True
+        except Exception:
+            return False
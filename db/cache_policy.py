@@ -0,0 +1,70 @@
+import os
+import re
+import hashlib
+from typing import List, Optional
+
+# Policies:
+# - "auto":    fresh sessions share answers for identical inputs; sessions with history
+#              are scoped to the session, and context-dependent follow-ups bypass the cache.
+# - "session": every entry is scoped to its session.
+# - "global":  only the query and attached inputs form the key (ignores conversation).
+# - "off":     semantic cache disabled.
+CACHE_POLICIES = ("auto", "session", "global", "off")
+
+# Words that usually refer back to earlier turns ("explain it", "what about the second one?")
+_FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|him|her|above|previous|earlier|"
+    r"again|more|also|same|former|latter|continue|elaborate|expand|why)\b",
+    re.IGNORECASE,
+)
+
+
+def get_cache_policy() -> str:
+    policy = os.getenv("CACHE_CONTEXT_POLICY", "auto").lower()
+    return policy if policy in CACHE_POLICIES else "auto"
+
+
+def fingerprint_inputs(urls: Optional[List[str]] = None, file_digests: Optional[List[str]] = None) -> str:
+    """Stable short hash of the attached URLs and file contents (order-insensitive)."""
+    hasher = hashlib.sha256()
+    for u in sorted(u.strip().rstrip("/") for u in (urls or []) if u and u.strip()):
+        hasher.update(b"url:" + u.encode("utf-8") + b"\n")
+    for d in sorted(file_digests or []):
+        hasher.update(b"file:" + d.encode("utf-8") + b"\n")
+    return hasher.hexdigest()[:16]
+
+
+def is_context_dependent(query: str) -> bool:
+    """Heuristic: does the query lean on earlier conversation turns?"""
+    words = query.split()
+    if len(words) <= 3:
+        return True
+    return bool(_FOLLOW_UP_PATTERN.search(query))
+
+
+def build_cache_scope(
+    query: str,
+    session_id: str,
+    inputs_fingerprint: str,
+    has_history: bool,
+    policy: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Returns the cache scope for this request, or None if the request must bypass the cache.
+    Entries are only matched against other entries with the exact same scope.
+    """
+    policy = policy or get_cache_policy()
+
+    if policy == "off":
+        return None
+    if policy == "global":
+        return f"inputs:{inputs_fingerprint}"
+    if policy == "session":
+        return f"session:{session_id}|inputs:{inputs_fingerprint}"
+
+    # auto
+    if has_history:
+        if is_context_dependent(query):
+            return None
+        return f"session:{session_id}|inputs:{inputs_fingerprint}"
+    return f"inputs:{inputs_fingerprint}"
@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core.telemetry import span
+
+# Commits from concurrent sessions within this window are folded into one (0 = commit every write)
+CHECKPOINT_COMMIT_INTERVAL_MS = float(os.getenv("CHECKPOINT_COMMIT_INTERVAL_MS", "20"))
+# Checkpoints kept per thread; older super-steps are deleted
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_PRUNE_EVERY = 10  # puts per thread between prunes
+_TRACKED_THREADS = 10000     # threads with a put count; the least recently written are forgotten
+# Threads idle for longer than this are deleted by maintenance (0 = keep forever)
+CHECKPOINT_RETENTION_DAYS = float(os.getenv("CHECKPOINT_RETENTION_DAYS", "30"))
+CHECKPOINT_MAINTENANCE_INTERVAL = int(os.getenv("CHECKPOINT_MAINTENANCE_INTERVAL", "3600"))  # seconds
+
+
+class _GroupCommitConnection:
+    """
+    Wraps an aiosqlite connection so that `commit()` is deferred and coalesced: the
+    first commit in a window schedules one real commit, later ones join it. Reads on
+    the same connection see the uncommitted rows, so the saver stays consistent.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, interval: float):
+        self._conn = conn
+        self._interval = interval
+        self._task = None
+        self.lock = None  # the saver's lock, so a commit never splits one of its operations
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __await__(self):
+        return self._conn.__await__()
+
+    async def commit(self):
+        if self._interval <= 0:
+            return await self._conn.commit()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._commit_later())
+
+    async def _commit_later(self):
+        await asyncio.sleep(self._interval)
+        try:
+            async with self.lock:
+                await self._conn.commit()
+        except Exception as e:
+            print(f"Checkpoint commit failed: {e}")
+
+    async def flush(self):
+        """Commits now (used before maintenance and on shutdown)."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        await self._conn.commit()
+
+
+class CheckpointStore(AsyncSqliteSaver):
+    """
+    AsyncSqliteSaver for `checkpoints.db` tuned for many concurrent sessions:
+    1. WAL with synchronous=NORMAL and a busy timeout (no fsync per write).
+    2. Group commit: writes from all sessions share one commit per interval.
+    3. Retention: only the latest `keep_last` checkpoints per thread are kept, and
+       `maintenance()` deletes threads idle for `retention_days` and reclaims space.
+       Coroutines in `on_delete` are awaited with the thread id after a thread is deleted,
+       so data kept elsewhere for the session (indexed documents) goes with it.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, keep_last: int = CHECKPOINT_KEEP_LAST,
+                 commit_interval_ms: float = CHECKPOINT_COMMIT_INTERVAL_MS, **kwargs):
+        grouped = _GroupCommitConnection(conn, commit_interval_ms / 1000)
+        super().__init__(grouped, **kwargs)
+        grouped.lock = self.lock
+        self.keep_last = keep_last
+        self._puts = OrderedDict()  # thread_id -> puts since its last prune
+        self._tuned = False
+        self.on_delete = []
+
+    async def setup(self) -> None:
+        if not self._tuned:
+            # auto_vacuum only takes effect on a database created after it is set
+            await self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await super().setup()
+        if self._tuned:
+            return
+        async with self.lock:
+            if self._tuned:
+                return
+            await self.conn.executescript("""
+                PRAGMA synchronous=NORMAL;
+                PRAGMA busy_timeout=5000;
+                CREATE TABLE IF NOT EXISTS thread_activity (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_thread_activity_updated ON thread_activity(updated_at);
+            """)
+            # Threads from before this table existed start their idle clock now
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO thread_activity (thread_id, updated_at) SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (time.time(),)
+            )
+            await self.conn.flush()
+            self._tuned = True
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint"):
+            return await self._aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, *args, **kwargs):
+        with span("checkpoint"):
+            return await super().aput_writes(*args, **kwargs)
+
+    async def _aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async with self.lock:
+            await self.conn.execute(
+                "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (thread_id, time.time())
+            )
+            puts = self._puts.pop(thread_id, 0) + 1
+            if self.keep_last > 0 and puts >= CHECKPOINT_PRUNE_EVERY:
+                await self._prune_thread(thread_id, checkpoint_ns)
+            else:
+                # A forgotten thread only starts counting again: its next prune comes a bit later
+                self._puts[thread_id] = puts
+                if len(self._puts) > _TRACKED_THREADS:
+                    self._puts.popitem(last=False)
+            await self.conn.commit()
+        return result
+
+    async def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        """Deletes all but the latest `keep_last` checkpoints (and their writes). Caller holds the lock."""
+        keep = "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT ?"
+        params = (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_last)
+        await self.conn.execute(
+            f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})", params
+        )
+        await self.conn.execute(
+            f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})", params
+        )
+
+    async def has_thread(self, thread_id: str) -> bool:
+        """Whether any checkpoint exists for the thread (also sees rows awaiting the group commit)."""
+        await self.setup()
+        async with self.lock:
+            async with self.conn.execute(
+                "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (str(thread_id),)
+            ) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
+        self._puts.pop(str(thread_id), None)
+        for callback in self.on_delete:
+            try:
+                await callback(str(thread_id))
+            except Exception as e:
+                print(f"Cleanup of deleted thread {thread_id} failed: {e}")
+
+    async def maintenance(self, retention_days: float = CHECKPOINT_RETENTION_DAYS) -> dict:
+        """Deletes idle threads, then checkpoints the WAL and returns freed pages to the OS."""
+        await self.setup()
+        deleted = 0
+        if retention_days > 0:
+            async with self.lock:
+                async with self.conn.execute(
+                    "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                    (time.time() - retention_days * 86400,)
+                ) as cursor:
+                    idle = [row[0] for row in await cursor.fetchall()]
+            for thread_id in idle:
+                await self.adelete_thread(thread_id)
+            deleted = len(idle)
+
+        async with self.lock:
+            await self.conn.flush()
+            await self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            await self.conn.execute("PRAGMA incremental_vacuum")
+            await self.conn.flush()
+        return {"threads_deleted": deleted}
+
+    async def flush(self):
+        """Commits pending writes now, so other processes see this session's latest state."""
+        async with self.lock:
+            await self.conn.flush()
+
+    async def aclose(self):
+        """Flushes pending commits and closes the connection."""
+        async with self.lock:
+            await self.conn.flush()
+        await self.conn.close()
@@ -0,0 +1,289 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, FilterSelector, PayloadSchemaType,
+)
+
+from db.embeddings import embedding_service
+from db.vector_store import semantic_cache
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))       # characters per chunk
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))  # characters shared between neighbours
+DOCUMENT_COLLECTION = os.getenv("DOCUMENT_COLLECTION", "documents")  # one Qdrant collection for all sessions
+# Chunks held by the in-process fallback index; least recently used sessions are dropped beyond this
+DOCUMENT_LOCAL_MAX_CHUNKS = int(os.getenv("DOCUMENT_LOCAL_MAX_CHUNKS", "50000"))
+DOCUMENT_TRACKED_SESSIONS = int(os.getenv("DOCUMENT_TRACKED_SESSIONS", "10000"))  # sessions whose indexed documents are remembered
+DOCUMENT_CLIENT_RETRY_MAX = float(os.getenv("DOCUMENT_CLIENT_RETRY_MAX", "60"))  # seconds, cap of the client retry backoff
+
+
+def split_into_chunks(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into ~chunk_size character windows, preferring paragraph and sentence
+    boundaries, with `overlap` characters carried over between neighbouring chunks.
+    """
+    text = re.sub(r"\n{3,}", "\n\n", text or "").strip()
+    if not text:
+        return []
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Prefer to cut at a paragraph, then a sentence, then a word boundary
+            window = text[start:end]
+            for sep in ("\n\n", ". ", "\n", " "):
+                cut = window.rfind(sep)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+class DocumentStore:
+    """
+    Per-session chunk index for uploaded documents and scraped pages.
+    All sessions share one Qdrant collection; every point carries an indexed
+    `session_id` payload that searches filter on. Chunks that could not be written to
+    Qdrant go to a bounded in-process NumPy index instead, and searches merge both.
+    A failed client factory is retried with exponential backoff.
+    """
+
+    def __init__(self, client=None, embeddings=None, client_factory=None, collection_name: str = DOCUMENT_COLLECTION,
+                 local_max_chunks: int = DOCUMENT_LOCAL_MAX_CHUNKS, max_tracked_sessions: int = DOCUMENT_TRACKED_SESSIONS):
+        self._client = client
+        self._client_factory = client_factory  # resolves the client on first use instead
+        self._retry_at = 0.0
+        self._retry_delay = 0.0
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.local_max_chunks = local_max_chunks
+        self.max_tracked_sessions = max_tracked_sessions
+        self._lock = threading.Lock()
+        # session_id -> {"vectors": ndarray, "chunks": [payload]}, least recently used first
+        self._local: "OrderedDict[str, dict]" = OrderedDict()
+        self._local_chunks = 0
+        # session_id -> {doc_hash: {"source", "chunks", "local"}}, so re-sent documents are not re-embedded
+        self._sources: "OrderedDict[str, dict]" = OrderedDict()
+        self._remote_sessions = set()  # sessions known to have points in Qdrant
+        self._ready = False
+
+    @property
+    def client(self):
+        if self._client is None and self._client_factory is not None and time.monotonic() >= self._retry_at:
+            try:
+                self._client = self._client_factory()
+            except Exception as e:
+                print(f"Document store Qdrant client failed: {e}")
+            if self._client is None:
+                self._retry_delay = min(max(self._retry_delay * 2, 1.0), DOCUMENT_CLIENT_RETRY_MAX)
+                self._retry_at = time.monotonic() + self._retry_delay
+            else:
+                self._retry_delay = 0.0
+        return self._client
+
+    def _ensure_collection(self):
+        if self._ready:
+            return
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=self.embeddings.dim, distance=Distance.COSINE),
+            )
+        try:
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="session_id",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+        except Exception:
+            pass # Already indexed
+        self._ready = True
+
+    @staticmethod
+    def _session_filter(session_id: str) -> Filter:
+        return Filter(must=[FieldCondition(key="session_id", match=MatchValue(value=session_id))])
+
+    def _known(self, session_id: str) -> dict:
+        """The session's indexed documents (caller holds the lock); forgets the least recent sessions past the cap."""
+        known = self._sources.get(session_id)
+        if known is None:
+            known = self._sources[session_id] = {}
+            while len(self._sources) > self.max_tracked_sessions:
+                old, _ = self._sources.popitem(last=False)
+                if old in self._local:
+                    self._drop_local(old)
+        self._sources.move_to_end(session_id)
+        return known
+
+    def _drop_local(self, session_id: str):
+        """Removes a session's in-process chunks and forgets which documents they came from. Caller holds the lock."""
+        entry = self._local.pop(session_id, None)
+        if entry is None:
+            return
+        self._local_chunks -= len(entry["chunks"])
+        known = self._sources.get(session_id)
+        if known:
+            for doc_hash in [h for h, doc in known.items() if doc["local"]]:
+                del known[doc_hash]
+
+    def index_document(self, session_id: str, source: str, text: str) -> int:
+        """Chunks, batch-embeds and indexes one document. Returns the number of chunks."""
+        doc_hash = hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            known = self._known(session_id)
+            if doc_hash in known:
+                # Same content re-sent in a later turn: already indexed
+                return known[doc_hash]["chunks"]
+
+        chunks = split_into_chunks(text)
+        if not chunks:
+            return 0
+        vectors = self.embeddings.embed_many(chunks, memoize=False)
+        payloads = [
+            {"session_id": session_id, "source": source, "text": chunk, "chunk": i, "doc": doc_hash}
+            for i, chunk in enumerate(chunks)
+        ]
+
+        stored = False
+        if self.client:
+            try:
+                self._ensure_collection()
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=[
+                        # Deterministic IDs make re-indexing the same document idempotent
+                        PointStruct(id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{session_id}:{doc_hash}:{p['chunk']}")),
+                                    vector=v.tolist(), payload=p)
+                        for v, p in zip(vectors, payloads)
+                    ],
+                )
+                self._remote_sessions.add(session_id)
+                stored = True
+            except Exception as e:
+                print(f"Document indexing in Qdrant failed, using in-process index: {e}")
+
+        with self._lock:
+            if not stored:
+                entry = self._local.setdefault(session_id, {"vectors": np.zeros((0, vectors.shape[1]), dtype="float32"), "chunks": []})
+                entry["vectors"] = np.vstack([entry["vectors"], vectors])
+                entry["chunks"].extend(payloads)
+                self._local.move_to_end(session_id)
+                self._local_chunks += len(payloads)
+                # Evict whole sessions, least recently used first (never the one just written)
+                while self._local_chunks > self.local_max_chunks and len(self._local) > 1:
+                    self._drop_local(next(iter(self._local)))
+            self._known(session_id)[doc_hash] = {"source": source, "chunks": len(chunks), "local": not stored}
+        return len(chunks)
+
+    def has_documents(self, session_id: str) -> bool:
+        with self._lock:
+            if self._sources.get(session_id) or session_id in self._local:
+                return True
+        if session_id in self._remote_sessions:
+            return True
+        if not self.client:
+            return False
+        try:
+            self._ensure_collection()
+            found = self.client.count(
+                collection_name=self.collection_name, count_filter=self._session_filter(session_id), exact=False
+            ).count > 0
+        except Exception:
+            return False
+        if found:
+            self._remote_sessions.add(session_id)
+        return found
+
+    def _search_local(self, session_id: str, vector, k: int, with_vectors: bool) -> List[dict]:
+        with self._lock:
+            entry = self._local.get(session_id)
+            if entry is None:
+                return []
+            self._local.move_to_end(session_id)
+            vectors, chunks = entry["vectors"], list(entry["chunks"])
+        if not chunks:
+            return []
+        scores = vectors @ vector
+        top = np.argsort(-scores)[:k]
+        hits = [dict(chunks[i], score=float(scores[i])) for i in top]
+        if with_vectors:
+            for hit, i in zip(hits, top):
+                hit["vector"] = vectors[i]
+        return hits
+
+    def _search_remote(self, session_id: str, vector, k: int, with_vectors: bool) -> List[dict]:
+        if not self.client:
+            return []
+        try:
+            self._ensure_collection()
+            results = self.client.query_points(
+                collection_name=self.collection_name, query=vector.tolist(), query_filter=self._session_filter(session_id),
+                limit=k, with_vectors=with_vectors
+            ).points
+        except Exception as e:
+            print(f"Document search failed: {e}")
+            return []
+        hits = [dict(r.payload or {}, score=float(r.score)) for r in results]
+        if with_vectors:
+            for hit, r in zip(hits, results):
+                hit["vector"] = np.asarray(r.vector, dtype="float32") if r.vector is not None else None
+        return hits
+
+    def search(self, session_id: str, query: str, k: int = 5, vector=None, with_vectors: bool = False) -> List[dict]:
+        """
+        Top-k chunks for the query as {"source", "text", "chunk", "score"} dicts
+        (plus the chunk's "vector" when `with_vectors` is set), from Qdrant and the
+        in-process index together: a session may have chunks in both after a fallback.
+        """
+        if vector is None:
+            vector = self.embeddings.embed(query)
+        hits = self._search_local(session_id, vector, k, with_vectors) + self._search_remote(session_id, vector, k, with_vectors)
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:k]
+
+    def delete_session(self, session_id: str):
+        """Drops every chunk indexed for a session (called when its thread is deleted)."""
+        with self._lock:
+            self._drop_local(session_id)
+            self._sources.pop(session_id, None)
+        self._remote_sessions.discard(session_id)
+        if not self.client:
+            return
+        try:
+            self._ensure_collection()
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(filter=self._session_filter(session_id)),
+            )
+        except Exception as e:
+            print(f"Deleting documents of session {session_id} failed: {e}")
+
+
+def _shared_qdrant_client():
+    """The semantic cache's Qdrant client while its circuit breaker is closed (None otherwise, retried later)."""
+    semantic_cache.connect()
+    return semantic_cache.client if semantic_cache.breaker.state == "closed" else None
+
+
+# Global Instance (shares the semantic cache's Qdrant client)
+document_store = DocumentStore(embeddings=embedding_service, client_factory=_shared_qdrant_client)
@@ -0,0 +1,294 @@
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")  # Lightweight model
+# Vector width of EMBEDDING_MODEL (0 = read it from the model). When set, it is checked once the model loads.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # how long a batch waits for company
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))              # texts per encode call
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))          # memoized vectors (~1.5KB each)
+# Shared embedding process ("unix:/path.sock" or "http://host:port"), set by api/serve.py for multi-worker mode
+EMBEDDING_SERVER = os.getenv("EMBEDDING_SERVER", "")
+EMBEDDING_SERVER_WAIT = float(os.getenv("EMBEDDING_SERVER_WAIT", "120"))  # seconds to wait for it to come up
+
+
+class EmbeddingService:
+    """
+    Single entry point to the sentence encoder for the cache, retrieval and grounding.
+
+    Requests from any thread or event loop are queued to one dedicated encoder thread,
+    which gathers whatever arrives within `window_ms` (up to `max_batch` texts) and
+    embeds it in a single `encode` call. Recent vectors are memoized by text hash, so a
+    query embedded for the cache lookup is free for retrieval and the cache insert.
+    Vectors are L2-normalized: a dot product is the cosine similarity.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 max_batch: int = EMBED_MAX_BATCH, cache_size: int = EMBED_CACHE_SIZE):
+        self.model_name = model_name
+        self._encoder = None  # loaded on first use (see `encoder`)
+        self._dim = EMBEDDING_DIM or None
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.cache_size = cache_size
+        self.stats = {"requests": 0, "texts": 0, "memo_hits": 0, "batches": 0, "encoded": 0}
+        self._memo = OrderedDict()  # sha1(text) -> vector, in LRU order
+        self._memo_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def encoder(self):
+        """The sentence-transformers model; importing and loading it takes seconds, so it waits for first use."""
+        if self._encoder is None:
+            with self._start_lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(self.model_name)
+                    dim = model.get_sentence_embedding_dimension()
+                    if self._dim is not None and dim != self._dim:
+                        raise ValueError(f"EMBEDDING_DIM={self._dim}, but {self.model_name} produces {dim}-dimensional vectors")
+                    self._dim = dim
+                    self._encoder = model
+        return self._encoder
+
+    @property
+    def dim(self) -> int:
+        """Vector width, used to size the Qdrant collections and in-process indexes (may load the model)."""
+        if self._dim is None:
+            self._dim = self._model_dim()
+        return self._dim
+
+    def _model_dim(self) -> int:
+        return self.encoder.get_sentence_embedding_dimension()
+
+    def warmup(self):
+        """Loads the model and runs one encode, so the first real request does not pay for either."""
+        self.embed_many(["warmup"], memoize=False)
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    # --- Encoder thread ---
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="axk-embeddings", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs = [job]
+            size = len(job[0])
+            deadline = time.monotonic() + self.window
+            stop = False
+            # Collect concurrent requests until the window closes or the batch is full
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                jobs.append(job)
+                size += len(job[0])
+            self._run_batch(jobs)
+            if stop:
+                return
+
+    def _run_batch(self, jobs):
+        unique = list(dict.fromkeys(text for texts, _, _ in jobs for text in texts))
+        try:
+            vectors = np.asarray(
+                self.encoder.encode(unique, batch_size=self.max_batch, normalize_embeddings=True),
+                dtype="float32",
+            )
+        except Exception as e:
+            for _, future, _ in jobs:
+                future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["encoded"] += len(unique)
+        by_text = dict(zip(unique, vectors))
+        for texts, future, memoize in jobs:
+            if memoize:
+                self._remember(texts, [by_text[t] for t in texts])
+            future.set_result(np.stack([by_text[t] for t in texts]))
+
+    # --- Memo ---
+
+    def _recall(self, texts: List[str]) -> list:
+        with self._memo_lock:
+            found = []
+            for text in texts:
+                key = self._key(text)
+                vector = self._memo.get(key)
+                if vector is not None:
+                    self._memo.move_to_end(key)
+                found.append(vector)
+            return found
+
+    def _remember(self, texts: List[str], vectors: list):
+        if self.cache_size <= 0:
+            return
+        with self._memo_lock:
+            for text, vector in zip(texts, vectors):
+                # Copy: a row view would keep the whole batch array alive
+                self._memo[self._key(text)] = vector.copy()
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+
+    # --- Public API ---
+
+    def submit(self, texts: List[str], memoize: bool = True) -> Future:
+        """
+        Queues texts for embedding and returns a Future of an (n, dim) float32 array.
+        Large requests are split into `max_batch` pieces so short queries can be
+        batched in between instead of waiting behind a whole document.
+        Pass memoize=False for one-off texts (document chunks, answers).
+        """
+        self.stats["requests"] += 1
+        self.stats["texts"] += len(texts)
+        result = Future()
+        vectors = self._recall(texts) if memoize else [None] * len(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self.stats["memo_hits"] += len(texts) - len(missing)
+
+        if not missing:
+            result.set_result(np.stack(vectors) if vectors else np.zeros((0, self.dim), dtype="float32"))
+            return result
+
+        self._ensure_worker()
+        pieces = [missing[i:i + self.max_batch] for i in range(0, len(missing), self.max_batch)]
+        pending = [len(pieces)]
+        lock = threading.Lock()
+
+        def on_piece(indices, future):
+            with lock:
+                if result.done():
+                    return
+                error = future.exception()
+                if error is not None:
+                    result.set_exception(error)
+                    return
+                for i, vector in zip(indices, future.result()):
+                    vectors[i] = vector
+                pending[0] -= 1
+                if pending[0] == 0:
+                    result.set_result(np.stack(vectors))
+
+        for indices in pieces:
+            piece = Future()
+            piece.add_done_callback(lambda f, indices=indices: on_piece(indices, f))
+            self._queue.put(([texts[i] for i in indices], piece, memoize))
+        return result
+
+    def embed_many(self, texts: List[str], memoize: bool = True) -> np.ndarray:
+        return self.submit(texts, memoize).result()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    async def aembed_many(self, texts: List[str], memoize: bool = True) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts, memoize))
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return (await self.aembed_many([text]))[0]
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["avg_batch"] = stats["encoded"] / stats["batches"] if stats["batches"] else 0.0
+        stats["memo_size"] = len(self._memo)
+        return stats
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+class _RemoteEncoder:
+    """`encode()` over HTTP to the shared embedding process (api/embedding_server.py)."""
+
+    def __init__(self, address: str):
+        import httpx
+
+        if address.startswith("unix:"):
+            self._client = httpx.Client(transport=httpx.HTTPTransport(uds=address[len("unix:"):]),
+                                        base_url="http://embeddings", timeout=60)
+        else:
+            self._client = httpx.Client(base_url=address, timeout=60)
+
+    def encode(self, texts: List[str], batch_size: int = None, normalize_embeddings: bool = True) -> np.ndarray:
+        import httpx
+
+        deadline = time.monotonic() + EMBEDDING_SERVER_WAIT
+        while True:
+            try:
+                response = self._client.post("/embed", json={"texts": list(texts)})
+                break
+            except httpx.TransportError:
+                # The embedding process may still be loading the model
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        response.raise_for_status()
+        return np.frombuffer(response.content, dtype="float32").reshape(len(texts), -1)
+
+    def close(self):
+        self._client.close()
+
+
+class RemoteEmbeddingService(EmbeddingService):
+    """
+    EmbeddingService for API workers that share one model in a separate embedding process.
+    Batching and the memo still happen per worker; each batch is one local HTTP call, and
+    the embedding process batches again across all workers.
+    """
+
+    def __init__(self, address: str = EMBEDDING_SERVER, **kwargs):
+        super().__init__(**kwargs)
+        self.address = address
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._start_lock:
+                if self._encoder is None:
+                    self._encoder = _RemoteEncoder(self.address)
+        return self._encoder
+
+    def _model_dim(self) -> int:
+        # The embedding process validates EMBEDDING_DIM against its model; ask it for one vector
+        return int(self.encoder.encode(["dimension probe"]).shape[1])
+
+    def close(self):
+        super().close()
+        if self._encoder is not None:
+            self._encoder.close()
+            self._encoder = None
+
+
+# Global Instance (API workers in multi-worker mode share the model through EMBEDDING_SERVER)
+embedding_service = RemoteEmbeddingService() if EMBEDDING_SERVER else EmbeddingService()
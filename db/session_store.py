@@ -0,0 +1,225 @@
+import time
+from typing import List, Optional
+
+# Session titles are the first question, cut to this length
+TITLE_MAX_CHARS = 60
+
+
+def _text(content) -> str:
+    """Plain text of a message's content (Gemini may return a list of parts)."""
+    if isinstance(content, str):
+        return content
+    return " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict) and p.get("type") == "text")
+
+
+class SessionStore:
+    """
+    Session catalog and transcript projection kept next to the checkpoints.
+
+    `sessions` holds one row per thread (title, timestamps, turn and token totals),
+    indexed on updated_at so the recent-sessions list is a short index scan.
+    `transcript` holds the user/assistant text of each turn, so history loads without
+    deserializing graph state. Rows disappear with their thread: a trigger follows
+    deletions from the checkpointer's `thread_activity` table (retention/maintenance).
+    `token_usage` books LLM tokens (input, output, cached) per session and UTC day; it
+    outlives the session so cost history survives retention.
+    Uses the checkpointer's connection and lock, so writes share its group commit.
+    """
+
+    def __init__(self, checkpointer):
+        self.checkpointer = checkpointer
+        self.is_setup = False
+
+    @property
+    def conn(self):
+        return self.checkpointer.conn
+
+    async def setup(self):
+        if self.is_setup:
+            return
+        await self.checkpointer.setup()
+        async with self.checkpointer.lock:
+            await self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    thread_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    turns INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at DESC);
+                CREATE TABLE IF NOT EXISTS transcript (
+                    thread_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (thread_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS token_usage (
+                    thread_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    cached_tokens INTEGER NOT NULL DEFAULT 0,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    turns INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (thread_id, day)
+                );
+                CREATE INDEX IF NOT EXISTS idx_token_usage_day ON token_usage(day);
+                CREATE TRIGGER IF NOT EXISTS trg_thread_activity_delete AFTER DELETE ON thread_activity
+                BEGIN
+                    DELETE FROM sessions WHERE thread_id = OLD.thread_id;
+                    DELETE FROM transcript WHERE thread_id = OLD.thread_id;
+                END;
+            """)
+            # Sessions from before the catalog existed: listed by id until their next turn
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO sessions (thread_id, title, created_at, updated_at) "
+                "SELECT thread_id, thread_id, updated_at, updated_at FROM thread_activity"
+            )
+            await self.conn.flush()
+        self.is_setup = True
+
+    async def record_turn(self, thread_id: str, question: str, answer: str, tokens: int = 0):
+        """Appends one user/assistant exchange and updates the session's totals."""
+        await self.setup()
+        now = time.time()
+        answer = _text(answer)
+        title = " ".join(question.split())[:TITLE_MAX_CHARS] or thread_id
+        async with self.checkpointer.lock:
+            async with self.conn.execute("SELECT turns, title FROM sessions WHERE thread_id = ?", (thread_id,)) as cursor:
+                row = await cursor.fetchone()
+            turns = row[0] if row else 0
+            if row is None:
+                await self.conn.execute(
+                    "INSERT INTO sessions (thread_id, title, created_at, updated_at, turns, tokens) VALUES (?, ?, ?, ?, 1, ?)",
+                    (thread_id, title, now, now, tokens)
+                )
+            else:
+                # Backfilled sessions get a real title on their first recorded turn
+                await self.conn.execute(
+                    "UPDATE sessions SET updated_at = ?, turns = turns + 1, tokens = tokens + ?, "
+                    "title = CASE WHEN title = thread_id THEN ? ELSE title END WHERE thread_id = ?",
+                    (now, tokens, title, thread_id)
+                )
+            await self.conn.executemany(
+                "INSERT OR REPLACE INTO transcript (thread_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(thread_id, turns * 2, "user", question, now), (thread_id, turns * 2 + 1, "assistant", answer, now)]
+            )
+            await self.conn.commit()
+
+    async def record_usage(self, thread_id: str, day: str, usage: dict):
+        """Adds one turn's token usage to the session's row for `day`."""
+        await self.setup()
+        async with self.checkpointer.lock:
+            await self.conn.execute(
+                "INSERT INTO token_usage (thread_id, day, input_tokens, output_tokens, cached_tokens, llm_calls, turns) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT(thread_id, day) DO UPDATE SET "
+                "input_tokens = input_tokens + excluded.input_tokens, output_tokens = output_tokens + excluded.output_tokens, "
+                "cached_tokens = cached_tokens + excluded.cached_tokens, llm_calls = llm_calls + excluded.llm_calls, "
+                "turns = turns + 1",
+                (thread_id, day, usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                 usage.get("cached_tokens", 0), usage.get("llm_calls", 0))
+            )
+            await self.conn.commit()
+
+    async def tokens_on(self, thread_id: str, day: str) -> int:
+        """Input + output tokens the session spent on `day`."""
+        await self.setup()
+        async with self.checkpointer.lock:
+            async with self.conn.execute(
+                "SELECT input_tokens + output_tokens FROM token_usage WHERE thread_id = ? AND day = ?", (thread_id, day)
+            ) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def get_usage(self, thread_id: str, days: int = 30) -> List[dict]:
+        """The session's daily usage, newest day first."""
+        await self.setup()
+        async with self.checkpointer.lock:
+            async with self.conn.execute(
+                "SELECT day, input_tokens, output_tokens, cached_tokens, llm_calls, turns FROM token_usage "
+                "WHERE thread_id = ? ORDER BY day DESC LIMIT ?", (thread_id, days)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [
+            {"day": r[0], "input_tokens": r[1], "output_tokens": r[2], "cached_tokens": r[3], "llm_calls": r[4], "turns": r[5]}
+            for r in rows
+        ]
+
+    async def top_usage(self, day: str, limit: int = 10) -> List[dict]:
+        """Sessions that spent the most tokens on `day` (runaway sessions first)."""
+        await self.setup()
+        async with self.checkpointer.lock:
+            async with self.conn.execute(
+                "SELECT u.thread_id, s.title, u.input_tokens, u.output_tokens, u.cached_tokens, u.llm_calls, u.turns "
+                "FROM token_usage u LEFT JOIN sessions s ON s.thread_id = u.thread_id WHERE u.day = ? "
+                "ORDER BY u.input_tokens + u.output_tokens DESC LIMIT ?", (day, limit)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [
+            {"thread_id": r[0], "title": r[1], "input_tokens": r[2], "output_tokens": r[3], "cached_tokens": r[4],
+             "llm_calls": r[5], "turns": r[6]}
+            for r in rows
+        ]
+
+    async def list_sessions(self, limit: int = 20, before: Optional[float] = None) -> dict:
+        """Most recently updated sessions first. Pass the returned `next_before` to page on."""
+        await self.setup()
+        query = "SELECT thread_id, title, created_at, updated_at, turns, tokens FROM sessions"
+        params = []
+        if before is not None:
+            query += " WHERE updated_at < ?"
+            params.append(before)
+        query += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit + 1)
+        async with self.checkpointer.lock:
+            async with self.conn.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+        items = [
+            {"thread_id": r[0], "title": r[1], "created_at": r[2], "updated_at": r[3], "turns": r[4], "tokens": r[5]}
+            for r in rows[:limit]
+        ]
+        return {"sessions": items, "next_before": items[-1]["updated_at"] if len(rows) > limit else None}
+
+    async def get_transcript(self, thread_id: str, limit: int = 100, before: Optional[int] = None) -> dict:
+        """The latest `limit` messages (before sequence number `before`), oldest first."""
+        await self.setup()
+        query = "SELECT seq, role, content FROM transcript WHERE thread_id = ?"
+        params = [thread_id]
+        if before is not None:
+            query += " AND seq < ?"
+            params.append(before)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        async with self.checkpointer.lock:
+            async with self.conn.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+        page = list(reversed(rows[:limit]))
+        return {
+            "history": [{"role": role, "content": content} for _, role, content in page],
+            "next_before": page[0][0] if len(rows) > limit else None,
+        }
+
+    async def backfill_transcript(self, thread_id: str, messages: List) -> None:
+        """Projects an existing thread's human/AI messages into the transcript (sessions from before the catalog)."""
+        await self.setup()
+        rows = []
+        now = time.time()
+        for msg in messages:
+            if msg.type not in ("human", "ai") or getattr(msg, "tool_calls", None):
+                continue
+            rows.append((thread_id, len(rows), "user" if msg.type == "human" else "assistant", _text(msg.content), now))
+        if not rows:
+            return
+        async with self.checkpointer.lock:
+            await self.conn.executemany(
+                "INSERT OR IGNORE INTO transcript (thread_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            await self.conn.execute(
+                "UPDATE sessions SET turns = ? WHERE thread_id = ? AND turns = 0",
+                (sum(1 for r in rows if r[2] == "user"), thread_id)
+            )
+            await self.conn.commit()
@@ -1,84 +1,253 @@
 import os
+import json
 import time
+import uuid
+import zlib
+import base64
+import hashlib
+import threading
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from sentence_transformers import SentenceTransformer
+
+from db.embeddings import embedding_service
+from db.cache_index import MemoryCacheIndex, QdrantCacheIndex, CircuitBreaker, QDRANT_TIMEOUT
+
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 86400)))           # seconds an entry stays valid
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "50000"))  # least-recently-hit beyond this are evicted
+SEMANTIC_CACHE_EVICT_INTERVAL = int(os.getenv("SEMANTIC_CACHE_EVICT_INTERVAL", "600"))  # seconds between eviction runs
+# A new answer whose query is this close to an existing entry (same scope) refreshes it instead
+SEMANTIC_CACHE_DEDUP_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_DEDUP_THRESHOLD", "0.97"))
+# auto: Qdrant with the in-process index as fallback | qdrant | memory (no external service)
+SEMANTIC_CACHE_BACKEND = os.getenv("SEMANTIC_CACHE_BACKEND", "auto").lower()
+SEMANTIC_CACHE_SNAPSHOT = os.getenv("SEMANTIC_CACHE_SNAPSHOT", "")  # .npz path for the in-process index (empty = off)
+
+
+def _point_id(query: str, scope: str) -> str:
+    """Deterministic ID from the scope and normalized query: concurrent inserts never collide."""
+    key = f"{scope or ''}\n{' '.join(query.lower().split())}"
+    return str(uuid.UUID(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]))
+
+
+def _pack(data: dict) -> str:
+    return base64.b64encode(zlib.compress(json.dumps(data).encode("utf-8"), 6)).decode("ascii")
+
+
+def _unpack(blob: str) -> dict:
+    return json.loads(zlib.decompress(base64.b64decode(blob)).decode("utf-8"))
+
 
 class SemanticCache:
-    def __init__(self):
+    """
+    Cache of answers, matched by query similarity within a scope (see db/cache_policy.py).
+    Point IDs are a hash of scope + query, entries carry `expires_at` / `hits` /
+    `last_hit` payloads, and answers and sources are stored zlib-compressed.
+    A near-duplicate of an existing entry refreshes it in place, and `evict()`
+    drops expired entries and the least-recently-hit ones above `max_entries`.
+
+    Entries live in Qdrant and/or an in-process index (db/cache_index.py). With the
+    "auto" backend every write also goes to the in-process index, and reads fail
+    over to it while Qdrant's circuit breaker is open.
+    """
+
+    def __init__(self, ttl: int = SEMANTIC_CACHE_TTL, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 dedup_threshold: float = SEMANTIC_CACHE_DEDUP_THRESHOLD, backend: str = SEMANTIC_CACHE_BACKEND,
+                 snapshot_path: str = SEMANTIC_CACHE_SNAPSHOT):
         self.url = os.getenv("QDRANT_URL", "http://localhost:6333")
         self.api_key = os.getenv("QDRANT_API_KEY")
-        
-        # Initialize Client
-        # If no URL is set, we might default to local memory for testing, 
-        # but the plan said Qdrant.
-        try:
-             self.client = QdrantClient(url=self.url, api_key=self.api_key)
-        except:
-             print("Qdrant not reachable. Caching disabled.")
-             self.client = None
-
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.dedup_threshold = dedup_threshold
+        self.backend = backend if backend in ("auto", "qdrant", "memory") else "auto"
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "refreshes": 0, "expired": 0, "evictions": 0, "failovers": 0}
+        self._lock = threading.Lock()
+        self.embeddings = embedding_service # Shared, batched encoder
         self.collection_name = "semantic_cache"
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2') # Lightweight model
-        
-        if self.client:
-            self._ensure_collection()
 
-    def _ensure_collection(self):
+        self.snapshot_path = snapshot_path
+        self.client = None
+        self.remote = None
+        self.local = None
+        self.breaker = CircuitBreaker()
+        self._connected = False
+
+    def connect(self):
+        """Creates the indexes (Qdrant health check, snapshot load) on first use, not at import."""
+        if self._connected:
+            return
+        with self._lock:
+            if not self._connected:
+                self._connect_locked()
+                self._connected = True
+
+    def _connect_locked(self):
+        if self.backend != "memory":
+            # Construction does not contact the server; a short timeout bounds each request
+            try:
+                self.client = QdrantClient(url=self.url, api_key=self.api_key, timeout=QDRANT_TIMEOUT)
+                self.remote = QdrantCacheIndex(self.client, self.collection_name, self.embeddings.dim)
+                if not self.remote.healthy():
+                    print("Qdrant not reachable. Semantic cache falls back to the in-process index.")
+                    self.breaker.trip()
+            except Exception as e:
+                print(f"Qdrant client failed ({e}). Semantic cache uses the in-process index.")
+                self.client = None
+        if self.backend != "qdrant" or self.remote is None:
+            self.local = MemoryCacheIndex(self.embeddings.dim, self.snapshot_path or None)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _indexes(self) -> list:
+        """The indexes to use for this call, preferred first: Qdrant while its breaker allows it."""
+        self.connect()
+        indexes = []
+        if self.remote is not None and self.breaker.allow():
+            indexes.append(self.remote)
+        if self.local is not None:
+            indexes.append(self.local)
+        return indexes
+
+    def _call(self, index, method: str, *args, **kwargs):
+        """Runs one index operation, feeding Qdrant's outcome to the circuit breaker."""
+        if index is not self.remote:
+            return getattr(index, method)(*args, **kwargs)
         try:
-            self.client.get_collection(self.collection_name)
+            result = getattr(index, method)(*args, **kwargs)
         except Exception:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        return result
+
+    def _read(self, method: str, *args, **kwargs):
+        """Answers from the preferred index, failing over to the in-process one on error."""
+        indexes = self._indexes()
+        for i, index in enumerate(indexes):
             try:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=384, distance=Distance.COSINE),
-                )
+                return self._call(index, method, *args, **kwargs)
             except Exception as e:
-                print(f"Failed to create/get collection: {e}")
-                self.client = None # Disable client if we can't ensure collection
+                if i + 1 == len(indexes):
+                    raise
+                self._count("failovers")
+                print(f"Semantic cache {method} failed on {index.name} ({e}); using {indexes[i + 1].name}")
+        return None
 
-    def check_cache(self, query: str, threshold: float = 0.85):
-        if not self.client:
-            return None
-            
+    def _write(self, method: str, *args, **kwargs):
+        """Applies a write to every usable index (the in-process one mirrors Qdrant)."""
+        results, errors = [], []
+        for index in self._indexes():
+            try:
+                results.append(self._call(index, method, *args, **kwargs))
+            except Exception as e:
+                errors.append(f"{index.name}: {e}")
+        if errors and not results:
+            raise RuntimeError("; ".join(errors))
+        if errors:
+            print(f"Semantic cache {method} partially failed: {'; '.join(errors)}")
+        return results[0] if results else 0
+
+    def check_cache(self, query: str, scope: str = None, threshold: float = 0.85, vector=None):
+        """
+        Returns the cached payload ({"answer", "sources", "metrics"}) for a semantically
+        similar, unexpired query within the same scope, or None.
+        Pass `vector` when the query embedding is already known.
+        """
         try:
-            vector = self.encoder.encode(query).tolist()
-            
-            results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=vector,
-                limit=1,
-                score_threshold=threshold
-            )
+            if vector is None:
+                vector = self.embeddings.embed(query)
             
-            if results:
-                return results[0].payload.get("answer")
+            # Only match entries created for the same inputs/session (see db/cache_policy.py)
+            hit = self._read("nearest", vector, scope, threshold)
+            if hit and hit[1].get("data"):
+                point_id, payload = hit
+                self._write("set_payload", point_id, {"hits": payload.get("hits", 0) + 1, "last_hit": time.time()})
+                self._count("hits")
+                return {**_unpack(payload["data"]), "metrics": payload.get("metrics") or {}}
         except Exception as e:
             print(f"Cache check failed: {e}")
-            # Optional: Disable client if connection refused repeatedly
         
+        self._count("misses")
         return None
 
-    def add_to_cache(self, query: str, answer: str):
-        if not self.client:
+    def add_to_cache(self, query: str, answer: str, scope: str = None, sources: list = None, metrics: dict = None, vector=None):
+        """Stores an answer, or refreshes the near-duplicate entry already cached for this scope."""
+        try:
+            if vector is None:
+                vector = self.embeddings.embed(query)
+            now = time.time()
+            payload = {
+                "query": query,
+                "scope": scope,
+                "data": _pack({"answer": answer, "sources": sources or []}),
+                "metrics": metrics or {},
+                "created_at": now,
+                "expires_at": now + self.ttl,
+                "last_hit": now,
+                "hits": 0,
+            }
+
+            existing = self._read("nearest", vector, scope, self.dedup_threshold)
+            if existing is not None:
+                # Keep the entry's ID, vector and hit count; replace the answer and restart its TTL
+                point_id, old = existing
+                payload.update({"query": old.get("query", query), "hits": old.get("hits", 0)})
+                self._write("set_payload", point_id, payload, replace=True)
+                self._count("refreshes")
+                return
+
+            self._write("upsert", _point_id(query, scope), vector, payload)
+            self._count("stores")
+        except Exception as e:
+            print(f"Cache update failed: {e}")
+
+    def evict(self) -> dict:
+        """Deletes expired entries, then the least-recently-hit ones above `max_entries`."""
+        expired = self._write("delete_expired")
+        evicted = self._write("evict_lru", self.max_entries)
+        self._count("expired", expired)
+        self._count("evictions", evicted)
+        self.snapshot()
+        return {"expired": expired, "evicted": evicted}
+
+    def purge(self, scope: str = None) -> int:
+        """Deletes every entry (or only those of `scope`). Returns how many were removed."""
+        removed = self._write("purge", scope)
+        self.snapshot()
+        return removed
+
+    def snapshot(self):
+        """Persists the in-process index, if a snapshot path is configured."""
+        if not self._connected or self.local is None:
             return
+        try:
+            self.local.snapshot()
+        except Exception as e:
+            print(f"Semantic cache snapshot failed: {e}")
 
+    def get_stats(self) -> dict:
+        self.connect()
+        with self._lock:
+            stats = dict(self.stats)
+        entries = expired = 0
+        remote_up = self.remote is not None and self.breaker.state == "closed"
+        active = "qdrant" if remote_up else (self.local.name if self.local is not None else None)
         try:
-            vector = self.encoder.encode(query).tolist()
-            point_id = int(time.time() * 1000) # Simple ID generation
-            
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=[
-                    PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload={"query": query, "answer": answer}
-                    )
-                ]
-            )
+            entries = self._read("count")
+            expired = entries - self._read("count", live=True)
         except Exception as e:
-            print(f"Cache update failed: {e}")
+            stats["error"] = str(e)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "backend": self.backend,
+            "active_index": active,
+            "qdrant_breaker": self.breaker.state if self.remote is not None else None,
+            "entries": entries,
+            "expired_pending": expired,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hit_ratio": stats["hits"] / lookups if lookups else 0.0,
+        })
+        return stats
 
 # Global Instance
 semantic_cache = SemanticCache()
@@ -43,6 +43,34 @@ st.markdown("""
 
 # --- CONSTANTS ---
 API_URL = "http://localhost:8050/query"
+STREAM_URL = "http://localhost:8050/query/stream"
+
+def consume_stream(response, placeholder, tool_placeholder):
+    """Renders Server-Sent Events from /query/stream as they arrive and returns the final payload."""
+    streamed = ""
+    result = {}
+    event = None
+    # chunk_size=None yields data as soon as the server flushes it
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            payload = json.loads(line[len("data:"):].strip())
+            if event == "token":
+                streamed += payload.get("text", "")
+                placeholder.markdown(streamed + "▌")
+            elif event == "tool_start":
+                tool_placeholder.caption(f"🔧 Using `{payload.get('name')}`...")
+            elif event == "tool_end":
+                tool_placeholder.caption(f"✅ `{payload.get('name')}` finished")
+            elif event == "final":
+                result = payload
+            elif event == "error":
+                result = {"answer": f"⏳ The engine is busy ({payload.get('detail')}). Please retry in {payload.get('retry_after')}s."}
+    tool_placeholder.empty()
+    return result
 
 # --- SESSION STATE INITIALIZATION ---
 if "messages" not in st.session_state:
@@ -124,13 +152,13 @@ with st.sidebar:
     # History List (Max 5)
     st.caption("📜 Recent Sessions (Max 5)")
     try:
-         hist_resp = requests.get(f"http://localhost:8050/sessions")
+         hist_resp = requests.get("http://localhost:8050/sessions", params={"limit": 5})
          if hist_resp.status_code == 200:
              sessions = hist_resp.json().get("sessions", [])
              
-             for sess in sessions:
-                 # Clean ID for display
-                 label = sess[:8]
+             for entry in sessions:
+                 sess = entry["thread_id"]
+                 label = entry["title"][:30] if entry["title"] != sess else sess[:8]
                  if sess == st.session_state.session_id:
                      label += " (Current)"
                      
@@ -218,6 +246,7 @@ if prompt:
     
     with st.chat_message("assistant", avatar="🤖"):
         message_placeholder = st.empty()
+        tool_placeholder = st.empty()
         
         with st.spinner("Thinking..."):
             try:
@@ -247,16 +276,16 @@ if prompt:
                     "session_id": st.session_state.session_id
                 }
                 
-                # POST Request
-                response = requests.post(API_URL, data=data, files=files_payload)
+                # POST Request (streamed: tokens and tool activity render as they arrive)
+                response = requests.post(STREAM_URL, data=data, files=files_payload, stream=True)
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = consume_stream(response, message_placeholder, tool_placeholder)
                     answer = result.get("answer", "No answer generated.")
                     sources = result.get("sources", [])
                     metrics = result.get("metrics", {})
                     
-                    # Stream output (simulated for now, text is static)
+                    # Final render (drops the streaming cursor)
                     message_placeholder.markdown(answer)
                     
                     # Graphviz Visualization Support
@@ -292,6 +321,12 @@ if prompt:
                                 col_a.metric("Latency", f"{metrics.get('latency', 0):.2f}s")
                                 col_b.metric("Tokens", metrics.get('tokens_used', 0))
                                 col_c.metric("Confidence", f"{metrics.get('grounding_score', 0.0) * 100:.0f}%")
+                                # Least-supported claims first: the ones worth double-checking
+                                claims = sorted(metrics.get("grounding_claims") or [], key=lambda c: c.get("score", 0.0))
+                                if claims:
+                                    st.caption("Claim support (lowest first)")
+                                    for c in claims[:5]:
+                                        st.text(f"{c.get('score', 0.0) * 100:.0f}%  {c.get('claim', '')[:120]}  ({c.get('source') or 'n/a'})")
                     
                     # Suggestions (Proactive)
                     with st.container():
@@ -324,6 +359,9 @@ if prompt:
                              st.session_state.suggestion_msg = f"Verify these claims with a strict web search: '{last_ans}'"
                              st.rerun()
 
+                elif response.status_code in (429, 503):
+                    retry = response.headers.get("Retry-After", "a few")
+                    message_placeholder.warning(f"⏳ The engine is busy. Please retry in {retry}s.")
                 else:
                     error_msg = f"❌ **Error {response.status_code}**: {response.text}"
                     message_placeholder.markdown(error_msg)
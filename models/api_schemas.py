@@ -12,10 +12,25 @@ class Source(BaseModel):
     content_snippet: str
     score: float
 
+class ClaimSupport(BaseModel):
+    claim: str
+    score: float = Field(..., description="Similarity to the best-matching context chunk")
+    source: Optional[str] = None
+
 class Metrics(BaseModel):
     latency: float
     tokens_used: int
-    grounding_score: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = Field(0, description="Input tokens served from the provider's context cache")
+    llm_calls: int = 0
+    tokens_estimated: bool = Field(False, description="Some calls reported no usage and were estimated locally")
+    grounding_score: Optional[float] = Field(None, description="Mean per-claim support of the answer by its context")
+    grounding_claims: List[ClaimSupport] = []
+    cache_hit: bool = False
+    cache_latency: Optional[float] = Field(None, description="Semantic cache lookup time in seconds")
+    time_to_first_token: Optional[float] = Field(None, description="Seconds until the first answer token (streaming only)")
+    stages: Dict[str, float] = Field({}, description="Seconds spent per pipeline stage, graph node (node:*) and tool (tool:*)")
 
 class QueryResponse(BaseModel):
     answer: str
@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api import app as api_app
+from core.profiler import profile_store
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profile_store, "directory", str(tmp_path))
+    # No `with`: the lifespan (model warmup) is not needed for these routes
+    return TestClient(api_app.app)
+
+
+@pytest.mark.parametrize("method, path", [("get", "/profiles"), ("get", "/profiles/abc"), ("post", "/cache/purge")])
+def test_disabled_without_admin_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(api_app, "ADMIN_TOKEN", "")
+    assert getattr(client, method)(path, headers={"X-Admin-Token": ""}).status_code == 403
+
+
+@pytest.mark.parametrize("method, path", [("get", "/profiles"), ("get", "/profiles/abc"), ("post", "/cache/purge")])
+def test_rejects_wrong_admin_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(api_app, "ADMIN_TOKEN", "secret")
+    assert getattr(client, method)(path).status_code == 401
+    assert getattr(client, method)(path, headers={"X-Admin-Token": "guess"}).status_code == 401
+
+
+def test_admin_token_grants_access(client, monkeypatch):
+    monkeypatch.setattr(api_app, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.get("/profiles", headers=headers).json() == {"profiles": []}
+    assert client.get("/profiles/abc", headers=headers).status_code == 404
@@ -0,0 +1,87 @@
+import asyncio
+import types
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agents import context_cache
+from agents.context_cache import CONTEXT_CACHE_REFRESH_BEFORE, ContextCacheManager
+from benchmarks.fakes import FakeContextCacheProvider
+
+TTL = 3600
+IMAGE = {"type": "image_url", "image_url": {"url": "data:image/png;base64,iVBORw0KGgo="}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(context_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _manager(provider) -> ContextCacheManager:
+    return ContextCacheManager(provider, "You are a test assistant.", [], ttl=TTL, min_tokens=1)
+
+
+def _turn(*extra):
+    return [HumanMessage(content=[{"type": "text", "text": "What is in this picture?"}, IMAGE], id="m1"), *extra]
+
+
+def test_creates_handle_and_moves_attachments_into_it(clock):
+    provider = FakeContextCacheProvider()
+    manager = _manager(provider)
+
+    messages, handle = asyncio.run(manager.prepare("s1", _turn()))
+
+    assert handle == "cachedContents/fake-1"
+    assert provider.caches[handle]["attachments"] == [IMAGE]
+    assert IMAGE not in messages[0].content
+
+
+def test_reuses_and_refreshes_handle(clock):
+    provider = FakeContextCacheProvider()
+    manager = _manager(provider)
+    first = asyncio.run(manager.prepare("s1", _turn()))[1]
+
+    follow_up = HumanMessage(content="And the colours?", id="m2")
+    clock[0] += 60
+    assert asyncio.run(manager.prepare("s1", _turn(follow_up)))[1] == first
+    assert provider.calls == {"create": 1, "refresh": 0, "delete": 0}
+
+    # Close to expiry the handle is extended, not recreated
+    clock[0] += TTL - CONTEXT_CACHE_REFRESH_BEFORE
+    assert asyncio.run(manager.prepare("s1", _turn(follow_up)))[1] == first
+    assert provider.calls == {"create": 1, "refresh": 1, "delete": 0}
+    assert manager.stats["reuses"] == 1
+
+
+def test_recreates_expired_handle(clock):
+    provider = FakeContextCacheProvider()
+    manager = _manager(provider)
+    first = asyncio.run(manager.prepare("s1", _turn()))[1]
+
+    clock[0] += TTL + 1
+    second = asyncio.run(manager.prepare("s1", _turn()))[1]
+
+    assert second != first
+    assert provider.calls["create"] == 2
+    assert provider.caches[second]["attachments"] == [IMAGE]
+    assert first not in provider.caches
+
+
+def test_sessions_without_attachments_are_not_cached(clock):
+    provider = FakeContextCacheProvider()
+    manager = _manager(provider)
+
+    messages = [HumanMessage(content="Just text", id="m1")]
+    assert asyncio.run(manager.prepare("s1", messages)) == (messages, None)
+    assert provider.calls["create"] == 0
+
+
+def test_provider_failure_falls_back_to_full_prompt(clock):
+    provider = FakeContextCacheProvider(fail=True)
+    manager = _manager(provider)
+
+    messages = _turn()
+    assert asyncio.run(manager.prepare("s1", messages)) == (messages, None)
+    assert manager.get_stats()["errors"] == 1
@@ -0,0 +1,50 @@
+import asyncio
+import types
+
+import pytest
+
+from core import scheduler
+from core.scheduler import Overloaded, TurnScheduler
+
+
+def test_slot_acquired_as_wait_times_out_is_released(monkeypatch):
+    async def late_timeout(awaitable, timeout):
+        # The slot is obtained, but the timeout wins the race
+        await awaitable
+        raise asyncio.TimeoutError
+
+    turns = TurnScheduler(max_concurrency=1, queue_timeout=1)
+
+    async def scenario():
+        monkeypatch.setattr(scheduler, "asyncio", types.SimpleNamespace(
+            wait_for=late_timeout, TimeoutError=asyncio.TimeoutError, Semaphore=asyncio.Semaphore))
+        with pytest.raises(Overloaded) as rejected:
+            async with turns.admit("s1"):
+                pass
+        assert rejected.value.status_code == 503
+
+        monkeypatch.undo()
+        # Both the slot and the session lock are free again
+        async with turns.admit("s1"):
+            assert turns.running == 1
+
+    asyncio.run(scenario())
+    assert turns.get_stats()["timed_out"] == 1
+    assert turns.running == 0 and turns.waiting == 0
+
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    turns = TurnScheduler(max_concurrency=1, queue_timeout=5)
+
+    async def scenario():
+        async with turns.admit("a"):
+            waiter = asyncio.ensure_future(turns.admit("b").__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        async with turns.admit("b"):
+            assert turns.running == 1
+
+    asyncio.run(asyncio.wait_for(scenario(), 2))
+    assert turns.running == 0 and turns.waiting == 0
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fixture_server import FixtureServer, static_page
+from tools import ingestion
+from tools.http_client import http_fetcher
+from tools.scrape_cache import ScrapeCache
+
+
+class FakeRenderer:
+    """Stands in for the browser pool: renders any URL as a static article."""
+
+    def __init__(self):
+        self.urls = []
+
+    async def arender(self, url: str, timeout_ms: int = 45000):
+        self.urls.append(url)
+        return static_page(10), "rendered body"
+
+
+@pytest.fixture
+def fixtures():
+    server = FixtureServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def renderer(monkeypatch, tmp_path):
+    # TTL 0: every lookup is stale, so each scrape goes back to the tier decision
+    monkeypatch.setattr(ingestion, "scrape_cache", ScrapeCache(str(tmp_path / "scrape.db"), default_ttl=0))
+    fake = FakeRenderer()
+    monkeypatch.setattr(ingestion, "browser_pool", fake)
+    return fake
+
+
+def _scrape(*urls):
+    async def run():
+        try:
+            return [await ingestion.arobust_scrape(url) for url in urls]
+        finally:
+            await http_fetcher.aclose()
+    return asyncio.run(run())
+
+
+def _tier(url: str) -> str:
+    return ingestion.scrape_cache.get(url)["tier"]
+
+
+def test_static_page_uses_static_tier(fixtures, renderer):
+    url = f"{fixtures.url}/static/20"
+    text, = _scrape(url)
+
+    assert "Paragraph 1." in text
+    assert _tier(url) in ("trafilatura", "bs4")
+    assert renderer.urls == []
+
+
+def test_js_page_falls_through_to_browser(fixtures, renderer):
+    url = f"{fixtures.url}/js/10"
+    _scrape(url)
+
+    assert renderer.urls == [url]
+    assert _tier(url) == "playwright"
+    assert fixtures.requests["js"] == 1
+
+    # The learned hint skips the static fetch for this URL on the next scrape
+    _scrape(url)
+    assert renderer.urls == [url, url]
+    assert fixtures.requests["js"] == 1
+
+
+def test_js_page_does_not_lock_its_host_into_browser(fixtures, renderer):
+    js_url = f"{fixtures.url}/js/10"
+    static_url = f"{fixtures.url}/static/20"
+    _scrape(js_url, static_url, static_url)
+
+    assert renderer.urls == [js_url]
+    assert _tier(js_url) == "playwright"
+    assert _tier(static_url) in ("trafilatura", "bs4")
+    assert fixtures.requests["static"] == 2
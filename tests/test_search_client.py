@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_tavily import FakeTavily
+from tools.http_client import http_fetcher
+from tools.search_client import SearchClient
+
+
+@pytest.fixture
+def tavily():
+    fake = FakeTavily(latency=0.2).start()
+    yield fake
+    fake.stop()
+
+
+def _run(coro):
+    async def run():
+        try:
+            return await coro
+        finally:
+            await http_fetcher.aclose()
+    return asyncio.run(run())
+
+
+def test_semantic_reuse_is_off_by_default():
+    assert SearchClient().semantic_threshold == 0
+
+
+def test_identical_searches_in_flight_share_one_request(tavily):
+    client = SearchClient(api_url=tavily.url, depth="basic")
+
+    async def scenario():
+        return await asyncio.gather(*[client.search("what is retrieval augmented generation", "key") for _ in range(5)])
+
+    responses = _run(scenario())
+
+    assert len(tavily.requests) == 1
+    assert all(r == responses[0] for r in responses)
+    assert client.stats["coalesced"] == 4
+
+
+def test_cancelled_leader_does_not_fail_coalesced_searches(tavily):
+    client = SearchClient(api_url=tavily.url, depth="basic")
+
+    async def scenario():
+        leader = asyncio.ensure_future(client.search("what is retrieval augmented generation", "key"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(client.search("what is retrieval augmented generation", "key"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        response = await follower
+        assert leader.cancelled()
+        return response
+
+    response = _run(scenario())
+
+    assert response["results"]
+    assert len(tavily.requests) == 1
+    assert client.stats["coalesced"] == 1
+    # The search finished for the follower, so it is cached for later callers too
+    assert client.get_stats()["entries"] == 1
+
+
+def test_exact_match_cache(tavily):
+    client = SearchClient(api_url=tavily.url, depth="basic")
+
+    async def scenario():
+        first = await client.search("What is RAG?", "key")
+        # Same query after normalization (case, whitespace): served from cache
+        again = await client.search("  what   is rag? ", "key")
+        # Different parameters or a reworded query go upstream
+        await client.search("What is RAG?", "key", max_results=2)
+        await client.search("Explain RAG", "key")
+        return first, again
+
+    first, again = _run(scenario())
+
+    assert again == first
+    assert client.stats["hits"] == 1
+    assert client.stats["semantic_hits"] == 0
+    assert [q for q, _ in tavily.requests] == ["What is RAG?", "What is RAG?", "Explain RAG"]
+
+
+def test_expired_entries_are_fetched_again(tavily):
+    client = SearchClient(api_url=tavily.url, ttl=0, depth="basic")
+
+    async def scenario():
+        await client.search("What is RAG?", "key")
+        await asyncio.sleep(0.01)
+        await client.search("What is RAG?", "key")
+
+    _run(scenario())
+
+    assert len(tavily.requests) == 2
+    assert client.stats["hits"] == 0
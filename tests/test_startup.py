@@ -0,0 +1,17 @@
+import os
+import statistics
+
+from benchmarks.startup_bench import HEAVY_MODULES, measure
+
+# Median seconds to import the app in a fresh interpreter (raise it on slow CI machines)
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "2.0"))
+RUNS = 3
+
+
+def test_app_import_is_fast_and_light():
+    samples = [measure("api.app") for _ in range(RUNS)]
+
+    heavy = sorted({m for s in samples for m in s["heavy"]})
+    assert heavy == [], f"importing api.app loaded {heavy} (expected none of {HEAVY_MODULES})"
+    median = statistics.median(s["seconds"] for s in samples)
+    assert median < IMPORT_BUDGET, f"median import time {median:.2f}s exceeds {IMPORT_BUDGET}s"
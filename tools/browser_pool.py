@@ -0,0 +1,181 @@
+import os
+import asyncio
+import threading
+from typing import Optional, Tuple
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))           # Chromium processes
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))           # concurrent pages, pool-wide
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", "100")) # pages served before a restart
+
+# Heavy resources that never contribute text
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+class _BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium shared by all dynamic scrapes.
+
+    Playwright runs on its own event loop in a background thread, so both sync callers
+    (scrapes running in the blocking pool) and async callers can use it. Each scrape gets
+    an isolated browser context; a semaphore caps concurrent pages; browsers are
+    recycled after `recycle_after` pages or when they crash.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES,
+                 recycle_after: int = BROWSER_RECYCLE_AFTER, block_resources: bool = True):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.recycle_after = recycle_after
+        self.block_resources = block_resources
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Loop-bound state, created on the pool's own loop
+        self._playwright = None
+        self._slots = []
+        self._next = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+
+    # --- Loop management ---
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="axk-browser-pool", daemon=True)
+            thread.start()
+            self._loop, self._thread = loop, thread
+
+    def _submit(self, coro):
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # --- Browser lifecycle (runs on the pool loop) ---
+
+    async def _launch(self) -> _BrowserSlot:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True)
+        slot = _BrowserSlot(browser)
+        browser.on("disconnected", lambda _: setattr(slot, "retired", True))
+        return slot
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        async with self._launch_lock:
+            # Drop retired browsers once their in-flight pages are done
+            for slot in [s for s in self._slots if s.retired]:
+                if slot.active == 0:
+                    self._slots.remove(slot)
+                    await self._close_browser(slot)
+            live = [s for s in self._slots if not s.retired]
+            if len(live) < self.size:
+                slot = await self._launch()
+                self._slots.append(slot)
+                return slot
+            self._next = (self._next + 1) % len(live)
+            return live[self._next]
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass # Already gone (crashed or disconnected)
+
+    async def _block_heavy(self, route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _render(self, url: str, timeout_ms: int) -> Tuple[str, str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+            self._launch_lock = asyncio.Lock()
+
+        async with self._semaphore:
+            for attempt in range(2):
+                slot = await self._acquire_slot()
+                slot.active += 1
+                context = None
+                try:
+                    context = await slot.browser.new_context(user_agent=USER_AGENT)
+                    if self.block_resources:
+                        await context.route("**/*", self._block_heavy)
+                    page = await context.new_page()
+                    await page.goto(url, timeout=timeout_ms)
+
+                    # Wait for content to stabilize
+                    try:
+                        await page.wait_for_load_state("networkidle", timeout=15000)
+                    except Exception:
+                        pass # Continue even if timeout, page might be mostly loaded
+
+                    html = await page.content()
+                    body = await page.query_selector("body")
+                    body_text = await body.inner_text() if body else ""
+                    return html, body_text
+                except Exception:
+                    # A dead browser gets replaced and the page retried once
+                    if attempt == 0 and not slot.browser.is_connected():
+                        slot.retired = True
+                        continue
+                    raise
+                finally:
+                    if context is not None:
+                        try:
+                            await context.close()
+                        except Exception:
+                            pass
+                    slot.active -= 1
+                    slot.pages_served += 1
+                    if slot.pages_served >= self.recycle_after:
+                        slot.retired = True
+
+    async def _shutdown(self):
+        for slot in self._slots:
+            await self._close_browser(slot)
+        self._slots = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # --- Public API ---
+
+    def render(self, url: str, timeout_ms: int = 45000) -> Tuple[str, str]:
+        """Renders a page and returns (html, body_text). Safe to call from any thread."""
+        return self._submit(self._render(url, timeout_ms)).result()
+
+    async def arender(self, url: str, timeout_ms: int = 45000) -> Tuple[str, str]:
+        """Async variant of `render` for callers on another event loop."""
+        return await asyncio.wrap_future(self._submit(self._render(url, timeout_ms)))
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            self._submit(self._shutdown()).result(timeout=30)
+        except Exception as e:
+            print(f"Browser pool shutdown failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._launch_lock = None
+
+
+# Global Instance
+browser_pool = BrowserPool()
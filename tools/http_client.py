@@ -0,0 +1,123 @@
+import os
+import asyncio
+import importlib.util
+import weakref
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_GLOBAL_CONCURRENCY = int(os.getenv("HTTP_GLOBAL_CONCURRENCY", "16"))  # fetches in flight, all hosts
+HTTP_PER_HOST_CONCURRENCY = int(os.getenv("HTTP_PER_HOST_CONCURRENCY", "4"))
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", str(5 * 1024 * 1024)))     # body cutoff per page
+
+# HTTP/2 needs the optional `h2` package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    encoding: str
+    truncated: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class _LoopState:
+    """Client and semaphores for one event loop (asyncio primitives are loop-bound)."""
+
+    def __init__(self, fetcher: "HttpFetcher"):
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=fetcher.max_connections,
+                max_keepalive_connections=fetcher.max_connections,
+                keepalive_expiry=30,
+            ),
+        )
+        self.global_semaphore = asyncio.Semaphore(fetcher.global_concurrency)
+        self.host_semaphores = {}
+
+    def host_semaphore(self, host: str, limit: int) -> asyncio.Semaphore:
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(limit)
+        return self.host_semaphores[host]
+
+
+class HttpFetcher:
+    """
+    Shared, pooled async HTTP client for ingestion.
+    Keep-alive connections are reused across requests; global and per-host semaphores
+    bound concurrency; bodies are streamed and cut off at `max_bytes`.
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS, global_concurrency: int = HTTP_GLOBAL_CONCURRENCY,
+                 per_host_concurrency: int = HTTP_PER_HOST_CONCURRENCY, max_bytes: int = HTTP_MAX_BYTES):
+        self.max_connections = max_connections
+        self.global_concurrency = global_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.max_bytes = max_bytes
+        self._states = weakref.WeakKeyDictionary()  # event loop -> _LoopState
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState(self)
+            self._states[loop] = state
+        return state
+
+    async def fetch(self, url: str, headers: dict = None, timeout: float = 10.0) -> FetchResult:
+        state = self._state()
+        host = (urlsplit(url).hostname or "").lower()
+        async with state.global_semaphore, state.host_semaphore(host, self.per_host_concurrency):
+            async with state.client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                chunks = []
+                size = 0
+                truncated = False
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_bytes:
+                        truncated = True
+                        break
+                content = b"".join(chunks)[:self.max_bytes]
+                return FetchResult(
+                    url=str(response.url),
+                    status_code=response.status_code,
+                    headers=response.headers,
+                    content=content,
+                    encoding=response.encoding,
+                    truncated=truncated,
+                )
+
+    async def post_json(self, url: str, payload: dict, headers: dict = None, timeout: float = 10.0) -> dict:
+        """POSTs JSON through the shared client (same concurrency limits) and returns the decoded body."""
+        state = self._state()
+        host = (urlsplit(url).hostname or "").lower()
+        async with state.global_semaphore, state.host_semaphore(host, self.per_host_concurrency):
+            response = await state.client.post(url, json=payload, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+    async def aclose(self):
+        """Closes the client that belongs to the running loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+
+# Global Instance
+http_fetcher = HttpFetcher()
@@ -1,83 +1,141 @@
 import trafilatura
 from langchain_core.tools import tool
-import requests
 from bs4 import BeautifulSoup
-import time
+import hashlib
 
-def robust_scrape(url: str) -> str:
+from core.executor import run_blocking
+from tools.scrape_cache import scrape_cache
+from tools.browser_pool import browser_pool
+from tools.http_client import http_fetcher
+from core.telemetry import count_scrape
+
+# Common Headers
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def extract_static(html: str):
     """
-    Scrapes a URL using a 3-layer fallback strategy:
-    1. Trafilatura (Fast, best for articles)
-    2. BeautifulSoup (Static HTML fallback)
-    3. Playwright (Dynamic JS fallback)
+    Static extraction tiers on already-fetched HTML.
+    Returns (text, tier) or (None, None) if neither tier yields enough text.
     """
-    
-    # Common Headers
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-
     # 1. Trafilatura
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        text = trafilatura.extract(response.text)
+        text = trafilatura.extract(html)
         if text and len(text) > 200:
-            return text
+            return text, "trafilatura"
     except:
         pass # Fallthrough
 
     # 2. BeautifulSoup (Static)
     try:
-        if 'response' in locals() and response.ok:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for script in soup(["script", "style", "nav", "footer"]):
-                script.extract()
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            if len(text) > 300:
-                return text + "\n(Extracted via Static BS4)"
+        soup = BeautifulSoup(html, 'html.parser')
+        for script in soup(["script", "style", "nav", "footer"]):
+            script.extract()
+        text = soup.get_text()
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = '\n'.join(chunk for chunk in chunks if chunk)
+        if len(text) > 300:
+            return text + "\n(Extracted via Static BS4)", "bs4"
     except:
         pass
 
-    # 3. Playwright (Dynamic)
+    return None, None
+
+async def scrape_dynamic(url: str):
+    """
+    3. Playwright (Dynamic JS fallback), rendered by the shared browser pool.
+    Returns (text, tier); tier is None when nothing could be extracted.
+    """
     try:
         print(f"Switching to Playwright for {url}...")
-        from playwright.sync_api import sync_playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page(user_agent=headers["User-Agent"])
-            page.goto(url, timeout=45000)
-            
-            # Wait for content to stabilize
-            try:
-                page.wait_for_load_state("networkidle", timeout=15000)
-            except:
-                pass # Continue even if timeout, page might be mostly loaded
-            
-            # Try Trafilatura on rendered HTML first
-            content = page.content()
-            text = trafilatura.extract(content)
-            if text and len(text) > 200:
-                browser.close()
-                return text + "\n(Extracted via Playwright)"
-            
-            # If still nothing, brute force text from body
-            el = page.query_selector("body")
-            if el:
-                text = el.inner_text()
-                browser.close()
-                return text + "\n(Extracted via Playwright Raw)"
-            
-            browser.close()
+        html, body_text = await browser_pool.arender(url, timeout_ms=45000)
+
+        # Try Trafilatura on rendered HTML first (parsing runs in the worker pool)
+        text = await run_blocking(trafilatura.extract, html)
+        if text and len(text) > 200:
+            return text + "\n(Extracted via Playwright)", "playwright"
+
+        # If still nothing, brute force text from body
+        if body_text:
+            return body_text + "\n(Extracted via Playwright Raw)", "playwright_raw"
     except Exception as e:
-        return f"All scrape methods failed. Playwright error: {str(e)}"
-    
-    return "Failed to extract text from URL."
+        return f"All scrape methods failed. Playwright error: {str(e)}", None
+
+    return "Failed to extract text from URL.", None
+
+async def arobust_scrape(url: str) -> str:
+    """
+    Scrapes a URL using a 3-layer fallback strategy:
+    1. Trafilatura (Fast, best for articles)
+    2. BeautifulSoup (Static HTML fallback)
+    3. Playwright (Dynamic JS fallback)
+
+    Fetches go through the shared pooled HTTP client (tools/http_client.py), which
+    bounds global and per-host concurrency; HTML parsing runs in the worker pool.
+
+    Results are cached by normalized URL (see tools/scrape_cache.py). Stale entries are
+    revalidated with a conditional GET, and URLs that only worked with Playwright skip
+    the static tiers.
+    """
+    # Cache I/O is SQLite: it runs in the worker pool, like parsing
+    cached = await run_blocking(scrape_cache.get, url)
+    if cached and cached["is_fresh"]:
+        await run_blocking(scrape_cache.record_hit, url)
+        count_scrape("cache")
+        return cached["text"]
+
+    # A URL that only worked with Playwright skips the static fetch entirely. The hint is
+    # per URL, not per domain: one JS-only page must not push a whole site into the browser.
+    # Its validators describe the JS shell, not the rendered content, so they are not used.
+    needs_browser = cached is not None and cached["tier"] in ("playwright", "playwright_raw")
+    revalidate = cached is not None and cached["tier"] in ("trafilatura", "bs4")
+
+    response = None
+    if not needs_browser:
+        headers = dict(HEADERS)
+        if revalidate:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = await http_fetcher.fetch(url, headers=headers, timeout=10)
+            if response.status_code == 304 and revalidate:
+                await run_blocking(scrape_cache.record_hit, url, revalidated=True)
+                count_scrape("revalidated")
+                return cached["text"]
+            if not response.ok:
+                response = None
+        except Exception:
+            response = None
+
+    etag = response.headers.get("ETag") if response is not None else None
+    last_modified = response.headers.get("Last-Modified") if response is not None else None
+    content_hash = hashlib.sha256(response.content).hexdigest() if response is not None else None
+
+    # Unchanged body (server without validators): reuse the stored extraction
+    if revalidate and content_hash and content_hash == cached["content_hash"]:
+        await run_blocking(scrape_cache.record_hit, url, revalidated=True)
+        count_scrape("revalidated")
+        return cached["text"]
+
+    scrape_cache.record_miss()
+    if response is not None:
+        text, tier = await run_blocking(extract_static, response.text)
+        if tier:
+            await run_blocking(scrape_cache.put, url, text, tier, etag, last_modified, content_hash)
+            count_scrape(tier)
+            return text
+
+    text, tier = await scrape_dynamic(url)
+    if tier:
+        await run_blocking(scrape_cache.put, url, text, tier, etag, last_modified, content_hash)
+    count_scrape(tier)
+    return text
 
 @tool
-def scrape_webpage(url: str) -> str:
+async def scrape_webpage(url: str) -> str:
     """Scrapes the content of a specific webpage URL. Handles dynamic JS sites."""
-    return robust_scrape(url)
+    return await arobust_scrape(url)
@@ -0,0 +1,114 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+# Worker processes for page extraction (0 = use the in-process thread pool instead)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Pages with less text than this and at least one image are treated as scanned
+PDF_SCANNED_PAGE_CHARS = int(os.getenv("PDF_SCANNED_PAGE_CHARS", "50"))
+
+_process_pool = None
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None and PDF_WORKERS > 0:
+        # spawn: forking a process that already runs threads (aiosqlite, executors) is unsafe
+        _process_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def page_count(path: str) -> int:
+    import pypdf
+    return len(pypdf.PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int, scanned_chars: int = PDF_SCANNED_PAGE_CHARS,
+                       max_scanned: Optional[int] = None) -> List[dict]:
+    """
+    Worker: extracts pages [start, end) of the PDF at `path`.
+    Returns one dict per page: {"page", "text", "scanned", "pdf"}; for scanned pages
+    `pdf` holds a standalone single-page PDF so only that page is sent for OCR.
+    Only the first `max_scanned` scanned pages of the range get a `pdf` (None = all);
+    the rest are flagged but not rebuilt, since the caller will not attach them.
+    """
+    import io
+    import pypdf
+
+    reader = pypdf.PdfReader(path)
+    results = []
+    budget = max_scanned
+    for index in range(start, min(end, len(reader.pages))):
+        page = reader.pages[index]
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = "" # Failed to extract text (e.g. encrypted or corrupt)
+
+        scanned = False
+        page_pdf = None
+        if len(text.strip()) < scanned_chars:
+            try:
+                scanned = len(page.images) > 0
+            except Exception:
+                scanned = True # Can't inspect the page: let Gemini look at it
+            if scanned and (budget is None or budget > 0):
+                if budget is not None:
+                    budget -= 1
+                writer = pypdf.PdfWriter()
+                writer.add_page(page)
+                buffer = io.BytesIO()
+                writer.write(buffer)
+                page_pdf = buffer.getvalue()
+
+        results.append({"page": index + 1, "text": text, "scanned": scanned, "pdf": page_pdf})
+    return results
+
+
+async def iter_pdf_pages(path: str, pages_per_task: int = PDF_PAGES_PER_TASK,
+                         max_scanned: Optional[int] = None) -> AsyncIterator[List[dict]]:
+    """
+    Extracts a PDF in parallel page ranges and yields each range's results in page order
+    as soon as it is ready. At most two ranges per worker are in flight.
+    With `max_scanned`, each range is submitted with what is left of that budget after
+    the ranges already yielded, so the first `max_scanned` scanned pages of the document
+    always carry their `pdf` and workers stop building page PDFs once it is spent.
+    """
+    from core.executor import run_blocking
+    from core.profiler import submit_sampled
+
+    pool = _get_process_pool()
+
+    scanned = 0  # scanned pages in the ranges yielded so far
+
+    def submit(start):
+        end = start + pages_per_task
+        budget = None if max_scanned is None else max(0, max_scanned - scanned)
+        if pool is not None:
+            # Sampled inside the worker when this turn is being profiled
+            return submit_sampled(pool, extract_page_range, path, start, end, PDF_SCANNED_PAGE_CHARS, budget)
+        return asyncio.ensure_future(run_blocking(extract_page_range, path, start, end, PDF_SCANNED_PAGE_CHARS, budget))
+
+    total = await run_blocking(page_count, path)
+    starts = list(range(0, total, pages_per_task))
+    window = max(1, PDF_WORKERS) * 2
+
+    pending = [submit(s) for s in starts[:window]]
+    next_index = len(pending)
+    while pending:
+        batch = await pending.pop(0)
+        scanned += sum(1 for p in batch if p["scanned"])
+        if next_index < len(starts):
+            pending.append(submit(starts[next_index]))
+            next_index += 1
+        yield batch
+
+
+def shutdown_pdf_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
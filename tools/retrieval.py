@@ -0,0 +1,24 @@
+import os
+from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+def format_chunks(hits) -> str:
+    """Renders retrieved chunks as citeable excerpts."""
+    return "\n\n".join(
+        f"[{i + 1}] SOURCE: {h.get('source')} (chunk {h.get('chunk')}, score {h.get('score', 0):.2f})\n{h.get('text')}"
+        for i, h in enumerate(hits)
+    )
+
+@tool
+async def search_documents(query: str, config: RunnableConfig) -> str:
+    """Searches the documents and web pages the user attached to this conversation (Knowledge Base). Returns the most relevant excerpts with their sources."""
+    from core.executor import run_blocking
+    from db.document_store import document_store
+
+    session_id = config.get("configurable", {}).get("thread_id", "default_session")
+    hits = await run_blocking(document_store.search, session_id, query, k=RETRIEVAL_TOP_K)
+    if not hits:
+        return "No indexed documents found for this conversation."
+    return format_chunks(hits)
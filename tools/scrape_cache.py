@@ -0,0 +1,208 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SCRAPE_CACHE_DB = os.getenv("SCRAPE_CACHE_DB", "scrape_cache.db")
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "3600"))  # seconds
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Query parameters that never change page content
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used as the cache key: lowercase host, no fragment/default port/tracking params."""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def _parse_domain_ttls(raw: str) -> dict:
+    """'news.ycombinator.com=300,arxiv.org=86400' -> {'news.ycombinator.com': 300, ...}"""
+    ttls = {}
+    for item in (raw or "").split(","):
+        if "=" in item:
+            domain, seconds = item.split("=", 1)
+            try:
+                ttls[domain.strip().lower()] = int(seconds)
+            except ValueError:
+                pass
+    return ttls
+
+
+class ScrapeCache:
+    """
+    Persistent cache of extracted page text, keyed by normalized URL.
+    Keeps HTTP validators (ETag / Last-Modified) for conditional revalidation, a hash of
+    the raw body so unchanged pages are not re-parsed, and the extraction tier that
+    worked for the URL. Evicts least-recently-used entries above a byte budget.
+    All methods block on SQLite (and, with several workers, on its busy timeout): call
+    them through `run_blocking`, never on the event loop. The database is opened on
+    first use, not at import.
+    """
+
+    def __init__(self, path: str = SCRAPE_CACHE_DB, default_ttl: int = SCRAPE_CACHE_TTL,
+                 max_bytes: int = SCRAPE_CACHE_MAX_BYTES, domain_ttls: Optional[dict] = None):
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.domain_ttls = domain_ttls if domain_ttls is not None else _parse_domain_ttls(os.getenv("SCRAPE_CACHE_DOMAIN_TTLS", ""))
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self.path = path
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._conn = None
+        self._bytes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._connect_lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # No fsync per commit
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scrape_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                text TEXT NOT NULL,
+                tier TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scrape_cache_last_access ON scrape_cache(last_access);
+        """)
+        conn.commit()
+        # Running total of cached text bytes, so a put does not rescan the table
+        self._bytes = self._scan_bytes(conn)
+        return conn
+
+    def _scan_bytes(self, conn: sqlite3.Connection = None) -> int:
+        return (conn or self.conn).execute("SELECT COALESCE(SUM(size), 0) FROM scrape_cache").fetchone()[0]
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url: str) -> int:
+        host = (urlsplit(url).hostname or "").lower()
+        # Most specific match wins: "docs.python.org" before "python.org"
+        while host:
+            if host in self.domain_ttls:
+                return self.domain_ttls[host]
+            host = host.partition(".")[2]
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[dict]:
+        """Returns the stored entry (fresh or stale) with an `is_fresh` flag, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT text, tier, etag, last_modified, content_hash, fetched_at FROM scrape_cache WHERE key = ?",
+                (self.key_for(url),)
+            ).fetchone()
+        if not row:
+            return None
+        text, tier, etag, last_modified, content_hash, fetched_at = row
+        return {
+            "text": text,
+            "tier": tier,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash,
+            "fetched_at": fetched_at,
+            "is_fresh": (time.time() - fetched_at) < self.ttl_for(url),
+        }
+
+    def record_hit(self, url: str, revalidated: bool = False):
+        """Marks an entry as used; a revalidated entry also restarts its TTL."""
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self.stats["revalidated"] += 1
+                self.conn.execute(
+                    "UPDATE scrape_cache SET last_access = ?, fetched_at = ? WHERE key = ?",
+                    (now, now, self.key_for(url))
+                )
+            else:
+                self.stats["hits"] += 1
+                self.conn.execute("UPDATE scrape_cache SET last_access = ? WHERE key = ?", (now, self.key_for(url)))
+            self.conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def put(self, url: str, text: str, tier: str, etag: str = None, last_modified: str = None, content_hash: str = None):
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        key = self.key_for(url)
+        with self._lock:
+            row = self.conn.execute("SELECT size FROM scrape_cache WHERE key = ?", (key,)).fetchone()
+            self._bytes += size - (row[0] if row else 0)
+            self.conn.execute(
+                """INSERT OR REPLACE INTO scrape_cache
+                   (key, url, text, tier, etag, last_modified, content_hash, fetched_at, last_access, size)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, normalize_url(url), text, tier, etag, last_modified, content_hash, now, now, size)
+            )
+            self.stats["stores"] += 1
+            self._evict_locked()
+            self.conn.commit()
+
+    def _evict_locked(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # Other workers write to the same file: resync the total before deleting anything
+        total = self._bytes = self._scan_bytes()
+        if total <= self.max_bytes:
+            return
+        # Drop least-recently-used entries until we are back under budget
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM scrape_cache ORDER BY last_access ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM scrape_cache WHERE key = ?", victims)
+        self._bytes -= freed
+        self.stats["evictions"] += len(victims)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scrape_cache").fetchone()
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats.update({
+            "entries": entries,
+            "bytes": size,
+            "hit_ratio": (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0,
+        })
+        return stats
+
+
+# Global Instance
+scrape_cache = ScrapeCache()
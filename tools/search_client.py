@@ -0,0 +1,166 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from tools.http_client import http_fetcher
+
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")  # point at a local fake in tests
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "900"))            # seconds
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))          # entries
+# Cosine similarity above which a cached search answers a differently-worded query (0 = off).
+# Off by default: queries that differ in one entity ("2023" vs "2024") embed very closely.
+SEARCH_SEMANTIC_THRESHOLD = float(os.getenv("SEARCH_SEMANTIC_THRESHOLD", "0"))
+# basic | advanced | adaptive (basic first, advanced only when basic comes back thin)
+SEARCH_DEPTH = os.getenv("SEARCH_DEPTH", "adaptive")
+SEARCH_MIN_RESULTS = 3       # adaptive: fewer relevant results than this triggers advanced
+SEARCH_MIN_SCORE = 0.5       # adaptive: Tavily relevance a result needs to count
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "15"))
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class SearchClient:
+    """
+    Process-wide Tavily client on the shared HTTP pool.
+    1. Results are cached for `ttl` seconds, keyed by normalized query + parameters.
+    2. Identical searches already in flight are coalesced into one request.
+    3. Optionally, a cached search for a near-identical query (by embedding) is reused.
+    4. In adaptive mode a `basic` search is tried first and upgraded to `advanced`
+       only when it returns too few relevant results.
+    """
+
+    def __init__(self, api_url: str = TAVILY_API_URL, ttl: int = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_SIZE,
+                 semantic_threshold: float = SEARCH_SEMANTIC_THRESHOLD, depth: str = SEARCH_DEPTH):
+        self.api_url = api_url.rstrip("/")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self.depth = depth
+        self.stats = {"requests": 0, "hits": 0, "semantic_hits": 0, "coalesced": 0, "upstream": 0, "escalations": 0}
+        self._cache = OrderedDict()  # key -> {"response", "expires", "params", "vector"}
+        self._inflight = weakref.WeakKeyDictionary()  # event loop -> {key: Future}
+
+    @staticmethod
+    def _key(query: str, params: dict) -> str:
+        raw = normalize_query(query) + "|" + "|".join(f"{k}={params[k]}" for k in sorted(params))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # --- Cache ---
+
+    def _get_fresh(self, key: str) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] < time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry["response"]
+
+    def _find_similar(self, vector: np.ndarray, params: dict) -> Optional[dict]:
+        now = time.time()
+        candidates = [e for e in self._cache.values() if e["params"] == params and e["expires"] >= now and e["vector"] is not None]
+        if not candidates:
+            return None
+        scores = np.stack([e["vector"] for e in candidates]) @ vector
+        best = int(scores.argmax())
+        return candidates[best]["response"] if scores[best] >= self.semantic_threshold else None
+
+    def _store(self, key: str, response: dict, params: dict, vector):
+        self._cache[key] = {"response": response, "expires": time.time() + self.ttl, "params": params, "vector": vector}
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    # --- Upstream ---
+
+    async def _post(self, api_key: str, payload: dict) -> dict:
+        self.stats["upstream"] += 1
+        return await http_fetcher.post_json(
+            f"{self.api_url}/search",
+            payload,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=SEARCH_TIMEOUT,
+        )
+
+    def _is_thin(self, response: dict, max_results: int) -> bool:
+        relevant = [r for r in response.get("results", []) if (r.get("score") or 0) >= SEARCH_MIN_SCORE]
+        return len(relevant) < min(SEARCH_MIN_RESULTS, max_results)
+
+    async def _fetch(self, api_key: str, query: str, params: dict) -> dict:
+        payload = {"query": query, "include_answer": params["include_answer"], "max_results": params["max_results"]}
+        if params["depth"] != "adaptive":
+            return await self._post(api_key, dict(payload, search_depth=params["depth"]))
+
+        response = await self._post(api_key, dict(payload, search_depth="basic"))
+        if self._is_thin(response, params["max_results"]):
+            self.stats["escalations"] += 1
+            response = await self._post(api_key, dict(payload, search_depth="advanced"))
+        return response
+
+    async def _lookup_or_fetch(self, api_key: str, query: str, params: dict, key: str) -> dict:
+        vector = None
+        if self.semantic_threshold > 0:
+            from db.embeddings import embedding_service
+            vector = await embedding_service.aembed(normalize_query(query))
+            similar = self._find_similar(vector, params)
+            if similar is not None:
+                self.stats["semantic_hits"] += 1
+                return similar
+
+        response = await self._fetch(api_key, query, params)
+        self._store(key, response, params, vector)
+        return response
+
+    # --- Public API ---
+
+    async def search(self, query: str, api_key: str, max_results: int = 5, include_answer: bool = True,
+                     depth: str = None) -> dict:
+        """Returns Tavily's response dict ({"answer", "results": [...]}), from cache when possible."""
+        self.stats["requests"] += 1
+        params = {"depth": depth or self.depth, "max_results": max_results, "include_answer": include_answer}
+        key = self._key(query, params)
+
+        cached = self._get_fresh(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        # Single flight: later identical searches wait for the first one. The fetch runs in
+        # its own task and every caller awaits it shielded, so a cancelled caller (client
+        # gone, tool timeout) never cancels the search the others are waiting for.
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = inflight[key] = asyncio.ensure_future(self._lookup_or_fetch(api_key, query, params, key))
+            task.add_done_callback(lambda done: self._finish(inflight, key, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finish(inflight: dict, key: str, task: asyncio.Task):
+        if inflight.get(key) is task:
+            del inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved: every caller may have gone
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._cache)
+        stats["hit_ratio"] = (stats["hits"] + stats["semantic_hits"] + stats["coalesced"]) / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+# Global Instance
+search_client = SearchClient()
@@ -1,29 +1,18 @@
 import os
 from langchain_core.tools import tool
-try:
-    from tavily import TavilyClient
-except ImportError:
-    TavilyClient = None
+
+from tools.search_client import search_client
 
 @tool
-def robust_search(query: str):
+async def robust_search(query: str):
     """Current events and general knowledge search engine. Use this for questions about news, facts, or recent info."""
     api_key = os.getenv("TAVILY_API_KEY")
     if not api_key:
         return "Error: TAVILY_API_KEY not found."
-    
-    if not TavilyClient:
-        return "Error: `tavily-python` package not installed."
 
     try:
-        client = TavilyClient(api_key=api_key)
-        # Search for advanced context
-        response = client.search(
-            query=query, 
-            search_depth="advanced",
-            include_answer=True,
-            max_results=5
-        )
+        # Shared client: cached, coalesced, basic depth first (see tools/search_client.py)
+        response = await search_client.search(query, api_key=api_key, max_results=5, include_answer=True)
         
         # Format output
         context = []